@@ -101,6 +101,19 @@ let g:vdebug_options_defaults = {
 \    'auto_start' : 1,
 \    'simplified_status': 1,
 \    'layout': 'vertical',
+\    'breakpoint_file': '',
+\    'logpoint_history': 1000,
+\    'step_until_limit': 10000,
+\    'expand_limit': 200,
+\    'watch_window_virtual': 0,
+\    'capability_cache': '',
+\    'adaptive_features': 0,
+\    'adaptive_step_budget': 100,
+\    'adaptive_limits': {
+\        'max_children': [16, 256],
+\        'max_depth': [1, 2],
+\        'max_data': [256, 8192],
+\    },
 \}
 
 " Different symbols for non unicode Vims
@@ -123,6 +136,10 @@ command! -nargs=? VdebugChangeStack python3 debugger.change_stack(<q-args>)
 command! -nargs=? -complete=customlist,s:BreakpointTypes Breakpoint python3 debugger.cycle_breakpoint(<q-args>)
 command! -nargs=? -complete=customlist,s:BreakpointTypes SetBreakpoint python3 debugger.set_breakpoint(<q-args>)
 command! VdebugStart python3 debugger.run()
+command! -count=1 VdebugStepOver python3 debugger.step_over(<count>)
+command! -count=1 VdebugStepInto python3 debugger.step_into(<count>)
+command! -count=1 VdebugStepOut python3 debugger.step_out(<count>)
+command! -nargs=? -bang VdebugStepUntil python3 debugger.step_until('<bang>', <q-args>)
 command! -nargs=? BreakpointRemove python3 debugger.remove_breakpoint(<q-args>)
 command! -nargs=? BreakpointToggle python3 debugger.toggle_breakpoint(<q-args>)
 command! BreakpointWindow python3 debugger.toggle_breakpoint_window()
@@ -132,6 +149,8 @@ command! -nargs=+ VdebugPathMap :call Vdebug_path_map(<f-args>)
 command! -nargs=+ VdebugAddPathMap :call Vdebug_add_path_map(<f-args>)
 command! -nargs=? VdebugTrace python3 debugger.handle_trace(<q-args>)
 command! -nargs=? BreakpointStatus python3 debugger.breakpoint_status(<q-args>)
+command! -bang VdebugLogpoints python3 debugger.show_logpoints('<bang>')
+command! -nargs=? VdebugExpand python3 debugger.expand(<q-args>)
 
 if hlexists('DbgCurrentLine') == 0
     hi default DbgCurrentLine term=reverse ctermfg=White ctermbg=Red guifg=#ffffff guibg=#ff0000
@@ -157,6 +176,9 @@ endif
 if hlexists('DbgCurrentStackPositionLine') == 0
   highlight DbgCurrentStackPositionLine term=reverse ctermbg=White ctermfg=Cyan guibg=#e17e67 guifg=#888888
 endif
+if hlexists('DbgChangedValue') == 0
+  highlight default link DbgChangedValue DiffChange
+endif
 
 " Signs and highlighted lines for breakpoints, etc.
 function! s:DefineSigns()
@@ -170,7 +192,7 @@ function! s:BreakpointTypes(A,L,P)
     let arg_to_cursor = strpart(a:L,11,a:P)
     let space_idx = stridx(arg_to_cursor,' ')
     if space_idx == -1
-        return filter(['conditional ','exception ','return ','call ','watch '],'v:val =~ "^".a:A.".*"')
+        return filter(['conditional ','log ','exception ','return ','call ','watch '],'v:val =~ "^".a:A.".*"')
     else
         return []
     endif
@@ -330,6 +352,42 @@ function! Vdebug_edit(filename)
     endtry
 endfunction
 
+" Report line changes in a buffer to Vdebug, so that breakpoints follow
+" their lines while editing
+function! Vdebug_track_buffer(bufnr)
+    if a:bufnr < 1 || getbufvar(a:bufnr, 'vdebug_tracked', 0)
+        return
+    endif
+    if has('nvim')
+        call luaeval('vim.api.nvim_buf_attach(_A, false, {'
+            \ . 'on_lines = function(_, buf, _, first, last, new_last) '
+            \ . 'vim.schedule(function() vim.fn.Vdebug_lines_changed(buf, '
+            \ . '{{first + 1, last + 1, new_last - last}}) end) end, '
+            \ . 'on_detach = function(_, buf) vim.schedule(function() '
+            \ . 'vim.fn.setbufvar(buf, "vdebug_tracked", 0) end) end})',
+            \ a:bufnr)
+    elseif exists('*listener_add')
+        call listener_add(function('s:BufferChanged'), a:bufnr)
+    else
+        return
+    endif
+    call setbufvar(a:bufnr, 'vdebug_tracked', 1)
+endfunction
+
+function! s:BufferChanged(bufnr, start, end, added, changes)
+    call Vdebug_lines_changed(a:bufnr,
+        \ map(copy(a:changes), '[v:val.lnum, v:val.end, v:val.added]'))
+endfunction
+
+function! Vdebug_lines_changed(bufnr, changes)
+    python3 debugger.lines_changed(vim.eval('fnamemodify(bufname(a:bufnr + 0), ":p")'), vim.eval('a:changes'))
+endfunction
+
+" Called by a timer once Vim is waiting for input, i.e. no keys are pending
+function! Vdebug_flush_refresh(timer)
+    python3 debugger.flush_refresh()
+endfunction
+
 function! Vdebug_statusline()
     return pyeval('debugger.status_for_statusline()')
 endfunction
@@ -338,7 +396,16 @@ augroup Vdebug
 augroup END
 augroup VdebugOut
 autocmd VimLeavePre * python3 debugger.quit()
+autocmd BufReadPost * python3 debugger.place_breakpoint_signs(vim.eval("expand('<afile>:p')"))
+autocmd BufWritePost * python3 debugger.buffer_written()
 augroup END
 
 call Vdebug_load_options(g:vdebug_options)
 call Vdebug_load_keymaps(g:vdebug_keymap)
+
+" Restore breakpoints once the vimrc has set the options
+if v:vim_did_enter
+    python3 debugger.load_breakpoints()
+else
+    autocmd VdebugOut VimEnter * python3 debugger.load_breakpoints()
+endif
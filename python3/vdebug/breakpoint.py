@@ -1,45 +1,275 @@
 import base64
+import json
+import os
+import re
 
 from . import error
 from . import log
+from . import util
 
 
 class Store:
+    """Holds all breakpoints, indexed for constant time lookups.
+
+    Besides the breakpoints keyed on their ID, the store keeps indexes of
+    line breakpoints keyed on file and line, of breakpoints keyed on the
+    ID given by the debugger engine, and of the line-based breakpoints in
+    each file. Breakpoints must be changed through the store to keep the
+    indexes consistent.
+
+    Once breakpoints have been loaded from a file, every change is saved
+    back to it.
+
+    Breakpoints of a type that the debugger engine doesn't support are kept,
+    but not sent to the debugger.
+    """
 
     def __init__(self):
         self.breakpoints = {}
         self.api = None
+        # the breakpoint types the debugger supports, or None if unknown
+        self.supported_types = None
+        self.filename = None
+        self.__loading = False
+        # whether breakpoints were moved by editing since the last save
+        self.__moved = False
+        self.__by_position = {}
+        self.__by_debugger_id = {}
+        self.__by_file = {}
 
-    def link_api(self, api):
+    @staticmethod
+    def file_key(file):
+        return os.path.normpath(str(file))
+
+    def load(self, filename, ui):
+        """Restore the breakpoints saved in a file.
+
+        The file is used to save breakpoints from then on, so it doesn't
+        need to exist yet.
+        """
+        self.filename = filename
+        try:
+            with open(filename, encoding='utf-8') as f:
+                entries = json.load(f)
+        except (IOError, OSError):
+            return
+        except ValueError:
+            log.Log("Ignoring invalid breakpoint file %s" % filename,
+                    log.Logger.ERROR)
+            return
+
+        log.Log("Restoring %i breakpoints from %s" % (len(entries), filename))
+        self.__loading = True
+        try:
+            for data in entries:
+                try:
+                    bp = Breakpoint.from_dict(ui, data)
+                except (KeyError, TypeError, ValueError,
+                        error.BreakpointError, error.FilePathError) as e:
+                    log.Log("Skipping invalid breakpoint %s: %s" % (data, e),
+                            log.Logger.ERROR)
+                    continue
+                self.add_breakpoint(bp)
+        finally:
+            self.__loading = False
+
+    def save(self):
+        """Write the breakpoints to the breakpoint file, if there is one."""
+        if not self.filename or self.__loading:
+            return
+        self.__moved = False
+        entries = [bp.to_dict() for bp in self.breakpoints.values()
+                   if bp.persistent]
+        try:
+            with open(self.filename, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, separators=(',', ':'))
+        except (IOError, OSError) as e:
+            log.Log("Failed to write breakpoint file %s: %s"
+                    % (self.filename, e), log.Logger.ERROR)
+
+    def link_api(self, api, supported_types=None):
+        """Register the breakpoints with the debugger.
+
+        supported_types -- the breakpoint types the debugger supports, or
+                           None if they aren't known
+        """
         self.api = api
-        num_bps = len(self.breakpoints)
-        if num_bps > 0:
-            log.Log("Registering %i breakpoints with the debugger" % num_bps)
+        self.supported_types = supported_types
+        bps = []
         for bp in self.breakpoints.values():
-            res = self.api.breakpoint_set(bp.get_cmd())
-            bp.set_debugger_id(res.get_id())
+            if self.is_supported(bp):
+                bps.append(bp)
+            else:
+                log.Log("Not registering %s, as the debugger doesn't "
+                        "support %s breakpoints" % (bp, bp.get_dbgp_type()),
+                        log.Logger.ERROR)
+        if not bps:
+            return
+        log.Log("Registering %i breakpoints with the debugger" % len(bps))
+        # the breakpoint list shows where the debugger actually put them
+        responses = self.api.pipeline(
+            lambda: [self.api.breakpoint_set(bp.get_cmd()) for bp in bps] +
+            [self.api.breakpoint_list()])
+        for bp, res in zip(bps, responses):
+            if isinstance(res, Exception):
+                log.Log("Failed to register %s: %s" % (bp, res),
+                        log.Logger.ERROR)
+            else:
+                self.__set_debugger_id(bp, res.get_id())
+        if isinstance(responses[-1], Exception):
+            log.Log("Failed to list breakpoints: %s" % responses[-1],
+                    log.Logger.DEBUG)
+        else:
+            self.reconcile(responses[-1].get_breakpoints())
 
     # Update line-based breakpoints with a dict of IDs and lines
     def update_lines(self, lines):
         for id, line in lines.items():
-            try:
-                self.breakpoints[id].set_line(line)
-                log.Log("Updated line number of breakpoint %s to %s" % (id,
-                                                                        line))
-            except ValueError:
-                pass
-                # No method set_line, not a line breakpoint
+            bp = self.breakpoints.get(str(id))
+            if not isinstance(bp, LineBreakpoint):
+                continue
+            self.__unindex_position(bp)
+            bp.set_line(line)
+            self.__index_position(bp)
+            log.Log("Updated line number of breakpoint %s to %s" % (id,
+                                                                    line))
+
+    def shift_lines(self, file, changes):
+        """Move the breakpoints in a file after lines were changed.
+
+        changes -- a list of (start, end, added) tuples in the order they
+                   were made, where lines from start up to (not including)
+                   end were changed, and added is the number of lines added,
+                   or negative if lines were deleted.
+
+        The moved breakpoints are updated in the debugger, all in one go,
+        and returned. They are saved by save_moved(), rather than on every
+        edit.
+        """
+        moved = []
+        for bp in self.get_breakpoints_in_file(file):
+            line = bp.get_line()
+            for start, end, added in changes:
+                line = shift_line(line, int(start), int(end), int(added))
+            if line != bp.get_line():
+                self.__unindex_position(bp)
+                bp.set_line(line)
+                self.__index_position(bp)
+                moved.append(bp)
+        if not moved:
+            return moved
+
+        log.Log("Moved %i breakpoints in %s" % (len(moved), file),
+                log.Logger.DEBUG)
+        if self.api is not None:
+            registered = [bp for bp in moved
+                          if bp.get_debugger_id() is not None]
+            responses = self.api.pipeline(
+                lambda: [self.api.breakpoint_move(bp.get_debugger_id(),
+                                                  bp.get_line())
+                         for bp in registered])
+            for bp, res in zip(registered, responses):
+                if isinstance(res, Exception):
+                    log.Log("Failed to move %s: %s" % (bp, res),
+                            log.Logger.ERROR)
+        for bp in moved:
+            bp.on_update()
+        self.__moved = True
+        return moved
+
+    def save_moved(self):
+        """Save the breakpoints if any were moved by editing since they were
+        last saved."""
+        if self.__moved:
+            self.save()
+
+    def can_sync(self):
+        """Whether there are breakpoints registered with the debugger to
+        reconcile with its breakpoint list."""
+        return self.api is not None and bool(self.__by_debugger_id)
+
+    def apply_notifications(self, notifications):
+        """Apply breakpoint_resolved notifications from the debugger."""
+        nodes = [n.get_breakpoint() for n in notifications
+                 if n.get_name() == 'breakpoint_resolved']
+        nodes = [node for node in nodes if node is not None]
+        if not nodes:
+            return []
+        return self.reconcile(nodes)
+
+    def reconcile(self, nodes):
+        """Bring the breakpoints in line with the debugger's view of them.
+
+        The line, state, resolution and hit count of each breakpoint are
+        taken from the debugger, in a single pass over the breakpoint
+        elements of a breakpoint_list response or notification.
+
+        Returns the breakpoints that changed.
+        """
+        changed = []
+        for node in nodes:
+            dbg_id = node.get('id')
+            if dbg_id is None:
+                continue
+            bp = self.get_breakpoint_by_debugger_id(dbg_id)
+            if bp is not None and self.__reconcile_breakpoint(bp, node):
+                changed.append(bp)
+
+        for bp in changed:
+            bp.on_update()
+        if changed:
+            self.save()
+        return changed
+
+    def __reconcile_breakpoint(self, bp, node):
+        changed = False
+        state = node.get('state')
+        if state in ('enabled', 'disabled') and \
+                bp.enabled != (state == 'enabled'):
+            bp.enabled = state == 'enabled'
+            changed = True
+        resolved = node.get('resolved')
+        if resolved is not None and bp.resolved != (resolved == 'resolved'):
+            bp.resolved = resolved == 'resolved'
+            changed = True
+        lineno = node.get('lineno')
+        if lineno is not None and isinstance(bp, LineBreakpoint) and \
+                int(lineno) != bp.get_line():
+            log.Log("%s was moved to line %s by the debugger" % (bp, lineno),
+                    log.Logger.DEBUG)
+            self.__unindex_position(bp)
+            bp.set_line(lineno)
+            self.__index_position(bp)
+            changed = True
+        hit_count = node.get('hit_count')
+        if hit_count is not None and int(hit_count) != bp.hit_count:
+            bp.hit_count = int(hit_count)
+            changed = True
+        return changed
+
+    def is_supported(self, bp):
+        """Whether the debugger supports the type of a breakpoint."""
+        return self.supported_types is None or \
+            bp.get_dbgp_type() in self.supported_types
 
     def unlink_api(self):
         self.api = None
+        self.supported_types = None
+        for bp in self.__by_debugger_id.values():
+            bp.set_debugger_id(None)
+        self.__by_debugger_id = {}
 
     def add_breakpoint(self, breakpoint):
         log.Log("Adding " + str(breakpoint))
         self.breakpoints[str(breakpoint.get_id())] = breakpoint
+        self.__index_position(breakpoint)
         breakpoint.on_add()
-        if self.api is not None:
+        if self.api is not None and self.is_supported(breakpoint):
             res = self.api.breakpoint_set(breakpoint.get_cmd())
-            breakpoint.set_debugger_id(res.get_id())
+            self.__set_debugger_id(breakpoint, res.get_id())
+            # the response says whether the debugger could resolve it
+            self.reconcile([res.as_xml()])
+        self.save()
 
     def toggle_breakpoint_by_id(self, id):
         id = str(id)
@@ -58,6 +288,7 @@ class Store:
         if dbg_id is not None:
             self.api.breakpoint_enable(dbg_id)
         self.breakpoints[id].on_enable()
+        self.save()
 
     def disable_breakpoint_by_id(self, id):
         id = str(id)
@@ -67,6 +298,7 @@ class Store:
         if dbg_id is not None:
             self.api.breakpoint_disable(dbg_id)
         self.breakpoints[id].on_disable()
+        self.save()
 
     def remove_breakpoint(self, breakpoint):
         self.remove_breakpoint_by_id(breakpoint.get_id())
@@ -76,36 +308,126 @@ class Store:
         if id not in self.breakpoints:
             raise error.BreakpointError("No breakpoint matching ID %s" % id)
         log.Log("Removing breakpoint id %s" % id)
+        bp = self.breakpoints[id]
         if self.api is not None:
-            dbg_id = self.breakpoints[id].get_debugger_id()
+            dbg_id = bp.get_debugger_id()
             if dbg_id is not None:
                 self.api.breakpoint_remove(dbg_id)
-        self.breakpoints[id].on_remove()
+        bp.on_remove()
+        self.__unindex(bp)
         del self.breakpoints[id]
+        self.save()
 
     def clear_breakpoints(self):
-        # We need to copy the keys to a new list, otherwise the for loop
-        # complains when items are removed.
-        for id in list(self.breakpoints.keys()):
-            self.remove_breakpoint_by_id(id)
+        bps = list(self.breakpoints.values())
+        log.Log("Removing %i breakpoints" % len(bps))
+        if self.api is not None:
+            registered = [bp for bp in bps
+                          if bp.get_debugger_id() is not None]
+            responses = self.api.pipeline(
+                lambda: [self.api.breakpoint_remove(bp.get_debugger_id())
+                         for bp in registered])
+            for bp, res in zip(registered, responses):
+                if isinstance(res, Exception):
+                    log.Log("Failed to remove %s: %s" % (bp, res),
+                            log.Logger.ERROR)
+        for bp in bps:
+            bp.on_remove()
         self.breakpoints = {}
+        self.__by_position = {}
+        self.__by_debugger_id = {}
+        self.__by_file = {}
+        self.save()
 
     def get_breakpoint_by_id(self, id):
-        id = str(id)
-        if id not in list(self.breakpoints.keys()):
-            return None
+        return self.breakpoints.get(str(id))
+
+    def get_breakpoint_by_debugger_id(self, dbg_id):
+        return self.__by_debugger_id.get(int(dbg_id))
+
+    def get_breakpoints_in_file(self, file):
+        """Get the line-based breakpoints in a file."""
+        ids = self.__by_file.get(self.file_key(file), ())
+        return [self.breakpoints[id] for id in ids]
+
+    def get_files(self):
+        """Get the files that have line-based breakpoints."""
+        return list(self.__by_file.keys())
 
-        return self.breakpoints[id]
+    def has_logpoints(self):
+        return any(bp.type == "log" and bp.enabled
+                   for bp in self.breakpoints.values())
+
+    def find_logpoint(self, file, line):
+        for bp in self.get_breakpoints_in_file(file):
+            if bp.type == "log" and bp.get_line() == int(line):
+                return bp
+        return None
+
+    def stops_at(self, file, line):
+        """Whether an enabled breakpoint at a line stops the script there,
+        which logpoints don't."""
+        line = int(line)
+        return any(bp.get_line() == line and bp.enabled and bp.type != "log"
+                   for bp in self.get_breakpoints_in_file(file))
 
     def find_breakpoint(self, file, line):
-        found = None
-        for bp in self.breakpoints.values():
-            if bp.type == "line":
-                if bp.get_file() == file and\
-                        bp.get_line() == line:
-                    found = bp.get_id()
-                    break
-        return found
+        """Get the ID of the line breakpoint at a line, or of the first one
+        set there if editing or the debugger moved several onto it."""
+        ids = self.__by_position.get((self.file_key(file), int(line)))
+        return min(ids) if ids else None
+
+    def __set_debugger_id(self, bp, dbg_id):
+        old_id = bp.get_debugger_id()
+        if old_id is not None:
+            self.__by_debugger_id.pop(old_id, None)
+        bp.set_debugger_id(dbg_id)
+        if dbg_id is not None:
+            self.__by_debugger_id[dbg_id] = bp
+
+    def __index_position(self, bp):
+        if not isinstance(bp, LineBreakpoint):
+            return
+        key = self.file_key(bp.get_file())
+        self.__by_file.setdefault(key, set()).add(str(bp.get_id()))
+        if bp.type == "line":
+            self.__by_position.setdefault((key, int(bp.get_line())),
+                                          set()).add(bp.get_id())
+
+    def __unindex_position(self, bp):
+        if not isinstance(bp, LineBreakpoint):
+            return
+        key = self.file_key(bp.get_file())
+        ids = self.__by_file.get(key)
+        if ids is not None:
+            ids.discard(str(bp.get_id()))
+            if not ids:
+                del self.__by_file[key]
+        position = (key, int(bp.get_line()))
+        ids = self.__by_position.get(position)
+        if ids is not None:
+            ids.discard(bp.get_id())
+            if not ids:
+                del self.__by_position[position]
+
+    def __unindex(self, bp):
+        self.__unindex_position(bp)
+        dbg_id = bp.get_debugger_id()
+        if dbg_id is not None:
+            self.__by_debugger_id.pop(dbg_id, None)
+
+
+def shift_line(line, start, end, added):
+    """Get the new number of a line after the lines from start up to end
+    were changed, and added lines were added (or deleted, if negative).
+
+    A line inside a deleted block moves to the first line after it.
+    """
+    if line >= end:
+        return line + added
+    if added < 0 and line >= end + added:
+        return max(start, end + added)
+    return line
 
 
 class Breakpoint:
@@ -117,12 +439,20 @@ class Breakpoint:
     type = None
     id = 11000
     dbg_id = None
+    persistent = True
+    hit_conditions = ('>=', '==', '%')
+    hit_regex = re.compile(r'^@(>=|==|%)?(\d+)(?:\s+|$)')
 
     def __init__(self, ui):
         self.id = Breakpoint.id
         Breakpoint.id += 1
         self.ui = ui
         self.enabled = True
+        self.hit_condition = None
+        self.hit_value = None
+        self.hit_count = 0
+        # whether the debugger could resolve the breakpoint to code, if known
+        self.resolved = None
 
     def get_id(self):
         return self.id
@@ -133,6 +463,10 @@ class Breakpoint:
     def get_debugger_id(self):
         return self.dbg_id
 
+    def get_dbgp_type(self):
+        """The type of breakpoint that the debugger engine is asked for."""
+        return self.type
+
     def on_add(self):
         self.ui.register_breakpoint(self)
 
@@ -147,11 +481,85 @@ class Breakpoint:
     def on_remove(self):
         self.ui.remove_breakpoint(self)
 
+    def on_update(self):
+        self.ui.update_breakpoint(self)
+
+    def set_hit_condition(self, condition, value):
+        """Only break when the hit count is >= value, == value, or a
+        multiple of value (%), as worked out by the debugger engine."""
+        if value is None:
+            self.hit_condition = None
+            self.hit_value = None
+            return
+        if condition not in self.hit_conditions:
+            raise error.BreakpointError(
+                "Hit conditions must be one of: %s"
+                % ", ".join(self.hit_conditions))
+        if int(value) < 1:
+            raise error.BreakpointError(
+                "Hit values must be greater than zero")
+        self.hit_condition = condition
+        self.hit_value = int(value)
+
+    def get_hit_args(self):
+        if self.hit_value is None:
+            return ""
+        return " -h {} -o {}".format(self.hit_value, self.hit_condition)
+
+    def to_dict(self):
+        """Get the breakpoint as a dict that can be saved as JSON."""
+        data = {'type': self.type, 'enabled': self.enabled}
+        if self.hit_value is not None:
+            data['hit_condition'] = self.hit_condition
+            data['hit_value'] = self.hit_value
+        return data
+
+    @staticmethod
+    def from_dict(ui, data):
+        """Create a breakpoint from a dict created by to_dict."""
+        type = data['type']
+        if type == 'line':
+            bp = LineBreakpoint(ui, util.LocalFilePath(data['file']),
+                                int(data['line']))
+        elif type == 'conditional':
+            bp = ConditionalBreakpoint(ui, util.LocalFilePath(data['file']),
+                                       int(data['line']), data['condition'])
+        elif type == 'log':
+            bp = LogBreakpoint(ui, util.LocalFilePath(data['file']),
+                               int(data['line']), data['expressions'])
+        elif type == 'watch':
+            bp = WatchBreakpoint(ui, data['expr'])
+        elif type == 'exception':
+            bp = ExceptionBreakpoint(ui, data['exception'])
+        elif type == 'call':
+            bp = CallBreakpoint(ui, data['function'])
+        elif type == 'return':
+            bp = ReturnBreakpoint(ui, data['function'])
+        else:
+            raise error.BreakpointError("Unknown breakpoint type %s" % type)
+        bp.enabled = bool(data.get('enabled', True))
+        bp.set_hit_condition(data.get('hit_condition'),
+                             data.get('hit_value'))
+        return bp
+
     @staticmethod
     def parse(ui, args):
         if args is None:
             args = ""
         args = args.strip()
+        hit_condition = None
+        hit_value = None
+        match = Breakpoint.hit_regex.match(args)
+        if match:
+            hit_condition = match.group(1) or '>='
+            hit_value = int(match.group(2))
+            args = args[match.end():]
+        bp = Breakpoint.__parse_type(ui, args)
+        bp.set_hit_condition(hit_condition, hit_value)
+        return bp
+
+    @staticmethod
+    def __parse_type(ui, args):
         if not args:
             """ Line breakpoint """
             row = ui.get_current_row()
@@ -176,6 +584,16 @@ class Breakpoint:
                     "specified")
             cond = " ".join(arg_parts)
             return ConditionalBreakpoint(ui, file, row, cond)
+        elif type == 'log':
+            row = ui.get_current_row()
+            file = ui.get_current_file()
+            expressions = [e.strip() for e in " ".join(arg_parts).split(';')
+                           if e.strip()]
+            if not expressions:
+                raise error.BreakpointError(
+                    "Log breakpoints require at least one expression to be "
+                    "specified")
+            return LogBreakpoint(ui, file, row, expressions)
         elif type == 'watch':
             if not arg_parts:
                 raise error.BreakpointError(
@@ -204,7 +622,7 @@ class Breakpoint:
             return CallBreakpoint(ui, arg_parts[0])
         raise error.BreakpointError(
             "Unknown breakpoint type, please choose one of: conditional, "
-            "exception, call or return")
+            "log, exception, call or return")
 
     def get_cmd(self):
         pass
@@ -230,18 +648,30 @@ class LineBreakpoint(Breakpoint):
     def get_file(self):
         return self.file
 
+    def to_dict(self):
+        data = Breakpoint.to_dict(self)
+        data['file'] = self.file.as_local()
+        data['line'] = self.line
+        return data
+
     def get_cmd(self):
-        return '-t {} -f "{}" -n {} -s {}'.format(
-            self.type, self.file.as_remote(), self.line, "enabled" if self.enabled else "disabled")
+        return '-t {} -f "{}" -n {} -s {}{}'.format(
+            self.type, self.file.as_remote(), self.line,
+            "enabled" if self.enabled else "disabled", self.get_hit_args())
 
 
 class TemporaryLineBreakpoint(LineBreakpoint):
+    persistent = False
+
     def on_add(self):
         pass
 
     def on_remove(self):
         pass
 
+    def on_update(self):
+        pass
+
     def get_cmd(self):
         cmd = LineBreakpoint.get_cmd(self)
         return cmd + " -r 1"
@@ -254,6 +684,11 @@ class ConditionalBreakpoint(LineBreakpoint):
         LineBreakpoint.__init__(self, ui, file, line)
         self.condition = condition
 
+    def to_dict(self):
+        data = LineBreakpoint.to_dict(self)
+        data['condition'] = self.condition
+        return data
+
     def get_cmd(self):
         cmd = LineBreakpoint.get_cmd(self)
         cmd += " -- " + base64.encodebytes(
@@ -261,6 +696,32 @@ class ConditionalBreakpoint(LineBreakpoint):
         return cmd
 
 
+class LogBreakpoint(LineBreakpoint):
+    """A line breakpoint that evaluates and records expressions, then
+    lets the script continue without stopping.
+
+    The debugger engine sees an ordinary line breakpoint.
+    """
+    type = "log"
+
+    def __init__(self, ui, file, line, expressions):
+        LineBreakpoint.__init__(self, ui, file, line)
+        self.expressions = list(expressions)
+
+    def to_dict(self):
+        data = LineBreakpoint.to_dict(self)
+        data['expressions'] = self.expressions
+        return data
+
+    def get_dbgp_type(self):
+        return "line"
+
+    def get_cmd(self):
+        return '-t line -f "{}" -n {} -s {}{}'.format(
+            self.file.as_remote(), self.line,
+            "enabled" if self.enabled else "disabled", self.get_hit_args())
+
+
 class WatchBreakpoint(Breakpoint):
     type = "watch"
 
@@ -268,8 +729,13 @@ class WatchBreakpoint(Breakpoint):
         Breakpoint.__init__(self, ui)
         self.expr = expr
 
+    def to_dict(self):
+        data = Breakpoint.to_dict(self)
+        data['expr'] = self.expr
+        return data
+
     def get_cmd(self):
-        cmd = "-t " + self.type
+        cmd = "-t " + self.type + self.get_hit_args()
         cmd += " -- " + base64.encodebytes(self.expr)
         return cmd
 
@@ -281,8 +747,14 @@ class ExceptionBreakpoint(Breakpoint):
         Breakpoint.__init__(self, ui)
         self.exception = exception
 
+    def to_dict(self):
+        data = Breakpoint.to_dict(self)
+        data['exception'] = self.exception
+        return data
+
     def get_cmd(self):
-        return "-t {} -x {} -s enabled".format(self.type, self.exception)
+        return "-t {} -x {} -s enabled{}".format(
+            self.type, self.exception, self.get_hit_args())
 
 
 class CallBreakpoint(Breakpoint):
@@ -292,8 +764,14 @@ class CallBreakpoint(Breakpoint):
         Breakpoint.__init__(self, ui)
         self.function = function
 
+    def to_dict(self):
+        data = Breakpoint.to_dict(self)
+        data['function'] = self.function
+        return data
+
     def get_cmd(self):
-        return "-t {} -m {} -s enabled".format(self.type, self.function)
+        return "-t {} -m {} -s enabled{}".format(
+            self.type, self.function, self.get_hit_args())
 
 
 class ReturnBreakpoint(CallBreakpoint):
@@ -1,4 +1,5 @@
 import base64
+import re
 import xml.etree.ElementTree as ET
 
 from . import log
@@ -99,6 +100,15 @@ class TraceResponse(Response):
 class StatusResponse(Response):
     """Response object returned by the status command."""
 
+    def get_position(self):
+        """Get the file name and line number of a break, if the engine
+        sends them with the status (e.g. Xdebug), otherwise None."""
+        for c in list(self.as_xml()):
+            if str(c.tag).endswith('message') and c.get('filename') and \
+                    c.get('lineno'):
+                return (c.get('filename'), int(c.get('lineno')))
+        return None
+
     def __str__(self):
         return self.as_xml().get('status')
 
@@ -119,17 +129,46 @@ class ContextGetResponse(Response):
     def __init__(self, response, cmd, cmd_args, api):
         Response.__init__(self, response, cmd, cmd_args, api)
         self.properties = []
+        self.__roots = None
 
     def get_context(self):
-        for c in list(self.as_xml()):
-            self.create_properties(ContextProperty(c))
-
+        if self.__roots is None:
+            self.__roots = [self._create_property(c)
+                            for c in list(self.as_xml())]
+            self.__flatten()
         return self.properties
 
+    def _create_property(self, node):
+        return ContextProperty(node)
+
+    def expand(self, name, response):
+        """Show the children of a property fetched with property_get under
+        the unexpanded property of the same name in this response.
+
+        Returns whether the property was found.
+        """
+        fetched = response.get_context()
+        if not fetched:
+            return False
+        for p in self.get_context():
+            if isinstance(p, ContextProperty) and p.display_name == name \
+                    and p.has_children and not p.children:
+                p.adopt_children(fetched[0])
+                self.__flatten()
+                return True
+        return False
+
+    def __flatten(self):
+        self.properties = []
+        for p in self.__roots:
+            self.create_properties(p)
+
     def create_properties(self, property):
         self.properties.append(property)
         for p in property.children:
             self.create_properties(p)
+        if property.has_more_pages():
+            self.properties.append(ContextPageProperty(property))
 
 
 class EvalResponse(ContextGetResponse):
@@ -144,12 +183,8 @@ class EvalResponse(ContextGetResponse):
             else:
                 raise e
 
-    def get_context(self):
-        code = self.get_code()
-        for c in list(self.as_xml()):
-            self.create_properties(EvalProperty(c, code, self.api.language))
-
-        return self.properties
+    def _create_property(self, node):
+        return EvalProperty(node, self.get_code(), self.api.language)
 
     def get_code(self):
         cmd = self.get_cmd_args()
@@ -160,6 +195,25 @@ class EvalResponse(ContextGetResponse):
         return base64.b64decode(parts[1].encode('utf-8')).decode('utf-8')
 
 
+class PropertyValueResponse(Response):
+    """Response object returned by the property_value command."""
+
+    def get_value(self):
+        xml = self.as_xml()
+        if xml.text is None:
+            return ""
+        if xml.get('encoding') == 'base64':
+            try:
+                return base64.decodebytes(
+                    xml.text.encode("UTF-8")).decode("utf-8")
+            except UnicodeDecodeError:
+                return xml.text
+        return xml.text
+
+    def __str__(self):
+        return self.get_value()
+
+
 class BreakpointSetResponse(Response):
     """Response object returned by the breakpoint_set command."""
 
@@ -170,6 +224,28 @@ class BreakpointSetResponse(Response):
         return self.as_xml().get('id')
 
 
+class BreakpointListResponse(Response):
+    """Response object returned by the breakpoint_list command."""
+
+    def get_breakpoints(self):
+        return list(self.as_xml())
+
+
+class Notification(Response):
+    """A notification sent by the debugger outside of any command, e.g.
+    breakpoint_resolved."""
+
+    def get_name(self):
+        return self.as_xml().get('name')
+
+    def get_breakpoint(self):
+        """Get the breakpoint element of a breakpoint notification."""
+        for c in list(self.as_xml()):
+            if str(c.tag).endswith('breakpoint'):
+                return c
+        return None
+
+
 class FeatureGetResponse(Response):
     """Response object specifically for the feature_get command."""
 
@@ -194,6 +270,8 @@ class Api:
 
     conn = None
     transID = 0
+    trans_id_regex = re.compile(r'transaction_id="(\d+)"')
+    notify_regex = re.compile(r'\s*(<\?xml[^>]*\?>)?\s*<notify\b')
 
     def __init__(self, connection):
         """Create a new Api using a Connection object.
@@ -208,7 +286,11 @@ class Api:
         self.protocol = None
         self.idekey = None
         self.startfile = None
+        self.engine_name = None
+        self.engine_version = None
         self.conn = connection
+        self.notifications = []
+        self.__pipeline = None
         if self.conn.isconnected() == 0:
             self.conn.open()
         self.__parse_init_msg(self.conn.recv_msg())
@@ -227,7 +309,20 @@ class Api:
         self.language = self.language.lower()
         self.idekey = xml.get("idekey")
         self.version = xml.get("api_version")
+        self.protocol = xml.get("protocol_version")
         self.startfile = xml.get("fileuri")
+        for child in xml:
+            if str(child.tag).endswith('engine'):
+                self.engine_name = child.text
+                self.engine_version = child.get("version")
+
+    def identity(self):
+        """A string identifying the debugger engine.
+
+        Engines with the same identity have the same capabilities."""
+        return "|".join(str(part) for part in (
+            self.language, self.engine_name, self.engine_version,
+            self.version, self.protocol))
 
     def send_cmd(self, cmd, args='', res_cls=Response):
         """Send a command to the debugger.
@@ -248,12 +343,86 @@ class Api:
         send += ' -i ' + str(self.transID)
         if args:
             send += ' ' + args
+        if self.__pipeline is not None:
+            self.__pipeline.append((self.transID, send, cmd, args, res_cls))
+            return len(self.__pipeline) - 1
         log.Log("Command: " + send, log.Logger.DEBUG)
         self.conn.send_msg(send)
         msg = self.conn.recv_msg()
         log.Log("Response: " + msg, log.Logger.DEBUG)
+        while self.__add_notification(msg):
+            msg = self.conn.recv_msg()
+            log.Log("Response: " + msg, log.Logger.DEBUG)
         return res_cls(msg, cmd, args, self)
 
+    def pop_notifications(self):
+        """Get the notifications received since the last call."""
+        notifications, self.notifications = self.notifications, []
+        return notifications
+
+    def __add_notification(self, msg):
+        if self.notify_regex.match(msg) is None:
+            return False
+        try:
+            self.notifications.append(Notification(msg, 'notify', '', self))
+        except (DBGPError, ResponseError, ET.ParseError) as e:
+            log.Log("Ignoring invalid notification: %s" % e,
+                    log.Logger.DEBUG)
+        return True
+
+    def pipeline(self, queue):
+        """Send several commands to the debugger in one go.
+
+        While the queue callback runs, the Api methods it calls don't wait
+        for a response: they return the position of their command in the
+        pipeline instead. All the commands are then written to the
+        connection at once, and the responses are read back and matched to
+        their command by transaction ID.
+
+        Returns a list with the response to each command, in the order
+        they were queued. If the debugger returned an error for a command,
+        the exception is put in the list instead of raised.
+
+        queue -- callable which calls the Api methods to pipeline
+        """
+        if self.__pipeline is not None:
+            raise DBGPError("Pipelines can't be nested", 1)
+        self.__pipeline = []
+        try:
+            queue()
+            pending = self.__pipeline
+        finally:
+            self.__pipeline = None
+        if not pending:
+            return []
+
+        sends = [p[1] for p in pending]
+        log.Log("Pipelining commands: " + ", ".join(sends), log.Logger.DEBUG)
+        self.conn.send_msg("\0".join(sends))
+
+        positions = {p[0]: i for i, p in enumerate(pending)}
+        responses = [None] * len(pending)
+        remaining = len(pending)
+        while remaining > 0:
+            msg = self.conn.recv_msg()
+            log.Log("Response: " + msg, log.Logger.DEBUG)
+            if self.__add_notification(msg):
+                continue
+            m = self.trans_id_regex.search(msg)
+            if m is None or int(m.group(1)) not in positions:
+                log.Log("Ignoring message outside of the pipeline",
+                        log.Logger.DEBUG)
+                continue
+            i = positions.pop(int(m.group(1)))
+            trans_id, send, cmd, args, res_cls = pending[i]
+            try:
+                responses[i] = res_cls(msg, cmd, args, self)
+            except (DBGPError, CmdNotImplementedError, EvalError,
+                    ResponseError) as e:
+                responses[i] = e
+            remaining -= 1
+        return responses
+
     def status(self):
         """Get the debugger status.
 
@@ -349,13 +518,32 @@ class Api:
         """
         return self.send_cmd('context_names', '', ContextNamesResponse)
 
-    def property_get(self, name):
+    def property_get(self, name, page=0, context=0, stack=0):
         """Get a property.
+
+        Only the children on the given page are returned, the size of
+        a page being determined by the max_children feature.
+        """
+        args = '-n "%s" -d %i' % (
+            name.replace("\\", "\\\\").replace("\"", "\\\""),
+            int(stack))
+        if context:
+            args += ' -c %i' % int(context)
+        if page:
+            args += ' -p %i' % int(page)
+        return self.send_cmd('property_get', args, ContextGetResponse)
+
+    def property_value(self, name, context=0, stack=0):
+        """Get the full value of a property.
+
+        The value is not limited by the max_data feature.
         """
         return self.send_cmd(
-            'property_get',
-            '-n "%s" -d 0' % name.replace("\\", "\\\\").replace("\"", "\\\""),
-            ContextGetResponse
+            'property_value',
+            '-n "%s" -d %i -c %i -m 0' % (
+                name.replace("\\", "\\\\").replace("\"", "\\\""),
+                int(stack), int(context)),
+            PropertyValueResponse
         )
 
     def detach(self):
@@ -376,7 +564,7 @@ class Api:
         return self.send_cmd('breakpoint_set', cmd_args, BreakpointSetResponse)
 
     def breakpoint_list(self):
-        return self.send_cmd('breakpoint_list')
+        return self.send_cmd('breakpoint_list', '', BreakpointListResponse)
 
     def breakpoint_disable(self, id):
         return self.send_cmd('breakpoint_update', '-d %i -s disabled' % id, Response)
@@ -384,6 +572,10 @@ class Api:
     def breakpoint_enable(self, id):
         return self.send_cmd('breakpoint_update', '-d %i -s enabled' % id, Response)
 
+    def breakpoint_move(self, id, line):
+        return self.send_cmd('breakpoint_update', '-d %i -n %i' % (id, line),
+                             Response)
+
     def breakpoint_remove(self, id):
         """Remove a breakpoint by ID.
 
@@ -404,7 +596,11 @@ class ContextProperty:
 
         self.size = node.get('size')
         self.value = ""
+        self.truncated = False
         self.is_last_child = False
+        self.page = int(node.get('page', 0))
+        pagesize = node.get('pagesize')
+        self.pagesize = int(pagesize) if pagesize is not None else None
 
         self._determine_children(node)
         self.__determine_value(node)
@@ -434,10 +630,19 @@ class ContextProperty:
         if self.value is None:
             self.value = ""
 
+        self.truncated = self.__is_truncated()
         self.num_crs = self.value.count('\n')
         if self.type.lower() in ("string", "str", "scalar"):
             self.value = '`%s`' % self.value.replace('`', '\\`')
 
+    def __is_truncated(self):
+        """Whether the engine cut the value short because of max_data."""
+        try:
+            size = int(self.size)
+        except (TypeError, ValueError):
+            return False
+        return size > len(self.value.encode('utf-8'))
+
     def __determine_type(self, node):
         type = node.get('classname')
         if type is None:
@@ -482,7 +687,8 @@ class ContextProperty:
 
     def __init_children(self, node):
         if self.has_children:
-            idx = 0
+            # children on later pages are numbered after the earlier pages
+            idx = self.page * self.pagesize if self.pagesize else 0
             tagname = '%sproperty' % self.ns
             children = list(node)
             if children is not None:
@@ -500,12 +706,32 @@ class ContextProperty:
     def mark_as_last_child(self):
         self.is_last_child = True
 
+    def adopt_children(self, other):
+        """Take the children of the same property fetched separately."""
+        self.children = other.children
+        self.page = other.page
+        self.pagesize = other.pagesize
+        for c in self.children:
+            c.parent = self
+            c.set_depth(self.depth + 1)
+
+    def set_depth(self, depth):
+        self.depth = depth
+        for c in self.children:
+            c.set_depth(depth + 1)
+
     def is_uninitialized(self):
         return self.type == 'uninitialized'
 
     def child_count(self):
         return len(self.children)
 
+    def has_more_pages(self):
+        """Whether the engine holds children beyond the current page."""
+        if not self.pagesize or not self.children:
+            return False
+        return (self.page + 1) * self.pagesize < self.num_declared_children
+
     def type_and_size(self):
         size = None
         if self.has_children:
@@ -515,9 +741,46 @@ class ContextProperty:
 
         if size is None:
             return self.type
+        if self.truncated:
+            return "%s [%s, truncated]" % (self.type, size)
         return "%s [%s]" % (self.type, size)
 
 
+class ContextPageProperty:
+    """Placeholder for the next page of children of a property.
+
+    It is shown as a closed node in the watch window, and opening it
+    fetches the page with property_get.
+    """
+
+    def __init__(self, parent):
+        self.parent = parent
+        self.depth = parent.depth + 1
+        self.display_name = parent.display_name
+        self.page = parent.page + 1
+        self.type = "page %i" % self.page
+        self.size = min(parent.pagesize, parent.num_declared_children -
+                        self.page * parent.pagesize)
+        self.value = "next %i of %i" % (self.size,
+                                        parent.num_declared_children)
+        self.num_crs = 0
+        self.has_children = True
+        self.children = []
+        self.is_last_child = True
+
+    def child_count(self):
+        return 0
+
+    def has_more_pages(self):
+        return False
+
+    def is_uninitialized(self):
+        return False
+
+    def type_and_size(self):
+        return self.type
+
+
 class EvalProperty(ContextProperty):
     def __init__(self, node, code, language, parent=None, depth=0):
         self.code = code
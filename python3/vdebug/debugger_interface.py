@@ -1,3 +1,5 @@
+import os
+
 import vim
 
 from . import breakpoint
@@ -54,20 +56,52 @@ class DebuggerInterface:
         """
         self.session_handler.dispatch_event("run_to_cursor")
 
-    def step_over(self):
+    def step_over(self, count=1):
         """Step over to the next statement.
+
+        count -- number of times to step, without refreshing the UI in
+                 between
         """
-        self.session_handler.dispatch_event("step_over")
+        self.session_handler.dispatch_event("step_over", count)
 
-    def step_into(self):
+    def step_into(self, count=1):
         """Step into a statement on the current line.
+
+        count -- number of times to step, without refreshing the UI in
+                 between
         """
-        self.session_handler.dispatch_event("step_into")
+        self.session_handler.dispatch_event("step_into", count)
 
-    def step_out(self):
+    def step_out(self, count=1):
         """Step out of the current statement.
+
+        count -- number of times to step, without refreshing the UI in
+                 between
+        """
+        self.session_handler.dispatch_event("step_out", count)
+
+    def step_until(self, bang, code):
+        """Step until the value of an expression changes, stepping into
+        statements, or over them with a bang.
         """
-        self.session_handler.dispatch_event("step_out")
+        step = "step_over" if bang == "!" else "step_into"
+        self.session_handler.dispatch_event("step_until", step, code)
+
+    def flush_refresh(self):
+        """Refresh the UI if it was put off while keys were pending.
+        """
+        self.session_handler.dispatch_event("flush_refresh")
+
+    def expand(self, depth):
+        """Expand the property under the cursor in the watch window, down to
+        the given depth.
+        """
+        self.session_handler.dispatch_event("expand", depth)
+
+    def handle_watch_scroll(self):
+        """React to the cursor moving or scrolling in the watch window.
+        """
+        self.session_handler.ui().windows.watch().on_scroll()
 
     def handle_return_keypress(self):
         """React to a <enter> keypress event.
@@ -122,6 +156,42 @@ class DebuggerInterface:
     def toggle_breakpoint_window(self):
         self.session_handler.ui().toggle_window("DebuggerBreakpoints")
 
+    def load_breakpoints(self):
+        """Restore breakpoints from the breakpoint file, if there is one.
+        """
+        filename = opts.Options.get('breakpoint_file')
+        if filename:
+            with self.ui.signs.batch():
+                self.breakpoints.load(
+                    os.path.abspath(os.path.expanduser(filename)), self.ui)
+
+    def place_breakpoint_signs(self, filename):
+        """Place the signs of the breakpoints in a buffer that was read.
+        """
+        self.ui.place_breakpoint_signs(
+            self.breakpoints.get_breakpoints_in_file(filename))
+
+    def lines_changed(self, filename, changes):
+        """Move the breakpoints in a buffer after lines were changed.
+        """
+        self.session_handler.dispatch_event("lines_changed", filename,
+                                            changes)
+
+    def buffer_written(self):
+        """Save the lines that breakpoints were moved to while editing, once
+        the buffer is written.
+        """
+        self.breakpoints.save_moved()
+
+    def show_logpoints(self, bang=''):
+        """Show the values recorded by logpoints, or clear them with a bang.
+        """
+        history = self.session_handler.logpoint_history
+        if bang:
+            history.clear()
+        else:
+            self.ui.show_value(str(history) or "No logpoint hits recorded")
+
     def get_last_error(self):
         return self.session_handler.ui().get_last_error()
 
@@ -184,3 +254,9 @@ class DebuggerInterface:
         """Close the connection, or the UI if already closed. On Exit
         """
         self.session_handler.stop(quiet=True)
+        if self.breakpoints.filename:
+            # pick up lines that moved while editing
+            self.breakpoints.update_lines(
+                self.ui.get_breakpoint_sign_positions(
+                    self.breakpoints.get_files()))
+            self.breakpoints.save()
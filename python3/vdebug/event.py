@@ -1,15 +1,18 @@
 # coding=utf-8
 import re
+import time
 
 import vim
 
 from . import breakpoint
 from . import dbgp
 from . import error
+from . import expand
 from . import log
 from . import opts
 from . import util
-from .ui import vimui
+from .ui import render
+from .ui import tree
 
 
 class Event:
@@ -138,26 +141,122 @@ class WatchWindowPropertyGetEvent(Event):
 
     """Open a tree node in the watch window.
 
-    This retrieves the child nodes and displays them underneath.
+    This retrieves the child nodes and displays them underneath. If the
+    node is a page placeholder, the next page of children replaces it.
     """
 
     def run(self):
+        watch = self.ui.windows.watch()
         lineno = vim.current.window.cursor[0]
-        line = vim.current.buffer[lineno-1]
-        pointer_index = line.find(opts.Options.get('marker_closed_tree'))
-        step = len(opts.Options.get('marker_closed_tree')) + 1
+        line = watch.property_at(lineno)
+        if line is None:
+            raise error.EventError("Cannot read the selected property")
+
+        prop = line.prop
+        name = prop.display_name
+        shown = watch.shown_context
+        context_id, stack = shown if shown is not None else (0, 0)
+        if isinstance(prop, dbgp.ContextPageProperty):
+            log.Log("Getting page %i of %s" % (prop.page, name),
+                    log.Logger.DEBUG)
+            context_res = self.api.property_get(name, prop.page, context_id,
+                                                stack)
+            rend = render.ContextGetResponseRenderer(context_res)
+            # the children sit one level below the page placeholder's parent
+            output = rend.render(line.column - 3, True)
+        else:
+            context_res = self.api.property_get(name, 0, context_id, stack)
+            rend = render.ContextGetResponseRenderer(context_res)
+            output = rend.render(line.column - 1)
+            if shown is not None:
+                self.session.remember_expanded(context_id, stack, name)
+        watch.replace(lineno - 1, watch.index.subtree_end(lineno - 1),
+                      output[:-1], rend.lines[:-1])
+
+
+class WatchWindowExpandEvent(Event):
 
-        eq_index = line.find('=')
-        if eq_index == -1:
+    """Open a tree node in the watch window, and its descendants down to a
+    given depth.
+
+    The whole subtree is fetched before it's written to the window, in one
+    go. An open node is closed first.
+    """
+
+    def run(self, depth):
+        if not self.session or not self.session.is_connected():
+            self.ui.say("Expanding a property is only possible when "
+                        "Vdebug is running")
+            return False
+        watch = self.ui.windows.watch()
+        if Dispatcher._get_window_name() != watch.name:
+            self.ui.error("Properties can only be expanded in the watch "
+                          "window")
+            return False
+        try:
+            depth = int(depth) if depth else 2
+        except ValueError:
+            self.ui.error("The depth to expand to must be a number")
+            return False
+
+        lineno = vim.current.window.cursor[0]
+        line = watch.property_at(lineno)
+        if line is not None and line.prop.has_children and \
+                line.prop.child_count() > 0:
+            WatchWindowHideEvent(self.session_handler).run()
+            line = watch.property_at(lineno)
+        if line is None or not line.prop.has_children or \
+                isinstance(line.prop, dbgp.ContextPageProperty):
+            self.ui.error("There is no property to expand under the cursor")
+            return False
+        name = line.prop.display_name
+
+        shown = watch.shown_context
+        context_id, stack = shown if shown is not None else (0, 0)
+        expander = expand.Expander(self.api, context_id, stack,
+                                   opts.Options.get('expand_limit', int))
+        context_res, fetched = expander.expand(name, depth)
+        rend = render.ContextGetResponseRenderer(context_res)
+        output = rend.render(line.column - 1)
+        watch.replace(lineno - 1, watch.index.subtree_end(lineno - 1),
+                      output[:-1], rend.lines[:-1])
+
+        if shown is not None:
+            for n in fetched:
+                self.session.remember_expanded(context_id, stack, n)
+        if expander.limit_reached:
+            self.ui.say("Stopped expanding %s after %i properties, see "
+                        ":help VdebugOptions-expand_limit"
+                        % (name, len(fetched)))
+
+
+class WatchWindowPropertyValueEvent(Event):
+
+    """Show the full value of a truncated property in the watch window.
+
+    The value is retrieved with property_value and shown in the value
+    window. It is cached until the debugger moves to a new position.
+    """
+
+    def run(self):
+        lineno = vim.current.window.cursor[0]
+        line = self.ui.windows.watch().property_at(lineno)
+        if line is None:
             raise error.EventError("Cannot read the selected property")
 
-        name = line[pointer_index+step:eq_index-1]
-        context_res = self.api.property_get(name)
-        rend = vimui.ContextGetResponseRenderer(context_res)
-        output = rend.render(pointer_index - 1)
-        if opts.Options.get('watch_window_style') == 'expanded':
-            self.ui.windows.watch().delete(lineno, lineno+1)
-        self.ui.windows.watch().insert(output.rstrip(), lineno-1, True)
+        name = line.prop.display_name
+        context_id = self.ui.selected_context
+        stack = self.ui.selected_stack or 0
+        key = (name, context_id, stack)
+        if key in self.session.full_values:
+            log.Log("Using cached value of %s" % name, log.Logger.DEBUG)
+            value = self.session.full_values[key]
+        else:
+            log.Log("Getting full value of %s" % name)
+            value = self.api.property_value(name, context_id,
+                                            stack).get_value()
+            self.session.full_values[key] = value
+        self.ui.show_value(value)
 
 
 class WatchWindowHideEvent(Event):
@@ -166,33 +265,28 @@ class WatchWindowHideEvent(Event):
     """
 
     def run(self):
+        watch = self.ui.windows.watch()
         lineno = vim.current.window.cursor[0]
-        line = vim.current.buffer[lineno-1]
-        pointer_index = line.find(opts.Options.get('marker_open_tree'))
-
-        buf_len = len(vim.current.buffer)
-        end_lineno = buf_len - 1
-        for i in range(lineno, end_lineno):
-            buf_line = vim.current.buffer[i]
-
-            # If the value of the variable contains a new line and the new line
-            # is shorter than the variables tree level, skip it, to avoid an
-            # IndexError
-            if pointer_index >= len(buf_line):
-                continue
-
-            char = buf_line[pointer_index]
-            if char != " ":
-                end_lineno = i - 1
-                break
-        self.ui.windows.watch().delete(lineno, end_lineno+1)
-        if opts.Options.get('watch_window_style') == 'expanded':
-            append = "\n" + "".rjust(pointer_index) + "|"
-        else:
-            append = ""
-        self.ui.windows.watch().insert(line.replace(
+        line = watch.property_at(lineno)
+        if line is None:
+            raise error.EventError("Cannot read the selected property")
+
+        shown = watch.shown_context
+        if shown is not None:
+            self.session.forget_expanded(shown[0], shown[1],
+                                         line.prop.display_name)
+
+        # without children the property is shown as closed again
+        line.prop.children = []
+        lines = [watch.line_at(lineno - 1).replace(
             opts.Options.get('marker_open_tree'),
-            opts.Options.get('marker_closed_tree'), 1)+append, lineno-1, True)
+            opts.Options.get('marker_closed_tree'), 1)]
+        if opts.Options.get('watch_window_style') == 'expanded':
+            lines.append("".rjust(line.column) + "|")
+        watch.replace(lineno - 1, watch.index.subtree_end(lineno - 1), lines,
+                      [line] + [tree.Line(line.prop, line.indent, False)
+                                for l in lines[1:]])
+        watch.skip_hidden(line.prop)
 
 
 class WatchWindowContextChangeEvent(Event):
@@ -272,7 +366,13 @@ class WatchWindowContextChangeEvent(Event):
 
 class RefreshEvent(Event):
 
-    def run(self, status):
+    def run(self, status, defer=True):
+        """Update the UI for the status returned by a run or step.
+
+        defer -- put off the refresh at a break while keys are waiting to
+                 be read, e.g. because a step key is held down, so that
+                 only the position reached by the last step is rendered
+        """
 
         try:
             status_str = str(status)
@@ -282,6 +382,8 @@ class RefreshEvent(Event):
         if not status_str:
             return
 
+        self.session.full_values = {}
+
         if status_str == "interactive":
             self.ui.error("Debugger engine says it is in interactive mode,"
                           "which is not supported: closing connection")
@@ -295,28 +397,129 @@ class RefreshEvent(Event):
             if opts.Options.get('continuous_mode', int) != 0:
                 self.dispatch("listen")
         else:
-            log.Log("Getting stack information")
+            self.session.deferred_refresh = None
             self.ui.set_status(status)
-            stack_res = self.__update_stack()
-            stack = stack_res.get_stack()
+            if defer and self.__put_off(status):
+                return
+            self.__refresh(status, defer)
 
-            self.session.cur_file = util.RemoteFilePath(
-                stack[0].get('filename'))
-            self.session.cur_lineno = stack[0].get('lineno')
+    def __put_off(self, status):
+        """Keep the status for later if there are pending keys, which are
+        likely to make the refresh stale."""
+        if not util.InputStream.pending() or \
+                vim.eval("exists('*timer_start')") == "0":
+            return False
+        log.Log("Keys are pending, putting off the refresh",
+                log.Logger.DEBUG)
+        self.session.deferred_refresh = status
+        vim.command("call timer_start(0, 'Vdebug_flush_refresh')")
+        return True
 
-            log.Log("Moving to current position in source window")
-            self.ui.set_source_position(self.session.cur_file,
-                                        self.session.cur_lineno)
+    def __refresh(self, status, defer):
+        """Query the debugger for everything shown at a break, and update
+        the windows.
 
-            self.dispatch("get_context", 0)
+        The features changed by tuning, the stack, the first context (or
+        the persistent eval), the trace expression, the breakpoint list
+        and the properties that were expanded in the context are all sent
+        in a single pipeline, so a step costs one round trip however many
+        windows need refreshing.
+        """
+        timer = util.Timer("Refresh")
+        watch = self.ui.windows.watch()
+        trace = self.ui.windows.trace()
+        breakpoints = self.session_handler.breakpoints()
+        context_id = 0
+        eval_expr = None
+        if watch.has_persistent_eval():
+            eval_expr = watch.get_eval_expression()
+        trace_expr = None
+        if trace.is_tracing():
+            trace_expr = trace.get_trace_expression()
+        sync_breakpoints = breakpoints.can_sync()
+
+        expanded = []
+        if eval_expr is None:
+            expanded = self.session.expanded_properties(context_id)
+        queued = {}
+
+        def queue():
+            queued['tuned'] = self.session.queue_tuned_features()
+            queued['stack'] = self.api.stack_get()
+            if eval_expr is None:
+                queued['context'] = self.api.context_get(context_id)
+            else:
+                queued['context'] = self.api.eval(eval_expr)
+            if trace_expr is not None:
+                queued['trace'] = self.api.eval(trace_expr)
+            if sync_breakpoints:
+                queued['breakpoints'] = self.api.breakpoint_list()
+            queued['expanded'] = [self.api.property_get(name, 0, context_id)
+                                  for name in expanded]
+
+        log.Log("Getting stack information")
+        responses = self.api.pipeline(queue)
+        timer.log("Querying the debugger", log.Logger.DEBUG)
+        self.session.check_tuned_features(queued['tuned'], responses)
+        if defer and self.__put_off(status):
+            return
+        stack_res = responses[queued['stack']]
+        context_res = responses[queued['context']]
+        if isinstance(stack_res, Exception):
+            raise stack_res
+
+        self.__update_stack(stack_res)
+        stack = stack_res.get_stack()
+        self.session.cur_file = util.RemoteFilePath(
+            stack[0].get('filename'))
+        self.session.cur_lineno = stack[0].get('lineno')
+
+        log.Log("Moving to current position in source window")
+        self.ui.set_source_position(self.session.cur_file,
+                                    self.session.cur_lineno)
+
+        breakpoints.apply_notifications(self.api.pop_notifications())
+        if sync_breakpoints:
+            list_res = responses[queued['breakpoints']]
+            if isinstance(list_res, Exception):
+                log.Log("Failed to list breakpoints: %s" % list_res,
+                        log.Logger.ERROR)
+            else:
+                breakpoints.reconcile(list_res.get_breakpoints())
+
+        if eval_expr is None:
+            if isinstance(context_res, Exception):
+                raise context_res
+            GetContextEvent.expand(context_res, expanded,
+                                   [responses[i] for i in queued['expanded']])
+            GetContextEvent(self.session_handler).show(
+                context_res, context_id, timer.start)
+        else:
+            EvalEvent(self.session_handler).show(eval_expr, context_res)
+        if trace_expr is not None:
+            TraceRefreshEvent(self.session_handler).show(
+                responses[queued['trace']])
+
+        log.Log("Step to render took %.3fs" % timer.elapsed(),
+                log.Logger.INFO)
 
-    def __update_stack(self):
+    def __update_stack(self, res):
         """Update the stack window with the current stack info.
         """
-        res = self.api.stack_get()
-        renderer = vimui.StackGetResponseRenderer(res)
+        renderer = render.StackGetResponseRenderer(res)
         self.ui.windows.stack().accept_renderer(renderer)
-        return res
+
+
+class FlushRefreshEvent(Event):
+
+    def run(self):
+        """Run the refresh that was put off while keys were pending."""
+        if not self.session or self.session.deferred_refresh is None:
+            return
+        status = self.session.deferred_refresh
+        self.session.deferred_refresh = None
+        if self.session.is_connected():
+            RefreshEvent(self.session_handler).run(status, False)
 
 
 class RunEvent(Event):
@@ -325,7 +528,7 @@ class RunEvent(Event):
         if self.session.is_connected():
             log.Log("Running")
             self.ui.set_status("running")
-            res = self.api.run()
+            res = self.session.pass_logpoints(self.api.run())
             self.dispatch("refresh", res)
         else:
             self.dispatch("listen")
@@ -339,7 +542,7 @@ class ListenEvent(Event):
 
 class StepOverEvent(Event):
 
-    def run(self):
+    def run(self, count=1):
         if not self.session or not self.session.is_connected():
             self.ui.say("Step over is only possible when "
                           "Vdebug is running")
@@ -347,13 +550,13 @@ class StepOverEvent(Event):
 
         log.Log("Stepping over")
         self.ui.set_status("running")
-        res = self.api.step_over()
+        res = self.session.step("step_over", count)
         self.dispatch("refresh", res)
 
 
 class StepIntoEvent(Event):
 
-    def run(self):
+    def run(self, count=1):
         if not self.session or not self.session.is_connected():
             self.ui.say("Step in is only possible when "
                           "Vdebug is running")
@@ -361,13 +564,13 @@ class StepIntoEvent(Event):
 
         log.Log("Stepping into statement")
         self.ui.set_status("running")
-        res = self.api.step_into()
+        res = self.session.step("step_into", count)
         self.dispatch("refresh", res)
 
 
 class StepOutEvent(Event):
 
-    def run(self):
+    def run(self, count=1):
         if not self.session or not self.session.is_connected():
             self.ui.say("Step out is only possible when "
                           "Vdebug is running")
@@ -375,10 +578,39 @@ class StepOutEvent(Event):
 
         log.Log("Stepping out of statement")
         self.ui.set_status("running")
-        res = self.api.step_out()
+        res = self.session.step("step_out", count)
         self.dispatch("refresh", res)
 
 
+class StepUntilEvent(Event):
+
+    def run(self, step, code):
+        if not self.session or not self.session.is_connected():
+            self.ui.say("Stepping is only possible when Vdebug is running")
+            return False
+        if not code:
+            self.ui.error("You must supply an expression to watch, with "
+                          "`:VdebugStepUntil expr`")
+            return False
+
+        log.Log("Stepping until the value of %s changes" % code)
+        self.ui.set_status("running")
+
+        def progress(steps):
+            self.ui.set_status("running (%i steps)" % steps)
+            vim.command("redraw")
+
+        res, steps, changed = self.session.stepper().until(
+            step, code, opts.Options.get('step_until_limit', int), progress)
+        self.dispatch("refresh", res)
+        if changed:
+            self.ui.say("The value of '%s' changed after %i steps"
+                        % (code, steps))
+        elif str(res) == "break":
+            self.ui.say("Stopped after %i steps, the value of '%s' didn't "
+                        "change" % (steps, code))
+
+
 class RunToCursorEvent(Event):
 
     def run(self):
@@ -401,16 +633,25 @@ class RunToCursorEvent(Event):
 class EvalEvent(Event):
 
     def run(self, code):
+        log.Log("Evaluating code: %s" % code)
         try:
-            log.Log("Evaluating code: %s" % code)
-
             context_res = self.api.eval(code)
-            rend = vimui.ContextGetResponseRenderer(
-                context_res, "Eval of: '%s'" % context_res.get_code())
-
-            self.ui.windows.watch().accept_renderer(rend)
-        except dbgp.EvalError:
+        except dbgp.EvalError as e:
+            context_res = e
+        self.show(code, context_res)
+
+    def show(self, code, context_res):
+        """Show the response to an eval, or the EvalError it raised, in the
+        watch window."""
+        if isinstance(context_res, dbgp.EvalError):
             self.ui.error("Failed to evaluate invalid code, '%s'" % code)
+            return
+        if isinstance(context_res, Exception):
+            raise context_res
+        rend = render.ContextGetResponseRenderer(
+            context_res, "Eval of: '%s'" % context_res.get_code())
+        self.ui.windows.watch().accept_renderer(rend)
+        self.ui.windows.watch().shown_context = None
 
 
 class SetEvalExpressionEvent(Event):
@@ -480,7 +721,12 @@ class SetBreakpointEvent(Event):
                 bp.get_file(), bp.get_line())
             if id is not None:
                 self.session_handler.breakpoints().remove_breakpoint_by_id(id)
-                return
+                # a hit condition replaces the breakpoint instead
+                if bp.hit_value is None:
+                    return
+        if not self.session_handler.breakpoints().is_supported(bp):
+            self.ui.error("The debugger doesn't support %s breakpoints, so "
+                          "it won't stop at this one" % bp.get_dbgp_type())
         self.session_handler.breakpoints().add_breakpoint(bp)
 
 
@@ -565,7 +811,7 @@ class BreakpointJumpEvent(BreakpointStatusEvent):
 
         bp = self.get_breakpoint(id[0].strip())
 
-        if  bp is not None and (bp.type == "line" or bp.type == "conditional"):
+        if bp is not None and bp.type in ("line", "conditional", "log"):
             file = bp.get_file()
             lineno = bp.get_line()
             self.ui.sourcewin.set_file(file)
@@ -597,7 +843,7 @@ class ToggleBreakpointEvent(BreakpointStatusEvent):
         id = parsed_args["id"]
         bp = self.get_breakpoint(id)
 
-        if bp is not None and bp.type == "line":
+        if bp is not None and bp.type in ("line", "log"):
             self.session_handler.breakpoints().toggle_breakpoint_by_id(bp.id)
 
 
@@ -608,8 +854,8 @@ class EnableBreakpointEvent(BreakpointStatusEvent):
         id = parsed_args["id"]
         bp = self.get_breakpoint(id)
 
-        if bp is not None and bp.type == "line":
-            self.session_handler.breakpoints().enable_breakpoint_by_id(id)
+        if bp is not None and bp.type in ("line", "log"):
+            self.session_handler.breakpoints().enable_breakpoint_by_id(bp.id)
 
 
 class DisableBreakpointEvent(BreakpointStatusEvent):
@@ -619,8 +865,8 @@ class DisableBreakpointEvent(BreakpointStatusEvent):
         id = parsed_args["id"]
         bp = self.get_breakpoint(id)
 
-        if bp is not None and bp.type == "line":
-            self.session_handler.breakpoints().disable_breakpoint_by_id(id)
+        if bp is not None and bp.type in ("line", "log"):
+            self.session_handler.breakpoints().disable_breakpoint_by_id(bp.id)
 
 
 class RemoveBreakpointEvent(Event):
@@ -643,6 +889,13 @@ class RemoveBreakpointEvent(Event):
                 self.session_handler.breakpoints().remove_breakpoint_by_id(id)
 
 
+class LinesChangedEvent(Event):
+
+    def run(self, filename, changes):
+        """Move the breakpoints in a buffer after lines were changed."""
+        self.session_handler.breakpoints().shift_lines(filename, changes)
+
+
 class GetContextEvent(Event):
 
     def run(self, context_id):
@@ -652,17 +905,49 @@ class GetContextEvent(Event):
         else:
             name = self.session.context_names[context_id]
             log.Log("Getting %s variables" % name)
-            context_res = self.api.context_get(context_id)
-            rend = vimui.ContextGetResponseRenderer(
-                context_res, "%s at %s:%s" % (name, self.ui.sourcewin.file,
-                                              self.session.cur_lineno),
-                self.session.context_names, context_id)
-            self.ui.windows.watch().accept_renderer(rend)
-            self.ui.selected_stack = None
-            self.ui.selected_context = context_id
+            start = time.time()
+            expanded = self.session.expanded_properties(context_id)
+            responses = self.api.pipeline(
+                lambda: [self.api.context_get(context_id)] +
+                [self.api.property_get(n, 0, context_id) for n in expanded])
+            if isinstance(responses[0], Exception):
+                raise responses[0]
+            self.expand(responses[0], expanded, responses[1:])
+            self.show(responses[0], context_id, start)
 
         self.dispatch("trace_refresh")
 
+    @staticmethod
+    def expand(context_res, names, responses):
+        """Put the children of the properties that were expanded before,
+        fetched with property_get, under their properties in a context."""
+        for name, res in zip(names, responses):
+            if isinstance(res, Exception):
+                log.Log("Failed to expand %s again: %s" % (name, res.args[0]),
+                        log.Logger.DEBUG)
+            elif not context_res.expand(name, res):
+                log.Log("Property %s isn't shown to be expanded" % name,
+                        log.Logger.DEBUG)
+
+    def show(self, context_res, context_id, start):
+        """Show a context of the current stack frame in the watch window.
+
+        start -- time at which the context was requested, used to tune the
+                 features to the cost of fetching and rendering it
+        """
+        name = self.session.context_names[context_id]
+        rend = render.ContextGetResponseRenderer(
+            context_res, "%s at %s:%s" % (name, self.ui.sourcewin.file,
+                                          self.session.cur_lineno),
+            self.session.context_names, context_id)
+        self.ui.windows.watch().accept_renderer(rend)
+        self.ui.windows.watch().shown_context = (context_id, 0)
+        self.ui.selected_stack = None
+        self.ui.selected_context = context_id
+        self.session.tune_features(len(context_res.as_string()),
+                                   len(context_res.properties),
+                                   time.time() - start)
+
 
 class TraceRefreshEvent(Event):
 
@@ -672,11 +957,21 @@ class TraceRefreshEvent(Event):
             log.Log("Tracing expression: %s" % trace_expr)
             try:
                 context_res = self.api.eval(trace_expr)
-                rend = vimui.ContextGetResponseRenderer(
-                    context_res, "Trace of: '%s'" % context_res.get_code())
-                self.ui.windows.trace().render(rend)
-            except dbgp.EvalError:
-                self.ui.windows.trace().render_in_error_case()
+            except dbgp.EvalError as e:
+                context_res = e
+            self.show(context_res)
+
+    def show(self, context_res):
+        """Show the response to the trace expression, or the EvalError it
+        raised, in the trace window."""
+        if isinstance(context_res, dbgp.EvalError):
+            self.ui.windows.trace().render_in_error_case()
+            return
+        if isinstance(context_res, Exception):
+            raise context_res
+        rend = render.ContextGetResponseRenderer(
+            context_res, "Trace of: '%s'" % context_res.get_code())
+        self.ui.windows.trace().render(rend)
 
 
 class ReloadKeymappingsEvent(Event):
@@ -736,13 +1031,21 @@ class ChangeStackEvent(Event):
         context_id = self.ui.selected_context
         name = self.session.context_names[context_id]
         log.Log("Getting %s variables" % name)
-        context_res = self.api.context_get(context_id, args)
-        rend = vimui.ContextGetResponseRenderer(
+        expanded = self.session.expanded_properties(context_id, args)
+        responses = self.api.pipeline(
+            lambda: [self.api.context_get(context_id, args)] +
+            [self.api.property_get(n, 0, context_id, args) for n in expanded])
+        context_res = responses[0]
+        if isinstance(context_res, Exception):
+            raise context_res
+        GetContextEvent.expand(context_res, expanded, responses[1:])
+        rend = render.ContextGetResponseRenderer(
             context_res, "%s at %s:%s" % (name, str(util.FilePath(stack.get('filename')).as_local()),
                                           stack.get('lineno')),
             self.session.context_names, context_id)
         self.ui.selected_stack = args
         self.ui.windows.watch().accept_renderer(rend)
+        self.ui.windows.watch().shown_context = (context_id, int(args))
 
         self.dispatch("trace_refresh")
 
@@ -750,10 +1053,12 @@ class Dispatcher:
     events = {
         "run": RunEvent,
         "refresh": RefreshEvent,
+        "flush_refresh": FlushRefreshEvent,
         "listen": ListenEvent,
         "step_over": StepOverEvent,
         "step_into": StepIntoEvent,
         "step_out": StepOutEvent,
+        "step_until": StepUntilEvent,
         "run_to_cursor": RunToCursorEvent,
         "eval": EvalEvent,
         "set_eval_expression": SetEvalExpressionEvent,
@@ -767,12 +1072,19 @@ class Dispatcher:
         "get_context": GetContextEvent,
         "reload_keymappings": ReloadKeymappingsEvent,
         "remove_breakpoint": RemoveBreakpointEvent,
+        "lines_changed": LinesChangedEvent,
         "trace": TraceEvent,
         "trace_refresh": TraceRefreshEvent,
         "detach": DetachEvent,
         "change_stack": ChangeStackEvent,
+        "expand": WatchWindowExpandEvent,
     }
 
+    # events which make a refresh that was put off stale, as they lead to
+    # a refresh of their own
+    superseding = ["refresh", "run", "step_over", "step_into", "step_out",
+                   "step_until"]
+
     def __init__(self, session_handler):
         self.__session_handler = session_handler
         self.__ex_handler = util.ExceptionHandler(self.__session_handler)
@@ -781,10 +1093,24 @@ class Dispatcher:
         try:
             log.Log("Dispatching {} event".format(name),
                     log.Logger.INFO)
-            Dispatcher.events[name](self.__session_handler).run(*args)
+            with self.__session_handler.ui().signs.batch():
+                self.__settle_refresh(name)
+                Dispatcher.events[name](self.__session_handler).run(*args)
         except Exception as e:
             self.__ex_handler.handle(e)
 
+    def __settle_refresh(self, name):
+        """Drop a refresh that was put off if the event supersedes it, or
+        run it first so that the event sees an up to date UI."""
+        session = self.__session_handler.session()
+        if session is None or session.deferred_refresh is None:
+            return
+        if name in self.superseding:
+            log.Log("Dropping stale refresh", log.Logger.DEBUG)
+            session.deferred_refresh = None
+        else:
+            FlushRefreshEvent(self.__session_handler).run()
+
     def visual_eval(self, session):
         if session.is_connected():
             event = VisualEvalEvent(session)
@@ -831,15 +1157,16 @@ class Dispatcher:
 
             lines = vim.eval('getline({}, {})'.format(lnum1, lnum2))
 
-            for line in lines:
-                id = self._get_breakpoint_id_breakpoint_window(line)
-                if not id:
-                    log.Log("No breakpoint found at current cursor position",
-                        log.Logger.DEBUG)
-                    return False
+            with session.ui().signs.batch():
+                for line in lines:
+                    id = self._get_breakpoint_id_breakpoint_window(line)
+                    if not id:
+                        log.Log("No breakpoint found at current cursor "
+                                "position", log.Logger.DEBUG)
+                        return False
 
-                if event == 'delete':
-                    RemoveBreakpointEvent(session).run(id)
+                    if event == 'delete':
+                        RemoveBreakpointEvent(session).run(id)
 
     @staticmethod
     def _get_event_by_position(session):
@@ -849,13 +1176,17 @@ class Dispatcher:
             lineno = vim.current.window.cursor[0]
             log.Log("User action in watch window, line %s" % lineno,
                     log.Logger.DEBUG)
-            line = session.ui().windows.watch().line_at(lineno - 1).strip()
             if lineno == 1:
                 return WatchWindowContextChangeEvent(session)
-            elif line.startswith(opts.Options.get('marker_closed_tree')):
-                return WatchWindowPropertyGetEvent(session)
-            elif line.startswith(opts.Options.get('marker_open_tree')):
+            line = session.ui().windows.watch().property_at(lineno)
+            if line is None:
+                return None
+            if line.prop.has_children:
+                if line.prop.child_count() == 0:
+                    return WatchWindowPropertyGetEvent(session)
                 return WatchWindowHideEvent(session)
+            if getattr(line.prop, 'truncated', False):
+                return WatchWindowPropertyValueEvent(session)
         elif window_name == session.ui().windows.stack().name:
             return StackWindowLineSelectEvent(session)
         elif window_name == session.ui().windows.breakpoints().name:
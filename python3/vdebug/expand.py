@@ -0,0 +1,69 @@
+from . import dbgp
+from . import log
+
+
+def is_under(name, parent):
+    """Whether a property name is the name of a parent property, or of a
+    property under it, e.g. "$a->b" and "$a['b']" under "$a"."""
+    if not name.startswith(parent):
+        return False
+    rest = name[len(parent):]
+    return not rest or not (rest[0].isalnum() or rest[0] == '_')
+
+
+class Expander:
+    """Fetches a property and its descendants down to a given depth.
+
+    The tree is walked breadth first. The closed properties of each level
+    are fetched together in one pipeline, until the depth or the limit on
+    the number of fetched properties is reached.
+    """
+
+    def __init__(self, api, context=0, stack=0, limit=200):
+        self.api = api
+        self.context = context
+        self.stack = stack
+        self.limit = limit
+        self.limit_reached = False
+
+    def expand(self, name, depth):
+        """Get the property with its descendants, and the names of the
+        properties that were fetched, parents first.
+
+        depth -- number of levels below the property to open
+        """
+        res = self.api.property_get(name, 0, self.context, self.stack)
+        fetched = [name]
+        tried = {name}
+        root = res.get_context()[0]
+        while True:
+            closed = [p.display_name for p in res.get_context()
+                      if self.__is_closed(p) and p.display_name not in tried
+                      and p.depth - root.depth < depth]
+            if not closed:
+                break
+            if len(fetched) + len(closed) > self.limit:
+                closed = closed[:self.limit - len(fetched)]
+                self.limit_reached = True
+                if not closed:
+                    break
+            tried.update(closed)
+            log.Log("Expanding %i properties under %s" % (len(closed), name),
+                    log.Logger.DEBUG)
+            responses = self.api.pipeline(lambda: [
+                self.api.property_get(n, 0, self.context, self.stack)
+                for n in closed])
+            for n, child_res in zip(closed, responses):
+                if isinstance(child_res, Exception):
+                    log.Log("Failed to expand %s: %s"
+                            % (n, child_res.args[0]), log.Logger.DEBUG)
+                elif res.expand(n, child_res):
+                    fetched.append(n)
+            if self.limit_reached:
+                break
+        return (res, fetched)
+
+    @staticmethod
+    def __is_closed(p):
+        return isinstance(p, dbgp.ContextProperty) and p.has_children \
+            and not p.children
@@ -0,0 +1,180 @@
+import json
+import os
+
+from . import log
+
+
+# Features which describe the engine rather than configure it, so they are
+# the same for every session with the same engine. Only the ones that
+# Vdebug acts on are probed.
+CAPABILITIES = [
+    # breakpoints of other types aren't sent to the engine
+    'breakpoint_types',
+    # the feature is only set if the engine has it
+    'resolved_breakpoints',
+]
+
+
+class CapabilityCache:
+    """Engine capabilities, stored on disk between sessions.
+
+    Capabilities are keyed on the engine identity (language, engine
+    version and protocol version), so an engine is only probed again with
+    feature_get when its identity changes.
+    """
+
+    def __init__(self, filename=None):
+        if not filename:
+            filename = self.default_filename()
+        self.filename = os.path.expanduser(filename)
+        self.__entries = None
+
+    @staticmethod
+    def default_filename():
+        cache_home = os.environ.get('XDG_CACHE_HOME',
+                                    os.path.join('~', '.cache'))
+        return os.path.join(cache_home, 'vdebug', 'capabilities.json')
+
+    def get(self, identity):
+        """Get the capabilities of an engine, or None if not cached."""
+        return self.__load().get(identity)
+
+    def set(self, identity, capabilities):
+        """Store the capabilities of an engine."""
+        entries = self.__load()
+        entries[identity] = capabilities
+        try:
+            directory = os.path.dirname(self.filename)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(self.filename, 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+        except (IOError, OSError) as e:
+            log.Log("Failed to write capability cache %s: %s"
+                    % (self.filename, e), log.Logger.ERROR)
+
+    def __load(self):
+        if self.__entries is None:
+            self.__entries = {}
+            try:
+                with open(self.filename, encoding='utf-8') as f:
+                    entries = json.load(f)
+                if isinstance(entries, dict):
+                    self.__entries = entries
+            except (IOError, OSError):
+                pass
+            except ValueError:
+                log.Log("Ignoring invalid capability cache %s"
+                        % self.filename, log.Logger.ERROR)
+        return self.__entries
+
+
+class FeatureTuner:
+    """Adapts the DBGp data size features to a time budget.
+
+    After each context_get, the size of the response and the time taken to
+    fetch, parse and render it are recorded. Between steps the tuner
+    proposes new values for max_data and max_depth, kept within the
+    configured limits, and sizes max_children to the number of properties
+    that fit in the watch window.
+
+    max_children is also the size of the pages of children, so it is left
+    alone while the watch window shows placeholders for further pages:
+    they are fetched by page number, which only counts the same children
+    with the same page size.
+    """
+
+    defaults = {
+        'max_children': 32,
+        'max_depth': 1,
+        'max_data': 1024,
+    }
+
+    def __init__(self, budget, limits, fixed=()):
+        """Create a tuner.
+
+        budget -- target time in seconds to fetch and render a context
+        limits -- dict of feature name to a [min, max] pair
+        fixed -- names of features that the user has set explicitly, which
+                 are never changed
+        """
+        self.budget = float(budget)
+        self.limits = {}
+        for name, value in self.defaults.items():
+            low, high = limits.get(name, (value, value))
+            self.limits[name] = (int(low), int(high))
+        self.values = {name: value for name, value in self.defaults.items()
+                       if name not in fixed}
+        self.sample = None
+
+    def record(self, size, num_properties, elapsed):
+        """Record the cost of the last context_get."""
+        log.Log("Context of %i bytes with %i properties took %.3fs"
+                % (size, num_properties, elapsed), log.Logger.DEBUG)
+        self.sample = (size, num_properties, elapsed)
+
+    def discard(self, name):
+        """Stop tuning a feature, e.g. because the engine rejected it."""
+        self.values.pop(name, None)
+
+    def propose(self, visible_properties=0, paged=False):
+        """Get the features that should be changed before the next step.
+
+        Returns a dict of feature names and new values, which is empty if
+        nothing needs to change.
+
+        paged -- whether the watch window shows placeholders for pages of
+                 children, in which case max_children isn't changed
+        """
+        proposed = dict(self.values)
+        if 'max_children' in proposed and visible_properties > 0 and \
+                not paged:
+            proposed['max_children'] = self.__clamp('max_children',
+                                                    visible_properties)
+
+        if self.sample is not None:
+            size, num_properties, elapsed = self.sample
+            self.sample = None
+            # when the values themselves are big, max_data is the best
+            # lever, otherwise it's the number of nested properties
+            heavy_values = 'max_data' in proposed and \
+                size / max(num_properties, 1) > proposed['max_data'] / 2
+            if heavy_values:
+                order = ['max_data', 'max_depth']
+            else:
+                order = ['max_depth', 'max_data']
+
+            if elapsed > self.budget:
+                self.__adjust(proposed, order, self.__shrink)
+            elif elapsed < self.budget / 4:
+                self.__adjust(proposed, order, self.__grow)
+
+        changes = {name: value for name, value in proposed.items()
+                   if self.values[name] != value}
+        self.values.update(changes)
+        return changes
+
+    def __adjust(self, proposed, order, func):
+        for name in order:
+            if name not in proposed:
+                continue
+            value = self.__clamp(name, func(name, proposed[name]))
+            if value != proposed[name]:
+                proposed[name] = value
+                return
+
+    @staticmethod
+    def __shrink(name, value):
+        if name == 'max_data':
+            return value // 2
+        return value - 1
+
+    @staticmethod
+    def __grow(name, value):
+        if name == 'max_data':
+            return value * 2
+        return value + 1
+
+    def __clamp(self, name, value):
+        low, high = self.limits[name]
+        return max(low, min(high, value))
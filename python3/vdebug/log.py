@@ -114,6 +114,14 @@ class Log:
         for logger in cls.loggers.values():
             logger.log(string, level)
 
+    @classmethod
+    def is_logging(cls, level):
+        """Whether any logger writes messages of the given level."""
+        for logger in cls.loggers.values():
+            if level <= logger.debug_level:
+                return True
+        return False
+
     @classmethod
     def set_logger(cls, logger):
         k = logger.__class__.__name__
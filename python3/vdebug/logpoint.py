@@ -0,0 +1,161 @@
+import collections
+import time
+
+from . import dbgp
+from . import log
+from . import stepping
+
+
+class History:
+    """The most recent logpoint records, oldest first."""
+
+    def __init__(self, size=1000):
+        self.records = collections.deque(maxlen=max(int(size), 1))
+
+    def add(self, file, line, values):
+        record = (time.strftime('%H:%M:%S'), file, line, values)
+        self.records.append(record)
+        log.Log(self.format(record), log.Logger.INFO)
+
+    def clear(self):
+        self.records.clear()
+
+    def resize(self, size):
+        size = max(int(size), 1)
+        if size != self.records.maxlen:
+            self.records = collections.deque(self.records, maxlen=size)
+
+    @staticmethod
+    def format(record):
+        stamp, file, line, values = record
+        return "%s %s:%i %s" % (stamp, file, line, "; ".join(
+            "%s = %s" % (expr, value) for expr, value in values))
+
+    def __str__(self):
+        return "\n".join(self.format(r) for r in self.records)
+
+    def __len__(self):
+        return len(self.records)
+
+
+class Runner:
+    """Passes over logpoints while the script is running or stepping.
+
+    When the debugger breaks at a logpoint, its expressions are evaluated
+    and the script is resumed in the same pipeline, so each hit costs one
+    round trip and nothing is rendered.
+    """
+
+    def __init__(self, api, breakpoints, history):
+        self.api = api
+        self.breakpoints = breakpoints
+        self.history = history
+
+    def run(self, status):
+        """Get the status of the first break that isn't at a logpoint,
+        given the status returned by run."""
+        while str(status) == "break":
+            bp = self.__find_logpoint(status)
+            if bp is None:
+                return status
+            exprs = bp.expressions
+            responses = self.api.pipeline(
+                lambda: [self.api.eval(e) for e in exprs] + [self.api.run()])
+            self.__record(bp, exprs, responses)
+            status = responses[-1]
+            if isinstance(status, Exception):
+                raise status
+        return status
+
+    def step(self, step, after=None):
+        """Step with the Api method named step, e.g. "step_over".
+
+        A logpoint that the step lands on is recorded. When the debugger
+        breaks at a logpoint in a function that the step would have gone
+        over, or out of, the logpoint is recorded and the function is
+        stepped out of, until the step has got to where it was going. The
+        stack is fetched in the same pipelines to tell how deep the script
+        is, so this costs no more round trips than the logpoints hit.
+
+        Returns the status and the responses to the commands queued by
+        after, which are queued again with each step out.
+        """
+        def queue_after():
+            return after() if after is not None else []
+
+        responses = self.api.pipeline(
+            lambda: [self.api.stack_get(), getattr(self.api, step)(),
+                     self.api.stack_get()] + queue_after())
+        start, status, stack = responses[:3]
+        rest = responses[3:]
+        if isinstance(status, Exception):
+            raise status
+        if isinstance(start, Exception):
+            return (status, rest)
+        start = len(start.get_stack())
+        previous = None
+        while str(status) == "break" and not isinstance(stack, Exception):
+            frames = stack.get_stack()
+            file, line = stepping.frame_position(frames[0])
+            depth = len(frames)
+            bp = self.__enabled_logpoint(file, line)
+            if bp is None and (previous is None or depth >= previous or
+                               self.breakpoints.stops_at(file, line)):
+                # the step's end, or a breakpoint
+                break
+            exprs = bp.expressions if bp is not None else []
+            if self.__arrived(step, start, depth):
+                if exprs:
+                    self.__record(bp, exprs, self.api.pipeline(
+                        lambda: [self.api.eval(e) for e in exprs]))
+                break
+            responses = self.api.pipeline(
+                lambda: [self.api.eval(e) for e in exprs] +
+                [self.api.step_out(), self.api.stack_get()] + queue_after())
+            if exprs:
+                self.__record(bp, exprs, responses)
+            status, stack = responses[len(exprs):len(exprs) + 2]
+            rest = responses[len(exprs) + 2:]
+            if isinstance(status, Exception):
+                raise status
+            previous = depth
+        return (status, rest)
+
+    @staticmethod
+    def __arrived(step, start, depth):
+        """Whether a step that started at a stack depth would stop at
+        another depth."""
+        if step == "step_over":
+            return depth <= start
+        if step == "step_out":
+            return depth < start
+        return True
+
+    def __record(self, bp, exprs, responses):
+        self.history.add(bp.get_file(), bp.get_line(),
+                         [(e, self.__value(res))
+                          for e, res in zip(exprs, responses)])
+
+    def __find_logpoint(self, status):
+        return self.__enabled_logpoint(
+            *stepping.break_position(self.api, status))
+
+    def __enabled_logpoint(self, file, line):
+        bp = self.breakpoints.find_logpoint(file, line)
+        if bp is None or not bp.enabled:
+            return None
+        return bp
+
+    @staticmethod
+    def __value(res):
+        if isinstance(res, dbgp.EvalError):
+            return "(invalid)"
+        if isinstance(res, Exception):
+            return "(error: %s)" % res.args[0]
+        properties = res.get_context()
+        if not properties:
+            return "(none)"
+        prop = properties[0]
+        if prop.has_children or not prop.value:
+            return prop.type_and_size()
+        return prop.value
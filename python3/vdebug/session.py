@@ -5,9 +5,13 @@ import vim
 from . import dbgp
 from . import error
 from . import event
+from . import expand
+from . import features
 from . import listener
 from . import log
+from . import logpoint
 from . import opts
+from . import stepping
 from . import util
 
 
@@ -19,6 +23,7 @@ class SessionHandler:
         self.__ex_handler = util.ExceptionHandler(self)
         self.__session = None
         self.listener = None
+        self.logpoint_history = logpoint.History()
 
     def dispatch_event(self, name, *args):
         event.Dispatcher(self).dispatch_event(name, *args)
@@ -115,7 +120,7 @@ class SessionHandler:
     def __new_session(self):
         log.Log("create session", log.Logger.DEBUG)
         self.__session = Session(self.__ui, self.__breakpoints,
-                                 util.Keymapper())
+                                 util.Keymapper(), self.logpoint_history)
 
         log.Log("start session", log.Logger.DEBUG)
         status = self.__session.start(self.listener.create_connection())
@@ -125,14 +130,28 @@ class SessionHandler:
 
 class Session:
 
-    def __init__(self, ui, breakpoints, keymapper):
+    def __init__(self, ui, breakpoints, keymapper, logpoint_history=None):
         self.__ui = ui
         self.__breakpoints = breakpoints
         self.__keymapper = keymapper
+        if logpoint_history is None:
+            logpoint_history = logpoint.History()
+        self.__logpoint_history = logpoint_history
         self.__api = None
         self.cur_file = None
         self.cur_lineno = None
         self.context_names = None
+        # full values of truncated properties at the current break position
+        self.full_values = {}
+        # status of a break whose refresh was put off while keys were pending
+        self.deferred_refresh = None
+        # names of the properties expanded in the watch window, for each
+        # context id and stack depth
+        self.__expanded = {}
+        self.feature_tuner = None
+        # features changed by tuning, to send with the next refresh
+        self.__tuned_features = {}
+        self.capabilities = None
 
     def api(self):
         return self.__api
@@ -207,23 +226,69 @@ class Session:
             log.Log("Found connection from %s" % str(addr), log.Logger.INFO)
             self.__ui.set_conn_details(addr[0], addr[1])
 
-            self.__collect_context_names()
-            self.__check_features()  # only for debugging at the moment
-            self.__set_default_features()  # features we try by default
-            self.__set_features()  # user defined features
+            timer = util.Timer("Startup")
+            self.__init_feature_tuner()
+            self.__handshake()
+            timer.log("handshake")
             self.__initialize_breakpoints()
+            timer.log("breakpoints")
 
             if opts.Options.get('break_on_open', int) == 1:
                 log.Log('starting with step_into (break_on_open = 1)', log.Logger.DEBUG)
                 status = self.__api.step_into()
             else:
                 log.Log('starting with run (break_on_open = 0)', log.Logger.DEBUG)
-                status = self.__api.run()
+                status = self.pass_logpoints(self.__api.run())
+            timer.log("first break")
+            log.Log("Startup took %.3fs" % timer.elapsed())
             return status
         except Exception:
             self.close()
             raise
 
+    def pass_logpoints(self, status):
+        """Record and continue from any logpoints that the debugger breaks
+        at, returning the status of the first break that isn't a logpoint.
+        """
+        runner = self.__logpoint_runner()
+        if runner is None:
+            return status
+        return runner.run(status)
+
+    def __logpoint_runner(self):
+        """Get a logpoint.Runner, or None if there are no logpoints."""
+        if not self.__breakpoints.has_logpoints():
+            return None
+        self.__logpoint_history.resize(
+            opts.Options.get('logpoint_history', int))
+        return logpoint.Runner(self.__api, self.__breakpoints,
+                               self.__logpoint_history)
+
+    def expanded_properties(self, context_id, stack=0):
+        """Get the names of the properties that were expanded in the watch
+        window for a context, in the order they were expanded."""
+        return list(self.__expanded.get((int(context_id), int(stack)), []))
+
+    def remember_expanded(self, context_id, stack, name):
+        names = self.__expanded.setdefault((int(context_id), int(stack)), [])
+        if name not in names:
+            names.append(name)
+
+    def forget_expanded(self, context_id, stack, name):
+        """Forget an expanded property, and the properties under it."""
+        names = self.__expanded.get((int(context_id), int(stack)), [])
+        names[:] = [n for n in names if not expand.is_under(n, name)]
+
+    def step(self, step, count=1):
+        """Step count times with the given Api method, e.g. "step_over",
+        returning the status after the last step."""
+        return self.stepper().repeat(step, count)
+
+    def stepper(self):
+        """Get a stepping.Stepper, which passes over any logpoints."""
+        return stepping.Stepper(self.__api, self.__breakpoints,
+                                self.__logpoint_runner())
+
     def detach(self):
         """Detach the debugger engine, and allow it to continue execution.
         """
@@ -233,85 +298,205 @@ class Session:
 
         self.close_connection(False)
 
-    def __check_features(self):
-        must_features = [
-            'language_supports_threads',
-            'language_name',
-            'language_version',
-            'encoding',  # has set
-            'protocol_version',
-            'supports_async',
-            'data_encoding',
-            'breakpoint_languages',
-            'breakpoint_types',
-            'resolved_breakpoints',
-            'multiple_sessions',  # has set
-            'max_children',  # has set
-            'max_data',  # has set
-            'max_depth',  # has set
-            'extended_properties',  # has set
-        ]
-        maybe_features = [
-            'supported_encodings',
-            'supports_postmortem',
-            'show_hidden',  # has set
-            'notify_ok',  # has set
-        ]
-        for feature in must_features:
-            try:
-                feature_value = self.__api.feature_get(feature)
-                log.Log(
-                    "Must Feature: %s = %s" % (feature, str(feature_value)),
-                    log.Logger.DEBUG
-                )
-            except dbgp.DBGPError:
-                error_str = "Failed to get feature %s" % feature
-                log.Log(error_str, log.Logger.DEBUG)
+    must_features = [
+        'language_supports_threads',
+        'language_name',
+        'language_version',
+        'encoding',  # has set
+        'protocol_version',
+        'supports_async',
+        'data_encoding',
+        'breakpoint_languages',
+        'breakpoint_types',
+        'resolved_breakpoints',
+        'multiple_sessions',  # has set
+        'max_children',  # has set
+        'max_data',  # has set
+        'max_depth',  # has set
+        'extended_properties',  # has set
+    ]
+    maybe_features = [
+        'supported_encodings',
+        'supports_postmortem',
+        'show_hidden',  # has set
+        'notify_ok',  # has set
+    ]
+
+    def __handshake(self):
+        """Collect the context names and set the features in one go.
+
+        All the commands are pipelined, so the handshake only costs a
+        single round trip to the debugger. The engine capabilities are only
+        probed if they aren't cached for this engine, and the other feature
+        values are only queried when they would be logged."""
+        identity = self.__api.identity()
+        cache = features.CapabilityCache(
+            opts.Options.get('capability_cache'))
+        self.capabilities = cache.get(identity)
+        probe_capabilities = self.capabilities is None
+        check_features = log.Log.is_logging(log.Logger.DEBUG)
+        default_features = self.__default_features()
+        if self.capabilities is not None and \
+                self.capability('resolved_breakpoints') is None:
+            log.Log("Not setting resolved_breakpoints, as the engine "
+                    "doesn't have it", log.Logger.DEBUG)
+            del default_features['resolved_breakpoints']
+            del default_features['notify_ok']
+        user_features = vim.eval('g:vdebug_features')
+        if self.feature_tuner is not None:
+            self.__tuned_features = self.feature_tuner.propose(
+                self.__ui.windows.watch().visible_properties())
+        queued = {}
+
+        def queue():
+            queued['context_names'] = self.__api.context_names()
+            if probe_capabilities:
+                queued['capabilities'] = [
+                    (f, self.__api.feature_get(f))
+                    for f in features.CAPABILITIES]
+            if check_features:
+                queued['check'] = [
+                    (f, self.__api.feature_get(f))
+                    for f in self.must_features + self.maybe_features
+                    if f not in features.CAPABILITIES]
+            queued['default'] = [(n, v, self.__api.feature_set(n, v))
+                                 for n, v in default_features.items()]
+            queued['user'] = [(n, v, self.__api.feature_set(n, v))
+                              for n, v in user_features.items()]
+            queued['tuned'] = self.queue_tuned_features()
+
+        responses = self.__api.pipeline(queue)
+
+        cn_res = responses[queued['context_names']]
+        if isinstance(cn_res, Exception):
+            raise cn_res
+        self.context_names = cn_res.names()
+        log.Log("Available context names: %s" % self.context_names,
+                log.Logger.DEBUG)
 
-        for feature in maybe_features:
-            try:
-                feature_value = self.__api.feature_get(feature)
-                log.Log(
-                    "Maybe Feature: %s = %s" % (feature, str(feature_value)),
-                    log.Logger.DEBUG
-                )
-            except dbgp.DBGPError:
-                error_str = "Failed to get feature %s" % feature
+        if probe_capabilities:
+            self.capabilities = {
+                f: self.__feature_value(responses[i])
+                for f, i in queued['capabilities']}
+            cache.set(identity, self.capabilities)
+        else:
+            log.Log("Using cached capabilities for %s" % identity,
+                    log.Logger.DEBUG)
+        for feature in features.CAPABILITIES:
+            log.Log("Capability: %s = %s"
+                    % (feature, self.capabilities.get(feature)),
+                    log.Logger.DEBUG)
+
+        for feature, i in queued.get('check', []):
+            self.__log_feature(feature, responses[i])
+        for name, value, i in queued['default']:
+            if isinstance(responses[i], Exception):
+                error_str = "Failed to set feature %s: %s" % (
+                    name, responses[i].args[0])
                 log.Log(error_str, log.Logger.DEBUG)
+        for name, value, i in queued['user']:
+            # Errors are reported, but don't stop the other features being
+            # set
+            if isinstance(responses[i], Exception):
+                error_str = "Failed to set feature %s: %s" % (
+                    name, responses[i].args[0])
+                self.__ui.error(error_str)
+        self.check_tuned_features(queued['tuned'], responses)
+
+    def capability(self, name):
+        """Get the value of an engine capability, e.g. breakpoint_types.
+
+        Returns None if the engine doesn't support it."""
+        if not self.capabilities:
+            return None
+        return self.capabilities.get(name)
 
-    def __set_default_features(self):
-        features = {
+    @staticmethod
+    def __feature_value(res):
+        if isinstance(res, Exception):
+            return None
+        try:
+            if not res.is_supported():
+                return None
+        except (TypeError, ValueError):
+            return None
+        return str(res)
+
+    def __log_feature(self, feature, res):
+        kind = "Must" if feature in self.must_features else "Maybe"
+        if isinstance(res, Exception):
+            error_str = "Failed to get feature %s" % feature
+            log.Log(error_str, log.Logger.DEBUG)
+        else:
+            log.Log("%s Feature: %s = %s" % (kind, feature, str(res)),
+                    log.Logger.DEBUG)
+
+    @staticmethod
+    def __default_features():
+        """Features we try by default."""
+        return {
             'multiple_sessions': 0,  # explicitly disable multiple sessions atm
             'extended_properties': 1,
+            # report breakpoints that can't be resolved or were moved
+            'resolved_breakpoints': 1,
+            # breakpoint_resolved notifications are only sent with this
+            'notify_ok': 1,
+            # long values are truncated, and fetched in full on demand
+            'max_data': 1024,
         }
-        for name, value in features.items():
-            try:
-                self.__api.feature_set(name, value)
-            except dbgp.DBGPError as e:
-                error_str = "Failed to set feature %s: %s" % (name, e.args[0])
-                log.Log(error_str, log.Logger.DEBUG)
 
-    def __set_features(self):
-        """Evaluate vim dictionary of features and pass to debugger.
-
-        Errors are caught if the debugger doesn't like the feature name or
-        value. This doesn't break the loop, so multiple features can be set
-        even in the case of an error."""
-        features = vim.eval('g:vdebug_features')
-        for name, value in features.items():
-            try:
-                self.__api.feature_set(name, value)
-            except dbgp.DBGPError as e:
-                error_str = "Failed to set feature %s: %s" % (name, e.args[0])
-                self.__ui.error(error_str)
+    def __init_feature_tuner(self):
+        """Start adapting the data size features, unless disabled.
+
+        Features set in g:vdebug_features are left alone."""
+        self.__tuned_features = {}
+        if opts.Options.get('adaptive_features', int) == 0:
+            self.feature_tuner = None
+            return
+        self.feature_tuner = features.FeatureTuner(
+            opts.Options.get('adaptive_step_budget', int) / 1000.0,
+            opts.Options.get('adaptive_limits', dict),
+            vim.eval('g:vdebug_features').keys())
+
+    def tune_features(self, size, num_properties, elapsed):
+        """Record the cost of a context_get and adapt the features.
+
+        The changes are kept until the next refresh, which sends them in its
+        pipeline with queue_tuned_features()."""
+        if self.feature_tuner is None:
+            return
+        self.feature_tuner.record(size, num_properties, elapsed)
+        watch = self.__ui.windows.watch()
+        self.__tuned_features.update(self.feature_tuner.propose(
+            watch.visible_properties(), watch.shows_pages()))
+
+    def queue_tuned_features(self):
+        """Queue feature_set commands for the tuned features in a pipeline.
+
+        Returns (name, value, position) for each command, to pass to
+        check_tuned_features() with the pipeline's responses."""
+        changes = self.__tuned_features
+        self.__tuned_features = {}
+        return [(name, value, self.__api.feature_set(name, value))
+                for name, value in changes.items()]
+
+    def check_tuned_features(self, queued, responses):
+        """Stop tuning the features the debugger failed to set."""
+        for name, value, i in queued:
+            if isinstance(responses[i], Exception):
+                error_str = "Failed to set feature %s: %s" % (
+                    name, responses[i].args[0])
+                log.Log(error_str, log.Logger.DEBUG)
+                self.feature_tuner.discard(name)
+            else:
+                log.Log("Tuned feature %s to %s" % (name, value),
+                        log.Logger.DEBUG)
 
     def __initialize_breakpoints(self):
         self.__breakpoints.update_lines(
-            self.__ui.get_breakpoint_sign_positions())
-        self.__breakpoints.link_api(self.__api)
-
-    def __collect_context_names(self):
-        cn_res = self.__api.context_names()
-        self.context_names = cn_res.names()
-        log.Log("Available context names: %s" % self.context_names,
-                log.Logger.DEBUG)
+            self.__ui.get_breakpoint_sign_positions(
+                self.__breakpoints.get_files()))
+        types = self.capability('breakpoint_types')
+        self.__breakpoints.link_api(
+            self.__api, types.split() if types is not None else None)
+        self.__breakpoints.apply_notifications(self.__api.pop_notifications())
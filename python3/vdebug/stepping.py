@@ -0,0 +1,123 @@
+import xml.etree.ElementTree as ET
+
+from . import dbgp
+from . import log
+from . import util
+
+
+def break_position(api, status):
+    """Get the file and line number at which the debugger has stopped.
+
+    The position is taken from the status if the engine sends it there,
+    which saves a stack_get.
+    """
+    position = status.get_position()
+    if position is None:
+        return frame_position(api.stack_get().get_stack()[0])
+    return (util.RemoteFilePath(position[0]), position[1])
+
+
+def frame_position(frame):
+    """Get the file and line number of a stack frame."""
+    return (util.RemoteFilePath(frame.get('filename')),
+            int(frame.get('lineno')))
+
+
+class Stepper:
+    """Steps several times in a row without updating the UI in between."""
+
+    # number of steps between calls to the progress callback of until()
+    progress_interval = 100
+
+    def __init__(self, api, breakpoints, logpoints=None):
+        """Create a stepper.
+
+        logpoints -- a logpoint.Runner to step with, which passes over
+                     logpoints, or None if there are none
+        """
+        self.api = api
+        self.breakpoints = breakpoints
+        self.logpoints = logpoints
+
+    def repeat(self, step, count):
+        """Step count times, and get the status after the last step.
+
+        Stepping stops early if the debugger stops breaking (e.g. the
+        script has ended) or it arrives at an enabled breakpoint.
+
+        step -- name of the Api method to step with, e.g. "step_over"
+        """
+        count = max(int(count), 1)
+        status = None
+        for i in range(count):
+            status = self.__step(step)[0]
+            if str(status) != "break":
+                break
+            if i < count - 1 and self.__at_breakpoint(status):
+                log.Log("Stopped at a breakpoint after %i of %i steps"
+                        % (i + 1, count))
+                break
+        return status
+
+    def until(self, step, code, limit, progress=None):
+        """Step until the value of an expression changes.
+
+        Each step is pipelined with an eval of the expression, so a step
+        costs one round trip. Stepping also stops when the debugger stops
+        breaking, it arrives at an enabled breakpoint, or after limit steps.
+
+        Returns a tuple of the status after the last step, the number of
+        steps taken and whether the value changed.
+
+        step -- name of the Api method to step with, e.g. "step_into"
+        progress -- callable which is passed the number of steps taken so
+                    far, every progress_interval steps
+        """
+        try:
+            previous = self.__value(self.api.eval(code))
+        except dbgp.EvalError as e:
+            previous = self.__value(e)
+        status = None
+        steps = 0
+        while steps < limit:
+            status, responses = self.__step(
+                step, lambda: [self.api.eval(code)])
+            steps += 1
+            if str(status) != "break":
+                break
+            value = self.__value(responses[0])
+            if value != previous:
+                log.Log("Value of %s changed after %i steps" % (code, steps))
+                return (status, steps, True)
+            if self.__at_breakpoint(status):
+                break
+            if progress is not None and steps % self.progress_interval == 0:
+                progress(steps)
+        return (status, steps, False)
+
+    def __step(self, step, after=None):
+        """Step once, and get the status and the responses to the commands
+        queued by after."""
+        if self.logpoints is not None:
+            return self.logpoints.step(step, after)
+        if after is None:
+            return (getattr(self.api, step)(), [])
+        responses = self.api.pipeline(
+            lambda: [getattr(self.api, step)()] + after())
+        if isinstance(responses[0], Exception):
+            raise responses[0]
+        return (responses[0], responses[1:])
+
+    @staticmethod
+    def __value(res):
+        """Get a comparable form of an eval response."""
+        if isinstance(res, dbgp.EvalError):
+            return None
+        if isinstance(res, Exception):
+            raise res
+        return [ET.tostring(node) for node in res.as_xml()]
+
+    def __at_breakpoint(self, status):
+        if not self.breakpoints.get_files():
+            return False
+        return self.breakpoints.stops_at(*break_position(self.api, status))
@@ -0,0 +1,59 @@
+import difflib
+
+# the most lines that are matched up after the common head and tail are
+# trimmed, as the matching can take quadratic time
+MAX_MATCHED_LINES = 2000
+
+
+def diff(old, new, max_lines=MAX_MATCHED_LINES):
+    """Compare the lines of a window before and after rendering.
+
+    Returns a tuple of the edits that turn old into new and the lines of
+    new that show a changed value. The edits are (start, end, lines)
+    tuples, meaning that old[start:end] is replaced by lines. They are in
+    reverse order, so each can be applied without moving the next.
+
+    The lines at the start and end that are the same in both are left
+    out. If more than max_lines differ in between, they are replaced in a
+    single edit, and a value change is only looked for on the line at the
+    same position.
+    """
+    if old == new:
+        return ([], [])
+    head = 0
+    limit = min(len(old), len(new))
+    while head < limit and old[head] == new[head]:
+        head += 1
+    tail = 0
+    while tail < limit - head and old[-1 - tail] == new[-1 - tail]:
+        tail += 1
+    old_end = len(old) - tail
+    new_end = len(new) - tail
+
+    if max(old_end, new_end) - head > max_lines:
+        changed = [i for i in range(head, min(old_end, new_end))
+                   if is_value_change(old[i], new[i])]
+        return ([(head, old_end, new[head:new_end])], changed)
+
+    matcher = difflib.SequenceMatcher(None, old[head:old_end],
+                                      new[head:new_end], autojunk=False)
+    edits = []
+    changed = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        i1, i2, j1, j2 = i1 + head, i2 + head, j1 + head, j2 + head
+        edits.append((i1, i2, new[j1:j2]))
+        if tag == 'replace':
+            for offset in range(min(i2 - i1, j2 - j1)):
+                if is_value_change(old[i1 + offset], new[j1 + offset]):
+                    changed.append(j1 + offset)
+    edits.reverse()
+    return (edits, changed)
+
+
+def is_value_change(old, new):
+    """Whether two lines show the same property with different values."""
+    if " = " not in old or " = " not in new:
+        return False
+    return old.split(" = ", 1)[0] == new.split(" = ", 1)[0]
@@ -0,0 +1,149 @@
+# coding=utf-8
+
+from . import tree
+from .. import log
+from .. import opts
+from .. import util
+
+
+class ResponseRenderer:
+    """Renders a response as a list of lines for a window."""
+
+    def __init__(self, response):
+        self.response = response
+
+    def render(self):
+        return []
+
+
+class StackGetResponseRenderer(ResponseRenderer):
+
+    def render(self):
+        lines = []
+        for s in self.response.get_stack():
+            if s.get('where'):
+                where = s.get('where')
+            else:
+                where = 'main'
+            file = util.FilePath(s.get('filename'))
+            lines.append("[%(num)s] %(where)s @ %(file)s:%(line)s" % {
+                'num': s.get('level'), 'where': where,
+                'file': str(file.as_local()), 'line': s.get('lineno')})
+        lines.append("")
+        return lines
+
+
+class ContextGetResponseRenderer(ResponseRenderer):
+
+    def __init__(self, response, title=None, contexts=None, current_context=0):
+        ResponseRenderer.__init__(self, response)
+        self.title = title
+        self.contexts = contexts if contexts is not None else {}
+        self.current_context = current_context
+
+    def render(self, indent=0, children_only=False, first=0, count=None):
+        """Render the properties as a list of lines, and index the property
+        shown on each line in self.lines.
+
+        first -- index of the first property to render, the tabs and title
+                 are only rendered with the first property
+        count -- number of properties to render, or None for all of them;
+                 the number left over is kept in self.remaining
+        """
+        output = []
+        if first == 0:
+            output.extend(self.__create_tabs())
+            if self.title:
+                output.extend(["- %s" % self.title, ""])
+        self.lines = [None] * len(output)
+
+        properties = self.response.get_context()
+        if children_only:
+            properties = properties[1:]
+        num_props = len(properties)
+        end = num_props if count is None else min(num_props, first + count)
+        self.remaining = num_props - end
+        log.Log("Writing %i of %i properties to the window"
+                % (max(end - first, 0), num_props), log.Logger.INFO)
+
+        expanded = opts.Options.get('watch_window_style') == 'expanded'
+        markers = (opts.Options.get('marker_default'),
+                   opts.Options.get('marker_closed_tree'),
+                   opts.Options.get('marker_open_tree'))
+        for idx in range(first, end):
+            prop = properties[idx]
+            final = idx == num_props - 1
+            next_prop = None if final else properties[idx+1]
+            start = len(output)
+            output.extend(self.__render_property(prop, next_prop, final,
+                                                 indent, expanded, markers))
+            self.lines.append(tree.Line(prop, indent, True))
+            self.lines.extend(tree.Line(prop, indent, False)
+                              for i in range(len(output) - start - 1))
+        # the line after the last property
+        output.append("")
+        self.lines.append(None)
+
+        if log.Log.is_logging(log.Logger.DEBUG):
+            log.Log("Writing to window:\n" + "\n".join(output),
+                    log.Logger.DEBUG)
+
+        return output
+
+    def __create_tabs(self):
+        res = []
+        if self.contexts:
+            for id, name in self.contexts.items():
+                if self.current_context == id:
+                    name = "*"+name
+                res.append("[ %s ]" % name)
+        if res:
+            return [" ".join(res), ""]
+        return []
+
+    def __render_property(self, p, next_p, last, indent, expanded, markers):
+        """Generate the lines showing a property, and in the expanded
+        style the lines joining it to the next one."""
+        depth = p.depth
+        line = "%(indent)s %(marker)s %(name)s = (%(type)s) %(value)s" % {
+            'indent': " " * (depth * 2 + indent),
+            'marker': self.__get_marker(p, markers),
+            'name': p.display_name,
+            'type': p.type_and_size(),
+            'value': p.value
+        }
+        # a value can span several lines
+        yield from line.rstrip().split("\n")
+
+        if not expanded:
+            return
+        pad = " " * (depth * 2 + indent)
+        if next_p and not last:
+            next_depth = next_p.depth
+            if depth == next_depth:
+                next_sep = "|"
+                num_spaces = depth * 2
+            elif depth > next_depth:
+                if not p.is_last_child:
+                    yield pad + " |"
+                    yield pad + " ..."
+                next_sep = "/"
+                num_spaces = (depth * 2) - 1
+            else:
+                next_sep = "\\"
+                num_spaces = (depth * 2) + 1
+            yield " " * (num_spaces + indent) + " " + next_sep
+        elif depth > 0:
+            if not p.is_last_child:
+                yield pad + " |"
+                yield pad + " ..."
+            yield " " * ((depth * 2) - 1 + indent) + " /"
+
+    @staticmethod
+    def __get_marker(property, markers):
+        default, closed, opened = markers
+        if property.has_children:
+            if property.child_count() == 0:
+                return closed
+            return opened
+        return default
@@ -0,0 +1,58 @@
+class RowIndex:
+    """The buffer rows of items which are added to the end of a buffer,
+    and removed from anywhere in it.
+
+    Each item gets the next slot when it's added. Its row is its slot, less
+    the number of items removed from the slots before it, which are counted
+    in a binary indexed tree. Finding a row and removing an item both take
+    logarithmic time, however many items there are.
+    """
+
+    def __init__(self, first_row=0):
+        self.first_row = first_row
+        self.__slots = {}
+        # binary indexed tree of removed slots, indexed from 1
+        self.__removed = [0]
+
+    def __len__(self):
+        return len(self.__slots)
+
+    def __contains__(self, key):
+        return key in self.__slots
+
+    def add(self, key):
+        """Add an item after the last one, and get its row."""
+        slot = len(self.__removed) - 1
+        i = slot + 1
+        # a new node counts the removals in the range it covers, which are
+        # all in slots before this one
+        self.__removed.append(self.__count(i - 1) - self.__count(i - (i & -i)))
+        self.__slots[key] = slot
+        return self.row(key)
+
+    def row(self, key):
+        """Get the row of an item, or None if there is no such item."""
+        slot = self.__slots.get(key)
+        if slot is None:
+            return None
+        return self.first_row + slot - self.__count(slot)
+
+    def remove(self, key):
+        """Remove an item, and get the row it was at, or None if there is no
+        such item."""
+        row = self.row(key)
+        if row is None:
+            return None
+        i = self.__slots.pop(key) + 1
+        while i < len(self.__removed):
+            self.__removed[i] += 1
+            i += i & -i
+        return row
+
+    def __count(self, end):
+        """The number of removed slots before end."""
+        total = 0
+        while end > 0:
+            total += self.__removed[end]
+            end -= end & -end
+        return total
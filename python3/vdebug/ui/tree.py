@@ -0,0 +1,64 @@
+class Line:
+    """A line of the watch window showing a property.
+
+    The first line of a property is its head, the one with the marker. The
+    lines after it, for separators or a value with line breaks, belong to
+    the same property.
+    """
+
+    def __init__(self, prop, indent, is_head):
+        self.prop = prop
+        self.indent = indent
+        self.is_head = is_head
+
+    @property
+    def column(self):
+        """The column of the property's marker."""
+        return self.prop.depth * 2 + self.indent + 1
+
+
+class PropertyIndex:
+    """The property shown on each line of the watch window.
+
+    The index is built when a context is rendered, and kept in step with
+    the buffer when a part of the tree is opened or closed, so properties
+    are looked up without reading the buffer.
+    """
+
+    def __init__(self, lines=None):
+        self.lines = list(lines) if lines is not None else []
+
+    def __len__(self):
+        return len(self.lines)
+
+    def at(self, lineno):
+        """Get the Line at a 0-based line number, or None if the line
+        doesn't show a property."""
+        if 0 <= lineno < len(self.lines):
+            return self.lines[lineno]
+        return None
+
+    def head_at(self, lineno):
+        """Get the Line at a 0-based line number if it's the head of a
+        property, otherwise None."""
+        line = self.at(lineno)
+        if line is None or not line.is_head:
+            return None
+        return line
+
+    def subtree_end(self, lineno):
+        """Get the line number after the last line of the property whose
+        head is at lineno, including the properties under it."""
+        head = self.lines[lineno]
+        end = lineno + 1
+        while end < len(self.lines):
+            line = self.lines[end]
+            if line is None or (line.prop is not head.prop and
+                                line.column <= head.column):
+                break
+            end += 1
+        return end
+
+    def replace(self, start, end, lines):
+        """Replace the lines from start up to end, as in the buffer."""
+        self.lines[start:end] = lines
@@ -1,10 +1,16 @@
 # coding=utf-8
 
+import contextlib
+import json
 import sys
 
 import vim
 
+from . import diff
 from . import interface
+from . import rows
+from . import tree
+from .. import dbgp
 from .. import log
 from .. import opts
 from .. import util
@@ -16,14 +22,15 @@ class WindowError(Exception):
 
 class WindowManager:
 
-    def __init__(self):
+    def __init__(self, signs):
         self._windows = {
             "DebuggerWatch":  WatchWindow(),
-            "DebuggerStack": StackWindow(),
+            "DebuggerStack": StackWindow(signs),
             "DebuggerStatus": StatusWindow(),
             "DebuggerBreakpoints": BreakpointWindow(),
             "DebuggerLog": LogWindow(),
-            "DebuggerTrace": TraceWindow()
+            "DebuggerTrace": TraceWindow(),
+            "DebuggerValue": ValueWindow()
         }
         self._default_commands = {
             "DebuggerWatch": "vertical belowright new",
@@ -31,7 +38,8 @@ class WindowManager:
             "DebuggerStack": "belowright new",
             "DebuggerBreakpoints": "rightbelow 7new",
             "DebuggerLog": "rightbelow 6new",
-            "DebuggerTrace": 'rightbelow 7new'
+            "DebuggerTrace": 'rightbelow 7new',
+            "DebuggerValue": 'rightbelow 12new'
         }
         self._commands = self._default_commands.copy()
         self._default_layout = {
@@ -88,6 +96,9 @@ class WindowManager:
     def trace(self):
         return self.window("DebuggerTrace")
 
+    def value(self):
+        return self.window("DebuggerValue")
+
     def window(self, name):
         try:
             return self._windows[name]
@@ -128,7 +139,8 @@ class Ui(interface.Ui):
         interface.Ui.__init__(self)
         self.is_open = False
         self.emptybuffer = None
-        self.windows = WindowManager()
+        self.signs = SignManager()
+        self.windows = WindowManager(self.signs)
         self.current_tab = "1"
         self.tabnr = None
         self._last_error = None
@@ -224,7 +236,7 @@ class Ui(interface.Ui):
             log.Log.set_logger(log.WindowLogger(
                 opts.Options.get('debug_window_level'), self.windows.log()))
 
-            self.sourcewin = SourceWindow()
+            self.sourcewin = SourceWindow(self.signs)
             self.sourcewin.focus()
         except Exception:
             self.is_open = False
@@ -266,35 +278,97 @@ class Ui(interface.Ui):
         return vim.current.buffer[row - 1]
 
     def register_breakpoint(self, breakpoint):
-        if breakpoint.type == 'line':
+        # Signs can only be placed in loaded buffers, the rest are placed by
+        # place_breakpoint_signs when the buffer is read
+        file = getattr(breakpoint, 'file', None)
+        if file is not None and self.is_loaded(file):
+            self.place_breakpoint_signs([breakpoint])
+        self.windows.breakpoints().add_breakpoint(breakpoint)
+
+    def place_breakpoint_signs(self, breakpoints):
+        if breakpoints:
+            self.track_buffer(breakpoints[0].file)
+        with self.signs.batch():
+            for breakpoint in breakpoints:
+                if breakpoint.type in ('line', 'log') or not breakpoint.enabled:
+                    self.place_breakpoint_sign(breakpoint)
+
+    def place_breakpoint_sign(self, breakpoint):
+        if breakpoint.enabled:
             self.place_breakpoint(breakpoint.id, breakpoint.file,
                                   breakpoint.line)
-        self.windows.breakpoints().add_breakpoint(breakpoint)
+        else:
+            self.place_disabled_breakpoint(breakpoint.id, breakpoint.file,
+                                           breakpoint.line)
+
+    @staticmethod
+    def track_buffer(file):
+        """Report line changes in the buffer of a file, so that breakpoints
+        follow the lines they are on."""
+        vim.command('call Vdebug_track_buffer(bufnr(%s))'
+                    % json.dumps(file.as_local(), ensure_ascii=False))
 
     @staticmethod
-    def place_breakpoint(sign_id, file, line):
-        vim.command('sign place %s name=breakpt line=%s file=%s'
-                    % (sign_id, line, file.as_local()))
+    def is_loaded(file):
+        return int(vim.eval("bufloaded('%s')"
+                            % file.as_local().replace("'", "''"))) > 0
+
+    def place_breakpoint(self, sign_id, file, line):
+        self.signs.place(sign_id, 'breakpt', file.as_local(), line)
+
+    def update_breakpoint(self, breakpoint):
+        file = getattr(breakpoint, 'file', None)
+        if file is not None and self.is_loaded(file):
+            self.place_breakpoint_signs([breakpoint])
+        self.windows.breakpoints().update_breakpoint(breakpoint)
 
     def enable_breakpoint(self, breakpoint):
-        self.place_breakpoint(breakpoint.id, breakpoint.file, breakpoint.line)
+        if self.is_loaded(breakpoint.file):
+            self.place_breakpoint(breakpoint.id, breakpoint.file,
+                                  breakpoint.line)
         self.windows.breakpoints().update_breakpoint(breakpoint)
 
     def disable_breakpoint(self, breakpoint):
-        self.place_disabled_breakpoint(breakpoint.id, breakpoint.file, breakpoint.line)
+        if self.is_loaded(breakpoint.file):
+            self.place_disabled_breakpoint(breakpoint.id, breakpoint.file,
+                                           breakpoint.line)
         self.windows.breakpoints().update_breakpoint(breakpoint)
 
-    @staticmethod
-    def place_disabled_breakpoint(sign_id, file, line):
-        vim.command('sign place %s name=breakpt_dis line=%s file=%s'
-                    % (sign_id, line, file.as_local()))
+    def place_disabled_breakpoint(self, sign_id, file, line):
+        self.signs.place(sign_id, 'breakpt_dis', file.as_local(), line)
 
     def remove_breakpoint(self, breakpoint):
         id = breakpoint.id
-        vim.command('sign unplace %i' % id)
+        self.signs.unplace(id)
         self.windows.breakpoints().remove_breakpoint(id)
 
-    def get_breakpoint_sign_positions(self):
+    def show_value(self, value):
+        self.windows.open("DebuggerValue")
+        self.windows.value().clean()
+        self.windows.value().write(value)
+
+    def get_breakpoint_sign_positions(self, files):
+        """Get the lines of the breakpoint signs in the given files, as a
+        dict of sign ID to line number."""
+        if not self.signs.has_sign_list:
+            return self.__parse_sign_positions()
+        if not files:
+            return {}
+        # one call for all loaded buffers, as buffers that aren't loaded
+        # don't have signs
+        placed = vim.eval(
+            "map(filter(%s, 'bufloaded(v:val)'), "
+            "'sign_getplaced(v:val, {\"group\": \"%s\"})')"
+            % (json.dumps(list(files), ensure_ascii=False), self.signs.group))
+        positions = {}
+        for buffers in placed:
+            for buf in buffers:
+                for sign in buf['signs']:
+                    if sign['name'].startswith('breakpt'):
+                        positions[sign['id']] = sign['lnum']
+        return positions
+
+    def __parse_sign_positions(self):
         sign_lines = self.command('sign place').split("\n")
         positions = {}
         for line in sign_lines:
@@ -346,13 +420,120 @@ class Ui(interface.Ui):
         return vim.eval("range(1, bufnr('$'))")
 
 
+class SignManager:
+    """Places and removes the signs of Vdebug in batches.
+
+    Inside batch(), sign changes are queued and applied when the outermost
+    batch ends, with one sign_placelist() or sign_unplacelist() call for
+    each run of placements or removals. Outside a batch they are applied
+    straight away.
+
+    Signs are kept in their own sign group, so removing them can't affect
+    the signs of other plugins. Vims without sign_placelist() get one :sign
+    command per sign, without a group.
+
+    Signs are placed in buffers by number, looked up once per file in each
+    flush, as buffer names are matched as patterns.
+    """
+
+    group = 'vdebug'
+
+    def __init__(self):
+        self.__queue = []
+        self.__depth = 0
+        self.has_sign_list = int(vim.eval("exists('*sign_placelist')")) == 1
+        self.has_sign_priority = vim.vvars['version'] > 801 \
+            or (hasattr(vim, 'funcs') and vim.funcs.has('nvim-0-4-0'))
+
+    @contextlib.contextmanager
+    def batch(self):
+        self.__depth += 1
+        try:
+            yield self
+        finally:
+            self.__depth -= 1
+            if self.__depth == 0:
+                self.flush()
+
+    def place(self, sign_id, name, file, line, priority=None):
+        sign = {'id': int(sign_id), 'name': name, 'buffer': str(file),
+                'lnum': int(line)}
+        if priority is not None and self.has_sign_priority:
+            sign['priority'] = priority
+        self.__add('place', sign)
+
+    def unplace(self, sign_id):
+        self.__add('unplace', {'id': int(sign_id)})
+
+    def flush(self):
+        queue, self.__queue = self.__queue, []
+        buffers = self.__buffer_numbers(
+            [sign for action, signs in queue for sign in signs])
+        for action, signs in queue:
+            if action == 'place':
+                signs = self.__in_buffers(signs, buffers)
+                if not signs:
+                    continue
+            if self.has_sign_list:
+                for sign in signs:
+                    sign['group'] = self.group
+                vim.eval('sign_%slist(%s)' % (action, self.__to_vim(signs)))
+            else:
+                for sign in signs:
+                    vim.command(self.__to_command(action, sign))
+
+    def __add(self, action, sign):
+        if self.__queue and self.__queue[-1][0] == action:
+            self.__queue[-1][1].append(sign)
+        else:
+            self.__queue.append((action, [sign]))
+        if self.__depth == 0:
+            self.flush()
+
+    def __buffer_numbers(self, signs):
+        """Look up the numbers of the buffers the signs are placed in."""
+        names = sorted({sign['buffer'] for sign in signs if 'buffer' in sign})
+        if not names:
+            return {}
+        numbers = vim.eval("map(%s, 'bufnr(\"^\" . fnameescape(v:val) . "
+                           "\"$\")')" % self.__to_vim(names))
+        return dict(zip(names, (int(n) for n in numbers)))
+
+    @staticmethod
+    def __in_buffers(signs, buffers):
+        placed = []
+        for sign in signs:
+            number = buffers.get(sign['buffer'], -1)
+            if number == -1:
+                log.Log("Not placing sign %i, as there is no buffer for %s"
+                        % (sign['id'], sign['buffer']), log.Logger.DEBUG)
+                continue
+            placed.append(dict(sign, buffer=number))
+        return placed
+
+    @staticmethod
+    def __to_vim(value):
+        # JSON lists, dicts, strings and numbers are valid Vim expressions
+        return json.dumps(value, ensure_ascii=False)
+
+    @staticmethod
+    def __to_command(action, sign):
+        if action == 'unplace':
+            return 'sign unplace %i' % sign['id']
+        cmd = 'sign place %i name=%s' % (sign['id'], sign['name'])
+        if 'priority' in sign:
+            cmd += ' priority=%i' % sign['priority']
+        return cmd + ' line=%i buffer=%i' % (sign['lnum'], sign['buffer'])
+
+
 class SourceWindow(interface.Window):
 
     file = None
     pointer_sign_id = '6145'
     breakpoint_sign_id = '6146'
-    has_sign_priority = vim.vvars['version'] > 801 \
-        or (hasattr(vim, 'funcs') and vim.funcs.has('nvim-0-4-0'))
+
+    def __init__(self, signs):
+        self.signs = signs
 
     def focus(self):
         vim.command("1wincmd w")
@@ -390,13 +571,19 @@ class SourceWindow(interface.Window):
     def place_pointer(self, line):
         log.Log("Placing pointer sign on line "+str(line), log.Logger.INFO)
         self.remove_pointer()
-        signstr = 'sign place %s name=current line=%s file=%s'
-        if self.has_sign_priority:
-            signstr = 'sign place %s name=current priority=99 line=%s file=%s'
-        vim.command(signstr % (self.pointer_sign_id, line, self.file))
+        self.signs.place(self.pointer_sign_id, 'current', self.file, line,
+                         priority=99)
 
     def remove_pointer(self):
-        vim.command('sign unplace %s' % self.pointer_sign_id)
+        self.signs.unplace(self.pointer_sign_id)
+
+
+def to_lines(msg):
+    """Split a message into the lines of a buffer, unless it's a list of
+    lines already."""
+    if isinstance(msg, list):
+        return msg
+    return str(msg).split('\n')
 
 
 class VimBuffer:
@@ -414,9 +601,9 @@ class VimBuffer:
         if return_focus:
             prev_win = vim.current.window.number
         if self.is_empty():
-            self._buffer[:] = str(msg).split('\n')
+            self._buffer[:] = to_lines(msg)
         else:
-            self._buffer.append(str(msg).split('\n'))
+            self._buffer.append(to_lines(msg))
             after_callback()
             if return_focus:
                 vim.command('%swincmd W' % prev_win)
@@ -426,11 +613,11 @@ class VimBuffer:
         if not msg and not allowEmpty:
             return
         if self.is_empty():
-            self._buffer[:] = str(msg).split('\n')
+            self._buffer[:] = to_lines(msg)
         else:
             if lineno is None:
                 lineno, col = vim.current.window.cursor
-            remaining_buffer = str(msg).split('\n')
+            remaining_buffer = to_lines(msg)
             if overwrite:
                 lfrom = lineno + 1
             else:
@@ -455,6 +642,18 @@ class VimBuffer:
         except IndexError:
             del self._buffer[start_line:]
 
+    def set_line(self, number, text):
+        self._buffer[number] = text
+
+    def replace(self, start, end, lines):
+        self._buffer[start:end] = lines
+
+    def delete_line(self, number):
+        del self._buffer[number]
+
+    def line_count(self):
+        return len(self._buffer)
+
     def contents(self):
         return self._buffer[:]
 
@@ -464,6 +663,17 @@ class VimBuffer:
     def is_empty(self):
         return bool(len(self._buffer) == 1 and not self._buffer[0])
 
+    @contextlib.contextmanager
+    def editing(self):
+        """Let the buffer be changed, even if it isn't modifiable."""
+        options = self._buffer.options
+        modifiable = options['modifiable']
+        options['modifiable'] = True
+        try:
+            yield
+        finally:
+            options['modifiable'] = modifiable
+
 
 class HiddenBuffer:
 
@@ -478,17 +688,17 @@ class HiddenBuffer:
     def write(self, msg, return_focus, after):
         if self.is_empty():
             # If empty
-            self._buffer[:] = str(msg).split('\n')
+            self._buffer[:] = to_lines(msg)
         else:
             # Otherwise add to the end
-            self._buffer.extend(str(msg).split('\n'))
+            self._buffer.extend(to_lines(msg))
 
     def insert(self, msg, lineno, overwrite, allowEmpty, after_callback):
         """ insert into current position in buffer"""
         if not msg and not allowEmpty:
             return
         if self.is_empty():
-            self._buffer[:] = str(msg).split('\n')
+            self._buffer[:] = to_lines(msg)
         else:
             if overwrite:
                 from_line = lineno
@@ -496,7 +706,7 @@ class HiddenBuffer:
             else:
                 from_line = lineno
                 to_line = lineno
-            self._buffer[from_line:to_line] = str(msg).split('\n')
+            self._buffer[from_line:to_line] = to_lines(msg)
         log.Log("Hidden buffer after insert: %s" % (self._buffer),
                 log.Logger.DEBUG)
 
@@ -508,6 +718,18 @@ class HiddenBuffer:
         except IndexError:
             del self._buffer[start_line:]
 
+    def set_line(self, number, text):
+        self._buffer[number] = text
+
+    def replace(self, start, end, lines):
+        self._buffer[start:end] = lines
+
+    def delete_line(self, number):
+        del self._buffer[number]
+
+    def line_count(self):
+        return len(self._buffer)
+
     def clean(self):
         self._buffer[:] = []
 
@@ -517,6 +739,10 @@ class HiddenBuffer:
     def is_empty(self):
         return not self._buffer
 
+    @contextlib.contextmanager
+    def editing(self):
+        yield
+
 
 class Window(interface.Window):
 
@@ -539,6 +765,12 @@ class Window(interface.Window):
     def getwinnr(self):
         return int(vim.eval("bufwinnr('%s')" % self.name))
 
+    def get_height(self):
+        winnr = self.getwinnr()
+        if winnr == -1:
+            return 0
+        return int(vim.eval("winheight(%i)" % winnr))
+
     def set_height(self, height):
         height = int(height)
         minheight = int(vim.eval("&winminheight"))
@@ -564,6 +796,10 @@ class Window(interface.Window):
     def delete(self, start_line, end_line=None):
         self._buffer.delete(start_line, end_line)
 
+    def replace(self, start_line, end_line, lines):
+        """Replace the lines from start_line up to end_line in one go."""
+        self._buffer.replace(start_line, end_line, lines)
+
     def line_at(self, line):
         return self._buffer.line(line)
 
@@ -626,9 +862,13 @@ class BreakpointWindow(Window):
  ID      | ACTIVE | TYPE        | DATA
 ==========================================================="""
 
+    def __init__(self):
+        Window.__init__(self)
+        self._buffer = HiddenBuffer(self.header.split('\n'))
+        # buffer row of each breakpoint, keyed on breakpoint ID
+        self.rows = rows.RowIndex(self._buffer.line_count())
+
     def on_create(self):
-        if self.creation_count == 1:
-            self.insert(self.header, 0)
         self.command('inoremap <buffer> dd <esc>'
                      ':python3 debugger.handle_delete_line_keypress()<cr>')
         self.command('nnoremap <buffer> dd '
@@ -642,30 +882,27 @@ class BreakpointWindow(Window):
         self.command('nnoremap <buffer> <cr> '
                      ':python3 debugger.handle_return_keypress()<cr>')
         self.command('setlocal syntax=debugger_breakpoint')
+        # the rows are only changed through the breakpoints, so they stay
+        # in step with the row index
+        self.command('setlocal nomodifiable')
 
     def add_breakpoint(self, breakpoint):
-        bp_str = self.breakpoint_str(breakpoint)
-        self.write(bp_str)
+        self.rows.add(breakpoint.id)
+        with self._buffer.editing():
+            self.write(self.breakpoint_str(breakpoint))
 
     def remove_breakpoint(self, breakpoint_id):
-        i = 0
-        for l in self._buffer.contents():
-            bp_str = " %i " % breakpoint_id
-            bp_id_len = len(bp_str)
-            if l[:bp_id_len] == bp_str:
-                self._buffer.delete(i)
-            i += 1
+        row = self.rows.remove(breakpoint_id)
+        if row is None:
+            return
+        with self._buffer.editing():
+            self._buffer.delete_line(row)
 
     def update_breakpoint(self, breakpoint):
-        i = 0
-        for l in self._buffer.contents():
-            bp_str = " %i " % breakpoint.id
-            bp_id_len = len(bp_str)
-            if l[:bp_id_len] == bp_str:
-
-                bp_str = self.breakpoint_str(breakpoint)
-                self.insert(bp_str, i, True, True)
-            i += 1
+        row = self.rows.row(breakpoint.id)
+        if row is not None:
+            with self._buffer.editing():
+                self._buffer.set_line(row, self.breakpoint_str(breakpoint))
 
     def breakpoint_str(self, breakpoint):
         bp_str = " %-7i | %-6s | %-11s | " % (breakpoint.id, breakpoint.enabled, breakpoint.type)
@@ -674,11 +911,21 @@ class BreakpointWindow(Window):
         elif breakpoint.type == 'conditional':
             bp_str += "%s:%s when (%s)" % (
                 breakpoint.file, str(breakpoint.line), breakpoint.condition)
+        elif breakpoint.type == 'log':
+            bp_str += "%s:%s log (%s)" % (
+                breakpoint.file, str(breakpoint.line),
+                "; ".join(breakpoint.expressions))
         elif breakpoint.type == 'exception':
             bp_str += "Exception: %s" % breakpoint.exception
         elif breakpoint.type == 'call' or breakpoint.type == 'return':
             bp_str += "Function: %s" % breakpoint.function
 
+        if breakpoint.resolved is False:
+            bp_str += " (unresolved)"
+        if breakpoint.hit_value is not None:
+            bp_str += " (hit %s %i, %i hits)" % (breakpoint.hit_condition,
+                                                 breakpoint.hit_value,
+                                                 breakpoint.hit_count)
         return bp_str
 
 
@@ -704,8 +951,10 @@ class StackWindow(Window):
     name = "DebuggerStack"
 
     pointer_sign_id = '6147'
-    has_sign_priority = vim.vvars['version'] > 801 \
-        or (hasattr(vim, 'funcs') and vim.funcs.has('nvim-0-4-0'))
+
+    def __init__(self, signs):
+        Window.__init__(self)
+        self.signs = signs
 
     def on_create(self):
         self.command('inoremap <buffer> <cr> <esc>'
@@ -722,14 +971,12 @@ class StackWindow(Window):
     def place_pointer(self, line):
         log.Log("Stack window: placing pointer sign on line "+str(line), log.Logger.INFO)
         self.remove_pointer()
-        signstr = 'sign place %s name=current_stack_position line=%s'
-        if self.has_sign_priority:
-            signstr = \
-                'sign place %s name=current_stack_position priority=99 line=%s'
-        vim.command(signstr % (self.pointer_sign_id, line))
+        if self.is_open:
+            self.signs.place(self.pointer_sign_id, 'current_stack_position',
+                             self.name, line, priority=99)
 
     def remove_pointer(self):
-        vim.command('sign unplace %s' % self.pointer_sign_id)
+        self.signs.unplace(self.pointer_sign_id)
 
 
 class WatchWindow(Window):
@@ -739,6 +986,17 @@ class WatchWindow(Window):
     def __init__(self):
         Window.__init__(self)
         self._eval_expression = None
+        self._change_matches = []
+        # the (context id, stack depth) shown, or None when showing an eval
+        self.shown_context = None
+        self.index = tree.PropertyIndex()
+        # the renderer of the properties that aren't in the buffer yet, and
+        # the index of the first of them
+        self._pending = None
+        self._rendered = 0
+
+    # render large contexts a part at a time, as the window is scrolled
+    virtual = True
 
     def on_create(self):
         self.command('inoremap <buffer> <cr> <esc>'
@@ -748,6 +1006,11 @@ class WatchWindow(Window):
         self.command('nnoremap <buffer> <2-LeftMouse> '
                      ':python3 debugger.handle_double_click()<cr>')
         self.command('setlocal syntax=debugger_watch')
+        events = 'CursorMoved'
+        if int(vim.eval("exists('##WinScrolled')")):
+            events += ',WinScrolled'
+        self.command('autocmd VdebugOut %s <buffer> '
+                     'python3 debugger.handle_watch_scroll()' % events)
 
     def set_eval_expression(self, eval_expression):
         self._eval_expression = eval_expression
@@ -762,6 +1025,146 @@ class WatchWindow(Window):
     def clear_eval_expression(self):
         self._eval_expression = None
 
+    def visible_properties(self):
+        """The number of properties that fit below the context header."""
+        rows = self.get_height() - 4
+        if opts.Options.get('watch_window_style') == 'expanded':
+            rows //= 2
+        return max(rows, 0)
+
+    def shows_pages(self):
+        """Whether the window shows a placeholder for a page of children,
+        or has one still to render."""
+        if any(line is not None and
+               isinstance(line.prop, dbgp.ContextPageProperty)
+               for line in self.index.lines):
+            return True
+        if self._pending is None:
+            return False
+        renderer, first = self._pending
+        return any(isinstance(p, dbgp.ContextPageProperty)
+                   for p in renderer.response.get_context()[first:])
+
+    def write(self, msg, return_focus=True):
+        Window.write(self, msg, after="normal gg")
+
+    def accept_renderer(self, renderer):
+        """Update the buffer to the rendered lines, changing only the lines
+        that differ, and highlight the values that changed.
+
+        Large contexts are only rendered as far as the window shows, or as
+        far as was shown before, and the rest when the window is scrolled.
+        """
+        count = self.__chunk_size()
+        if count is not None:
+            count = max(count, self._rendered)
+        lines = renderer.render(count=count)
+        self.__keep_pending(renderer, 0, count, lines)
+        edits, changed = diff.diff(self._buffer.contents(), lines)
+        for start, end, new in edits:
+            self._buffer.replace(start, end, new)
+        self.index = tree.PropertyIndex(renderer.lines)
+        self.highlight_changes(changed)
+
+    def on_scroll(self):
+        """Render more of the context if the end of the buffer is close to
+        being shown."""
+        if self._pending is None or \
+                self.getwinnr() != vim.current.window.number:
+            return
+        last_shown = int(vim.eval("line('w$')"))
+        if last_shown + self.get_height() >= self._buffer.line_count():
+            self.render_more()
+
+    def render_more(self):
+        renderer, first = self._pending
+        count = self.__chunk_size()
+        lines = renderer.render(first=first, count=count)
+        self.__keep_pending(renderer, first, count, lines)
+        end = self._buffer.line_count()
+        self.replace(end - 1, end, lines, renderer.lines)
+
+    def skip_hidden(self, prop):
+        """Leave the children of a property that was closed out of the
+        properties still to render, if some of them weren't rendered."""
+        if self._pending is None:
+            return
+        renderer, first = self._pending
+        properties = renderer.response.get_context()
+        start = next((i for i in range(first) if properties[i] is prop), None)
+        if start is None:
+            return
+        end = start + 1
+        while end < len(properties) and properties[end].depth > prop.depth:
+            end += 1
+        if end <= first:
+            return
+        last = self._buffer.line_count() - 1
+        remaining = len(properties) - end
+        if remaining:
+            self._pending = (renderer, end)
+            self.replace(last, last + 1,
+                         [" ... %i more properties" % remaining])
+        else:
+            self._pending = None
+            self._rendered = 0
+            self.replace(last, last + 1, [""])
+
+    def __keep_pending(self, renderer, first, count, lines):
+        if count is None or not renderer.remaining:
+            self._pending = None
+            self._rendered = 0
+            return
+        self._rendered = first + count
+        self._pending = (renderer, self._rendered)
+        lines[-1] = " ... %i more properties" % renderer.remaining
+
+    def __chunk_size(self):
+        """The number of properties to render at once, or None for all."""
+        if not self.virtual or \
+                not opts.Options.get('watch_window_virtual', int):
+            return None
+        return max(self.get_height(), 20) * 2
+
+    def replace(self, start_line, end_line, lines, index_lines=None):
+        """Replace lines of the buffer, and the index of the properties
+        shown on them."""
+        Window.replace(self, start_line, end_line, lines)
+        if index_lines is None:
+            index_lines = [None] * len(lines)
+        self.index.replace(start_line, end_line, index_lines)
+
+    def property_at(self, lineno):
+        """Get the index Line of the property shown at a line number
+        (counted from 1), if the line is the head of a property."""
+        if len(self.index) != self._buffer.line_count():
+            log.Log("The watch window index is out of date", log.Logger.DEBUG)
+            return None
+        return self.index.head_at(lineno - 1)
+
+    def highlight_changes(self, lines):
+        if not self.is_open:
+            return
+        try:
+            winid = int(vim.eval("win_getid(%i)" % self.getwinnr()))
+            for id in self._change_matches:
+                vim.command("silent! call matchdelete(%i, %i)" % (id, winid))
+            self._change_matches = []
+            # older versions of Vim take at most 8 positions per call
+            for i in range(0, len(lines), 8):
+                positions = [[l + 1] for l in lines[i:i + 8]]
+                self._change_matches.append(int(vim.eval(
+                    "matchaddpos('DbgChangedValue', %s, 10, -1, "
+                    "{'window': %i})" % (json.dumps(positions), winid))))
+        except vim.error as e:
+            log.Log("Failed to highlight changed values: %s" % e,
+                    log.Logger.DEBUG)
+
+
+class ValueWindow(Window):
+
+    name = "DebuggerValue"
+
     def write(self, msg, return_focus=True):
         Window.write(self, msg, after="normal gg")
 
@@ -826,6 +1229,7 @@ class StatusWindow(Window):
 class TraceWindow(WatchWindow):
 
     name = "DebuggerTrace"
+    virtual = False
 
     def __init__(self):
         WatchWindow.__init__(self)
@@ -864,118 +1268,3 @@ class TraceWindow(WatchWindow):
     def on_destroy(self):
         self._trace_expression = None
         self._last_context_rendered = None
-
-
-class ResponseRenderer:
-
-    def __init__(self, response):
-        self.response = response
-
-    def render(self):
-        pass
-
-
-class StackGetResponseRenderer(ResponseRenderer):
-
-    def render(self):
-        stack = self.response.get_stack()
-        string = ""
-        for s in stack:
-            if s.get('where'):
-                where = s.get('where')
-            else:
-                where = 'main'
-            file = util.FilePath(s.get('filename'))
-            line = "[%(num)s] %(where)s @ %(file)s:%(line)s" % {
-                'num': s.get('level'), 'where': where,
-                'file': str(file.as_local()), 'line': s.get('lineno')}
-            string += line + "\n"
-        return string
-
-
-class ContextGetResponseRenderer(ResponseRenderer):
-
-    def __init__(self, response, title=None, contexts=None, current_context=0):
-        ResponseRenderer.__init__(self, response)
-        self.title = title
-        self.contexts = contexts if contexts is not None else {}
-        self.current_context = current_context
-
-    def render(self, indent=0):
-        res = self.__create_tabs()
-
-        if self.title:
-            res += "- %s\n\n" % self.title
-
-        properties = self.response.get_context()
-        num_props = len(properties)
-        log.Log("Writing %i properties to the window" % num_props,
-                log.Logger.INFO)
-        for idx, prop in enumerate(properties):
-            final = False
-            try:
-                next_prop = properties[idx+1]
-            except IndexError:
-                final = True
-                next_prop = None
-            res += self.__render_property(prop, next_prop, final, indent)
-
-        log.Log("Writing to window:\n"+res, log.Logger.DEBUG)
-
-        return res
-
-    def __create_tabs(self):
-        res = []
-        if self.contexts:
-            for id, name in self.contexts.items():
-                if self.current_context == id:
-                    name = "*"+name
-                res.append("[ %s ]" % name)
-        if res:
-            return " ".join(res) + "\n\n"
-        return ""
-
-    def __render_property(self, p, next_p, last=False, indent=0):
-        indent_str = "".rjust((p.depth * 2)+indent)
-        line = "%(indent)s %(marker)s %(name)s = (%(type)s)%(value)s" % {
-            'indent': indent_str,
-            'marker': self.__get_marker(p),
-            'name': p.display_name,
-            'type': p.type_and_size(),
-            'value': " " + p.value
-        }
-        line = line.rstrip() + "\n"
-
-        if opts.Options.get('watch_window_style') == 'expanded':
-            depth = p.depth
-            if next_p and not last:
-                next_depth = next_p.depth
-                if depth == next_depth:
-                    next_sep = "|"
-                    num_spaces = depth * 2
-                elif depth > next_depth:
-                    if not p.is_last_child:
-                        line += "".rjust(depth * 2 + indent) + " |\n"
-                        line += "".rjust(depth * 2 + indent) + " ...\n"
-                    next_sep = "/"
-                    num_spaces = (depth * 2) - 1
-                else:
-                    next_sep = "\\"
-                    num_spaces = (depth * 2) + 1
-
-                line += "".rjust(num_spaces+indent) + " " + next_sep + "\n"
-            elif depth > 0:
-                if not p.is_last_child:
-                    line += "".rjust(depth * 2 + indent) + " |\n"
-                    line += "".rjust(depth * 2 + indent) + " ...\n"
-                line += "".rjust((depth * 2) - 1 + indent) + " /" + "\n"
-        return line
-
-    def __get_marker(self, property):
-        char = opts.Options.get('marker_default')
-        if property.has_children:
-            if property.child_count() == 0:
-                char = opts.Options.get('marker_closed_tree')
-            else:
-                char = opts.Options.get('marker_open_tree')
-        return char
@@ -107,6 +107,9 @@ class Keymapper:
     exclude = ["run", "close", "set_breakpoint", "enable_breakpoint", "disable_breakpoint",
                "toggle_breakpoint", "eval_visual"]
 
+    # functions which take the count typed before their key
+    counted = ["step_over", "step_into", "step_out"]
+
     def __init__(self):
         self.is_mapped = False
         self._reload_keys()
@@ -127,8 +130,13 @@ class Keymapper:
         for func in self.keymaps:
             if func not in self.exclude:
                 key = self.keymaps[func]
-                map_cmd = "noremap %s%s :python3 debugger.%s()<cr>" % (
-                    self.leader, key, func)
+                if func in self.counted:
+                    map_cmd = ("noremap %s%s :<C-u>python3 debugger.%s("
+                               "<C-r>=v:count1<cr>)<cr>") % (
+                                   self.leader, key, func)
+                else:
+                    map_cmd = "noremap %s%s :python3 debugger.%s()<cr>" % (
+                        self.leader, key, func)
                 vim.command(map_cmd)
         self.is_mapped = True
 
@@ -344,6 +352,25 @@ class Environment:
                 options.get('debug_file_level'), options.get('debug_file')))
 
 
+class Timer:
+    """Logs the time taken by the consecutive phases of an operation."""
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.time()
+        self.last = self.start
+
+    def log(self, phase, level=log.Logger.INFO):
+        """Log the time since the last phase ended."""
+        now = time.time()
+        log.Log("%s: %s took %.3fs" % (self.name, phase, now - self.last),
+                level)
+        self.last = now
+
+    def elapsed(self):
+        return time.time() - self.start
+
+
 class InputStream:
     """Get a character from Vim's input stream.
 
@@ -356,3 +383,9 @@ class InputStream:
             time.sleep(0.1)
         except vim.error as e:
             raise error.UserInterrupt()
+
+    @staticmethod
+    def pending():
+        """Whether there are keys waiting to be read, without reading them.
+        """
+        return vim.eval("getchar(1)") != "0"
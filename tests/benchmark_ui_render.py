@@ -0,0 +1,66 @@
+"""Time rendering a large context to the lines of the watch window.
+
+Run from the root of the repository with:
+
+    python -m tests.benchmark_ui_render [number of properties ...]
+
+It isn't run by unittest discover.
+"""
+import sys
+import timeit
+import vdebug.dbgp
+import vdebug.opts
+import vdebug.ui.render
+try:
+    from unittest.mock import Mock
+except ImportError:
+    from mock import Mock
+
+
+def context_xml(count):
+    """A context_get response with count properties, every tenth of which
+    is an array with two children."""
+    props = []
+    num = 0
+    while num < count:
+        name = "$var%i" % num
+        if num % 10 == 9:
+            props.append(
+                '<property name="%(n)s" fullname="%(n)s" type="array" '
+                'children="1" numchildren="2" page="0" pagesize="32">'
+                '<property name="0" fullname="%(n)s[0]" type="int">'
+                '<![CDATA[1]]></property>'
+                '<property name="1" fullname="%(n)s[1]" type="string" '
+                'size="3" encoding="base64"><![CDATA[Zm9v]]></property>'
+                '</property>' % {'n': name})
+            num += 3
+        else:
+            props.append('<property name="%(n)s" fullname="%(n)s" '
+                         'type="int"><![CDATA[%(v)i]]></property>'
+                         % {'n': name, 'v': num})
+            num += 1
+    return ('<?xml version="1.0" encoding="iso-8859-1"?>'
+            '<response xmlns="urn:debugger_protocol_v1" '
+            'command="context_get" context="0" transaction_id="1">'
+            '%s</response>' % "".join(props))
+
+
+def run(count, repeat=3):
+    res = vdebug.dbgp.ContextGetResponse(context_xml(count), "", "", Mock())
+    parse = timeit.timeit(res.get_context, number=1)
+    print("%i properties, parsed in %.3fs" % (len(res.get_context()), parse))
+    for style in ('compact', 'expanded'):
+        vdebug.opts.Options.set({'marker_default': '*',
+                                 'marker_closed_tree': '+',
+                                 'marker_open_tree': '-',
+                                 'watch_window_style': style})
+        rend = vdebug.ui.render.ContextGetResponseRenderer(
+            res, "Locals", {0: "Locals", 1: "Globals"}, 0)
+        best = min(timeit.repeat(rend.render, number=1, repeat=repeat))
+        lines = len(rend.render())
+        print("  %-8s %7i lines in %.3fs" % (style, lines, best))
+
+
+if __name__ == '__main__':
+    for count in [int(arg) for arg in sys.argv[1:]] or [10000, 100000]:
+        run(count)
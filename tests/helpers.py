@@ -0,0 +1,70 @@
+"""Helpers shared by the test modules."""
+import vdebug.dbgp
+try:
+    from unittest.mock import Mock
+except ImportError:
+    from mock import Mock
+
+
+def status(state, lineno=None, command="run"):
+    """A status response, with the position of the break if lineno is
+    given."""
+    message = ""
+    if lineno is not None:
+        message = """<xdebug:message filename="file:///path/to/file"
+            lineno="%i"></xdebug:message>""" % lineno
+    return vdebug.dbgp.StatusResponse("""<?xml version="1.0"
+        encoding="iso-8859-1"?>\n<response xmlns="urn:debugger_protocol_v1"
+        xmlns:xdebug="https://xdebug.org/dbgp/xdebug" command="%s"
+        transaction_id="1" status="%s" reason="ok">%s</response>"""
+        % (command, state, message), command, "", Mock())
+
+
+def stack(depth, lineno):
+    """A stack_get response with depth frames, the top one at a line."""
+    res = Mock()
+    res.get_stack.return_value = [
+        {'filename': 'file:///path/to/file', 'lineno': str(lineno)}] + \
+        [{'filename': 'file:///path/to/file', 'lineno': '1'}] * (depth - 1)
+    return res
+
+
+class PipelineApiMock(Mock):
+    """Api mock which runs pipelined commands and returns the responses.
+
+    As with the real Api, the commands called while a pipeline is queued
+    return their position, and the pipeline returns their responses in
+    order, with the exceptions they raise in place of a response. The
+    number of pipelines sent is counted in pipelines."""
+
+    def __init__(self, *args, **kwargs):
+        Mock.__init__(self, *args, **kwargs)
+        self.pipelines = 0
+        self.queued = None
+        self.breakpoint_list.return_value.get_breakpoints.return_value = []
+
+    def _get_child_mock(self, **kwargs):
+        return _CommandMock(**kwargs)
+
+    def pipeline(self, queue):
+        self.pipelines += 1
+        self.queued = []
+        try:
+            queue()
+        finally:
+            responses, self.queued = self.queued, None
+        return responses
+
+
+class _CommandMock(Mock):
+    """A command of a PipelineApiMock, which is queued in a pipeline."""
+
+    def __call__(self, *args, **kwargs):
+        api = self._mock_parent
+        if not isinstance(api, PipelineApiMock) or api.queued is None:
+            return Mock.__call__(self, *args, **kwargs)
+        try:
+            api.queued.append(Mock.__call__(self, *args, **kwargs))
+        except Exception as e:
+            api.queued.append(e)
+        return len(api.queued) - 1
@@ -1,8 +1,13 @@
 import unittest
 import vdebug.breakpoint
+import vdebug.dbgp
 import vdebug.error
 import vdebug.util
 import base64
+import os
+import shutil
+import tempfile
+from tests.helpers import PipelineApiMock
 try:
     from unittest.mock import Mock
 except ImportError:
@@ -187,3 +192,411 @@ class BreakpointTest(unittest.TestCase):
         self.assertRaisesRegex(vdebug.error.BreakpointError,\
                 re, vdebug.breakpoint.Breakpoint.parse, ui, args)
 
+
+class StoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = vdebug.breakpoint.Store()
+        self.bps = [vdebug.breakpoint.ExceptionBreakpoint(Mock(), "E%i" % i)
+                    for i in range(3)]
+        for bp in self.bps:
+            self.store.add_breakpoint(bp)
+
+    def test_link_api_registers_breakpoints_in_one_pipeline(self):
+        api = PipelineApiMock()
+        responses = [Mock(), vdebug.dbgp.DBGPError("invalid", 3), Mock()]
+        for i, res in enumerate(responses):
+            if isinstance(res, Mock):
+                res.get_id.return_value = 100 + i
+        api.breakpoint_set.side_effect = lambda cmd: responses.pop(0)
+        self.store.link_api(api)
+
+        self.assertEqual(api.breakpoint_set.call_count, 3)
+        self.assertEqual(self.bps[0].get_debugger_id(), 100)
+        self.assertIsNone(self.bps[1].get_debugger_id())
+        self.assertEqual(self.bps[2].get_debugger_id(), 102)
+
+    def test_unsupported_types_are_not_registered(self):
+        api = PipelineApiMock()
+        api.breakpoint_set.return_value.get_id.return_value = 7
+        call = vdebug.breakpoint.CallBreakpoint(Mock(), "foo")
+        self.store.add_breakpoint(call)
+        self.store.link_api(api, ["line", "call"])
+
+        self.assertEqual(api.breakpoint_set.call_count, 1)
+        self.assertEqual(call.get_debugger_id(), 7)
+        self.assertIsNone(self.bps[0].get_debugger_id())
+
+        self.store.add_breakpoint(
+            vdebug.breakpoint.ExceptionBreakpoint(Mock(), "E"))
+        self.assertEqual(api.breakpoint_set.call_count, 1)
+
+    def test_logpoints_are_line_breakpoints_to_the_debugger(self):
+        logpoint = vdebug.breakpoint.LogBreakpoint(
+            Mock(), vdebug.util.FilePath("/path/to/file"), 5, ["$i"])
+        self.store.link_api(PipelineApiMock(), ["line"])
+        self.assertTrue(self.store.is_supported(logpoint))
+        self.assertFalse(self.store.is_supported(self.bps[0]))
+        self.store.unlink_api()
+        self.assertTrue(self.store.is_supported(self.bps[0]))
+
+    def test_clear_breakpoints_removes_registered_breakpoints(self):
+        api = PipelineApiMock()
+        api.breakpoint_set.return_value.get_id.return_value = 7
+        self.store.link_api(api)
+        self.bps[1].set_debugger_id(None)
+        self.store.clear_breakpoints()
+
+        self.assertEqual(api.breakpoint_remove.call_count, 2)
+        self.assertEqual(self.store.breakpoints, {})
+        for bp in self.bps:
+            bp.ui.remove_breakpoint.assert_called_once_with(bp)
+
+
+class StoreIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = vdebug.breakpoint.Store()
+        self.file = vdebug.util.FilePath("/path/to/file")
+        self.bp = vdebug.breakpoint.LineBreakpoint(Mock(), self.file, 10)
+        self.store.add_breakpoint(self.bp)
+
+    def test_find_breakpoint_by_file_and_line(self):
+        id = self.store.find_breakpoint(
+            vdebug.util.FilePath("/path/to/file"), 10)
+        self.assertEqual(id, self.bp.get_id())
+        self.assertIsNone(self.store.find_breakpoint(self.file, 11))
+
+    def test_find_breakpoint_after_line_update(self):
+        self.store.update_lines({self.bp.get_id(): "12"})
+        self.assertIsNone(self.store.find_breakpoint(self.file, 10))
+        self.assertEqual(self.store.find_breakpoint(self.file, 12),
+                         self.bp.get_id())
+
+    def test_find_breakpoint_after_remove(self):
+        self.store.remove_breakpoint(self.bp)
+        self.assertIsNone(self.store.find_breakpoint(self.file, 10))
+        self.assertEqual(self.store.get_breakpoints_in_file(self.file), [])
+
+    def test_breakpoints_moved_onto_the_same_line(self):
+        other = vdebug.breakpoint.LineBreakpoint(Mock(), self.file, 12)
+        self.store.add_breakpoint(other)
+        # deleting the lines between them moves the second onto the first
+        self.store.shift_lines("/path/to/file", [[11, 13, -2]])
+        self.assertEqual(other.get_line(), 11)
+        self.store.shift_lines("/path/to/file", [[10, 11, -1]])
+        self.assertEqual([self.bp.get_line(), other.get_line()], [10, 10])
+        self.assertEqual(self.store.find_breakpoint(self.file, 10),
+                         self.bp.get_id())
+        self.store.remove_breakpoint(self.bp)
+        self.assertEqual(self.store.find_breakpoint(self.file, 10),
+                         other.get_id())
+        self.store.remove_breakpoint(other)
+        self.assertIsNone(self.store.find_breakpoint(self.file, 10))
+
+    def test_get_breakpoints_in_file(self):
+        other = vdebug.breakpoint.ConditionalBreakpoint(
+            Mock(), self.file, 20, "$x > 1")
+        self.store.add_breakpoint(other)
+        self.store.add_breakpoint(
+            vdebug.breakpoint.ExceptionBreakpoint(Mock(), "Exception"))
+        bps = self.store.get_breakpoints_in_file(self.file)
+        self.assertEqual(set(bps), set([self.bp, other]))
+
+    def test_get_files(self):
+        self.store.add_breakpoint(vdebug.breakpoint.LineBreakpoint(
+            Mock(), vdebug.util.FilePath("/path/to/other"), 1))
+        self.store.add_breakpoint(
+            vdebug.breakpoint.ExceptionBreakpoint(Mock(), "Exception"))
+        self.assertEqual(sorted(self.store.get_files()),
+                         ["/path/to/file", "/path/to/other"])
+
+        self.store.remove_breakpoint(self.bp)
+        self.assertEqual(self.store.get_files(), ["/path/to/other"])
+
+    def test_get_breakpoint_by_debugger_id(self):
+        api = PipelineApiMock()
+        api.breakpoint_set.return_value.get_id.return_value = 42
+        self.store.link_api(api)
+        self.assertIs(self.store.get_breakpoint_by_debugger_id("42"), self.bp)
+
+        self.store.unlink_api()
+        self.assertIsNone(self.store.get_breakpoint_by_debugger_id(42))
+        self.assertIsNone(self.bp.get_debugger_id())
+
+
+class StorePersistenceTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, "breakpoints")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_breakpoints_are_restored(self):
+        store = vdebug.breakpoint.Store()
+        store.load(self.filename, Mock())
+        file = vdebug.util.FilePath("/path/to/file")
+        store.add_breakpoint(
+            vdebug.breakpoint.ConditionalBreakpoint(Mock(), file, 5, "$x"))
+        line_bp = vdebug.breakpoint.LineBreakpoint(Mock(), file, 10)
+        store.add_breakpoint(line_bp)
+        store.add_breakpoint(
+            vdebug.breakpoint.ExceptionBreakpoint(Mock(), "Exception"))
+        store.add_breakpoint(
+            vdebug.breakpoint.TemporaryLineBreakpoint(Mock(), file, 20))
+        store.disable_breakpoint_by_id(line_bp.get_id())
+
+        restored = vdebug.breakpoint.Store()
+        ui = Mock()
+        restored.load(self.filename, ui)
+        bps = sorted(restored.breakpoints.values(), key=lambda bp: bp.id)
+        self.assertEqual([bp.type for bp in bps],
+                         ["conditional", "line", "exception"])
+        self.assertEqual(bps[0].condition, "$x")
+        self.assertEqual(bps[0].get_line(), 5)
+        self.assertFalse(bps[1].enabled)
+        self.assertEqual(bps[2].exception, "Exception")
+        self.assertEqual(restored.find_breakpoint(file, 10), bps[1].get_id())
+        self.assertEqual(ui.register_breakpoint.call_count, 3)
+
+    def test_missing_file_is_created_on_change(self):
+        store = vdebug.breakpoint.Store()
+        store.load(self.filename, Mock())
+        self.assertEqual(store.breakpoints, {})
+        self.assertFalse(os.path.exists(self.filename))
+        store.add_breakpoint(
+            vdebug.breakpoint.CallBreakpoint(Mock(), "main"))
+        self.assertTrue(os.path.exists(self.filename))
+
+    def test_invalid_entries_are_skipped(self):
+        with open(self.filename, 'w') as f:
+            f.write('[{"type":"call","function":"main"},{"type":"bogus"},'
+                    '{"type":"line"}]')
+        store = vdebug.breakpoint.Store()
+        store.load(self.filename, Mock())
+        self.assertEqual(len(store.breakpoints), 1)
+
+
+class ShiftLinesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = vdebug.breakpoint.Store()
+        self.file = vdebug.util.FilePath("/path/to/file")
+        self.bps = [vdebug.breakpoint.LineBreakpoint(Mock(), self.file, line)
+                    for line in (5, 10, 20)]
+        for bp in self.bps:
+            self.store.add_breakpoint(bp)
+
+    def test_shift_line(self):
+        shift_line = vdebug.breakpoint.shift_line
+        # two lines added before line 5
+        self.assertEqual(shift_line(10, 5, 5, 2), 12)
+        self.assertEqual(shift_line(4, 5, 5, 2), 4)
+        # lines 5 to 7 deleted
+        self.assertEqual(shift_line(10, 5, 8, -3), 7)
+        self.assertEqual(shift_line(6, 5, 8, -3), 5)
+        # line 5 changed
+        self.assertEqual(shift_line(5, 5, 6, 0), 5)
+
+    def test_lines_are_shifted_in_order(self):
+        moved = self.store.shift_lines("/path/to/file",
+                                       [[1, 1, 3], [12, 14, "-2"]])
+        self.assertEqual([bp.get_line() for bp in self.bps], [8, 12, 21])
+        self.assertEqual(len(moved), 3)
+        self.assertEqual(self.store.find_breakpoint(self.file, 8),
+                         self.bps[0].get_id())
+        self.assertIsNone(self.store.find_breakpoint(self.file, 5))
+
+    def test_other_files_are_not_shifted(self):
+        self.assertEqual(self.store.shift_lines("/path/to/other",
+                                                [[1, 1, 3]]), [])
+        self.assertEqual(self.bps[0].get_line(), 5)
+
+    def test_moved_breakpoints_are_updated_in_one_pipeline(self):
+        api = PipelineApiMock()
+        api.breakpoint_set.return_value.get_id.return_value = 7
+        self.store.link_api(api)
+        self.store.shift_lines("/path/to/file", [[15, 15, 1]])
+        api.breakpoint_move.assert_called_once_with(7, 21)
+
+    def test_moved_breakpoints_are_shown_again(self):
+        self.store.shift_lines("/path/to/file", [[15, 15, 1]])
+        self.bps[0].ui.update_breakpoint.assert_not_called()
+        self.bps[2].ui.update_breakpoint.assert_called_once_with(self.bps[2])
+
+    def test_moves_are_saved_on_request(self):
+        dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dir)
+        filename = os.path.join(dir, "breakpoints")
+        self.store.load(filename, Mock())
+        self.store.save()
+        self.store.shift_lines("/path/to/file", [[15, 15, 1]])
+        with open(filename) as f:
+            self.assertIn('"line":20', f.read())
+        self.store.save_moved()
+        with open(filename) as f:
+            self.assertIn('"line":21', f.read())
+
+
+class HitConditionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ui = Mock()
+        self.ui.get_current_row.return_value = 1
+        self.ui.get_current_file.return_value = \
+            vdebug.util.FilePath("/path/to/file")
+        self.ui.get_current_line.return_value = "$x = 1;"
+
+    def test_parse_line_breakpoint_with_hit_value(self):
+        bp = vdebug.breakpoint.Breakpoint.parse(self.ui, "@1000")
+        self.assertEqual(bp.type, "line")
+        self.assertEqual(bp.hit_condition, ">=")
+        self.assertEqual(bp.hit_value, 1000)
+        self.assertEqual(bp.get_cmd(), '-t line -f "file:///path/to/file" '
+                         '-n 1 -s enabled -h 1000 -o >=')
+
+    def test_parse_call_breakpoint_with_hit_condition(self):
+        bp = vdebug.breakpoint.Breakpoint.parse(self.ui, "@%10 call foo")
+        self.assertEqual(bp.type, "call")
+        self.assertEqual(bp.get_cmd(), "-t call -m foo -s enabled -h 10 -o %")
+
+    def test_parse_conditional_breakpoint_with_hit_condition(self):
+        bp = vdebug.breakpoint.Breakpoint.parse(self.ui,
+                                                "@==3 conditional $x > 1")
+        self.assertTrue(bp.get_cmd().startswith(
+            '-t conditional -f "file:///path/to/file" -n 1 -s enabled '
+            '-h 3 -o == -- '))
+
+    def test_zero_hit_value_raises_error(self):
+        self.assertRaises(vdebug.error.BreakpointError,
+                          vdebug.breakpoint.Breakpoint.parse, self.ui, "@0")
+
+    def test_hit_condition_is_saved(self):
+        bp = vdebug.breakpoint.Breakpoint.parse(self.ui,
+                                                "@==5 exception Error")
+        restored = vdebug.breakpoint.Breakpoint.from_dict(self.ui,
+                                                          bp.to_dict())
+        self.assertEqual(restored.hit_condition, "==")
+        self.assertEqual(restored.hit_value, 5)
+
+    def test_hit_counts_are_read_from_the_debugger(self):
+        store = vdebug.breakpoint.Store()
+        bp = vdebug.breakpoint.Breakpoint.parse(self.ui, "@10")
+        store.add_breakpoint(bp)
+        api = PipelineApiMock()
+        api.breakpoint_set.return_value.get_id.return_value = 7
+        store.link_api(api)
+
+        node = Mock()
+        node.get.side_effect = {'id': '7', 'hit_count': '4'}.get
+        store.reconcile([node])
+        self.assertEqual(bp.hit_count, 4)
+        self.ui.update_breakpoint.assert_called_once_with(bp)
+
+
+class LogBreakpointTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ui = Mock()
+        self.ui.get_current_row.return_value = 3
+        self.ui.get_current_file.return_value = \
+            vdebug.util.FilePath("/path/to/file")
+
+    def test_parse_expressions(self):
+        bp = vdebug.breakpoint.Breakpoint.parse(self.ui,
+                                                "log $i; count($x) ;")
+        self.assertEqual(bp.type, "log")
+        self.assertEqual(bp.expressions, ["$i", "count($x)"])
+        self.assertEqual(bp.get_cmd(), '-t line -f "file:///path/to/file" '
+                         '-n 3 -s enabled')
+
+    def test_parse_without_expressions_raises_error(self):
+        self.assertRaises(vdebug.error.BreakpointError,
+                          vdebug.breakpoint.Breakpoint.parse, self.ui, "log")
+
+    def test_expressions_are_saved(self):
+        bp = vdebug.breakpoint.Breakpoint.parse(self.ui, "log $i")
+        restored = vdebug.breakpoint.Breakpoint.from_dict(self.ui,
+                                                          bp.to_dict())
+        self.assertEqual(restored.type, "log")
+        self.assertEqual(restored.expressions, ["$i"])
+
+
+class ReconcileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = vdebug.breakpoint.Store()
+        self.file = vdebug.util.FilePath("/path/to/file")
+        self.bps = [vdebug.breakpoint.LineBreakpoint(Mock(), self.file, line)
+                    for line in (5, 10)]
+        for bp in self.bps:
+            self.store.add_breakpoint(bp)
+        self.api = PipelineApiMock()
+        ids = [21, 22]
+        self.api.breakpoint_set.side_effect = \
+            lambda cmd: Mock(get_id=Mock(return_value=ids.pop(0)))
+
+    @staticmethod
+    def node(**attrs):
+        return vdebug.dbgp.ET.Element('breakpoint', attrs)
+
+    def test_link_api_reconciles_with_breakpoint_list(self):
+        self.api.breakpoint_list.return_value.get_breakpoints.return_value = [
+            self.node(id="21", lineno="6", state="enabled",
+                      resolved="resolved"),
+            self.node(id="22", lineno="10", state="enabled",
+                      resolved="unresolved")]
+        self.store.link_api(self.api)
+
+        self.assertEqual(self.bps[0].get_line(), 6)
+        self.assertTrue(self.bps[0].resolved)
+        self.assertEqual(self.store.find_breakpoint(self.file, 6),
+                         self.bps[0].get_id())
+        self.assertFalse(self.bps[1].resolved)
+        self.bps[0].ui.update_breakpoint.assert_called_once_with(self.bps[0])
+        self.bps[1].ui.update_breakpoint.assert_called_once_with(self.bps[1])
+
+    def test_unchanged_breakpoints_are_not_updated(self):
+        self.store.link_api(self.api)
+        changed = self.store.reconcile([
+            self.node(id="21", lineno="5", state="enabled"),
+            self.node(id="99", lineno="1", state="disabled")])
+        self.assertEqual(changed, [])
+        self.bps[0].ui.update_breakpoint.assert_not_called()
+
+    def test_disabled_state_is_taken_from_the_debugger(self):
+        self.store.link_api(self.api)
+        changed = self.store.reconcile([
+            self.node(id="22", lineno="10", state="disabled")])
+        self.assertEqual(changed, [self.bps[1]])
+        self.assertFalse(self.bps[1].enabled)
+
+    def test_resolution_is_read_when_a_breakpoint_is_set(self):
+        self.store.link_api(self.api)
+        self.api.breakpoint_set.side_effect = None
+        self.api.breakpoint_set.return_value = \
+            vdebug.dbgp.BreakpointSetResponse(
+                """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1" command="breakpoint_set"
+transaction_id="5" id="23" state="enabled" resolved="unresolved"/>""",
+                "breakpoint_set", "", Mock())
+        bp = vdebug.breakpoint.LineBreakpoint(Mock(), self.file, 20)
+        self.store.add_breakpoint(bp)
+        self.assertEqual(bp.get_debugger_id(), 23)
+        self.assertFalse(bp.resolved)
+        bp.ui.update_breakpoint.assert_called_once_with(bp)
+
+    def test_resolved_notifications_are_applied(self):
+        self.store.link_api(self.api)
+        notification = vdebug.dbgp.Notification(
+            """<?xml version="1.0" encoding="iso-8859-1"?>
+<notify xmlns="urn:debugger_protocol_v1" name="breakpoint_resolved"><breakpoint
+type="line" resolved="resolved" filename="file:///path/to/file" lineno="12"
+state="enabled" hit_count="0" hit_value="0" id="22"/></notify>""",
+            "notify", "", Mock())
+        changed = self.store.apply_notifications([notification])
+        self.assertEqual(changed, [self.bps[1]])
+        self.assertEqual(self.bps[1].get_line(), 12)
+        self.assertTrue(self.bps[1].resolved)
@@ -35,6 +35,12 @@ class ApiTest(unittest.TestCase):
         assert self.p.version == "1.0"
         assert self.p.idekey == "netbeans-xdebug"
 
+    def test_engine_identity(self):
+        """Test that the engine is identified from the init message"""
+        assert self.p.engine_name == "Xdebug"
+        assert self.p.engine_version == "2.2.0"
+        assert self.p.identity() == "php|Xdebug|2.2.0|1.0|None"
+
     def test_status_send_adds_trans_id(self):
         """Test that the status command sends the right
         format command and adds a transaction ID"""
@@ -153,6 +159,134 @@ class ApiTest(unittest.TestCase):
         self.assertEqual(str(res),"iso-8859-1")
         self.assertEqual(res.is_supported(),1)
 
+    def test_property_get_without_page(self):
+        """Test that the first page is requested without a page argument"""
+        self.p.conn.send_msg = MagicMock()
+        self.p.conn.recv_msg.return_value = """<?xml
+            version="1.0" encoding="iso-8859-1"?>\n<response
+            xmlns="urn:debugger_protocol_v1" command="property_get"
+            transaction_id="1"></response>"""
+        self.p.property_get('$x')
+        self.p.conn.send_msg.assert_called_once_with(
+            'property_get -i 1 -n "$x" -d 0')
+
+    def test_property_get_with_page(self):
+        """Test that a page of a property can be requested"""
+        self.p.conn.send_msg = MagicMock()
+        self.p.conn.recv_msg.return_value = """<?xml
+            version="1.0" encoding="iso-8859-1"?>\n<response
+            xmlns="urn:debugger_protocol_v1" command="property_get"
+            transaction_id="1"></response>"""
+        self.p.property_get('$x', 3)
+        self.p.conn.send_msg.assert_called_once_with(
+            'property_get -i 1 -n "$x" -d 0 -p 3')
+
+    def test_property_get_in_context(self):
+        """Test that a property can be requested from another context and
+        stack depth"""
+        self.p.conn.send_msg = MagicMock()
+        self.p.conn.recv_msg.return_value = """<?xml
+            version="1.0" encoding="iso-8859-1"?>\n<response
+            xmlns="urn:debugger_protocol_v1" command="property_get"
+            transaction_id="1"></response>"""
+        self.p.property_get('$x', 0, 1, 2)
+        self.p.conn.send_msg.assert_called_once_with(
+            'property_get -i 1 -n "$x" -d 2 -c 1')
+
+    def test_property_value_is_not_limited(self):
+        """Test that property_value asks for the value without max_data"""
+        self.p.conn.send_msg = MagicMock()
+        self.p.conn.recv_msg.return_value = """<?xml
+            version="1.0" encoding="iso-8859-1"?>\n<response
+            xmlns="urn:debugger_protocol_v1" command="property_value"
+            transaction_id="1" size="3"><![CDATA[abc]]></response>"""
+        res = self.p.property_value('$x', 1, 2)
+        self.p.conn.send_msg.assert_called_once_with(
+            'property_value -i 1 -n "$x" -d 2 -c 1 -m 0')
+        self.assertEqual(res.get_value(), 'abc')
+
+    def test_pipeline_sends_commands_together(self):
+        """Test that pipelined commands are written in one message"""
+        self.p.conn.send_msg = MagicMock()
+        self.p.conn.recv_msg.side_effect = [
+            """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1" command="feature_set"
+transaction_id="1" feature="max_data" success="1"></response>""",
+            """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1" command="status"
+transaction_id="2" status="starting" reason="ok"></response>"""]
+
+        def queue():
+            self.assertEqual(self.p.feature_set('max_data', 512), 0)
+            self.assertEqual(self.p.status(), 1)
+
+        responses = self.p.pipeline(queue)
+        self.p.conn.send_msg.assert_called_once_with(
+            'feature_set -i 1 -n max_data -v 512\0status -i 2')
+        self.assertEqual(len(responses), 2)
+        self.assertEqual(str(responses[1]), 'starting')
+
+    def test_pipeline_matches_responses_by_transaction_id(self):
+        """Test that responses are matched to their command"""
+        self.p.conn.send_msg = MagicMock()
+        self.p.conn.recv_msg.side_effect = [
+            """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1" command="breakpoint_set"
+transaction_id="2" id="22"></response>""",
+            """<?xml version="1.0" encoding="iso-8859-1"?>
+<notify xmlns="urn:debugger_protocol_v1" name="breakpoint_resolved"></notify>""",
+            """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1" command="breakpoint_set"
+transaction_id="1" id="11"></response>"""]
+
+        def queue():
+            self.p.breakpoint_set('-t line -f file:///a -n 1')
+            self.p.breakpoint_set('-t line -f file:///a -n 2')
+
+        responses = self.p.pipeline(queue)
+        self.assertEqual([r.get_id() for r in responses], [11, 22])
+
+    def test_pipeline_returns_errors(self):
+        """Test that an error for one command doesn't stop the others"""
+        self.p.conn.send_msg = MagicMock()
+        self.p.conn.recv_msg.side_effect = [
+            """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1" command="feature_set"
+transaction_id="1"><error code="3"><message><![CDATA[invalid or missing options]]></message></error></response>""",
+            """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1" command="feature_set"
+transaction_id="2" feature="max_data" success="1"></response>"""]
+
+        def queue():
+            self.p.feature_set('foo', 1)
+            self.p.feature_set('max_data', 512)
+
+        responses = self.p.pipeline(queue)
+        self.assertIsInstance(responses[0], vdebug.dbgp.DBGPError)
+        self.assertIsInstance(responses[1], vdebug.dbgp.Response)
+
+    def test_notifications_are_kept_aside(self):
+        """Test that notifications before a response are collected"""
+        self.p.conn.send_msg = MagicMock()
+        self.p.conn.recv_msg.side_effect = [
+            """<?xml version="1.0" encoding="iso-8859-1"?>
+<notify xmlns="urn:debugger_protocol_v1" name="breakpoint_resolved"><breakpoint
+id="3" resolved="resolved"/></notify>""",
+            """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1" command="run"
+transaction_id="1" status="break" reason="ok"></response>"""]
+        self.assertEqual(str(self.p.run()), "break")
+        notifications = self.p.pop_notifications()
+        self.assertEqual(len(notifications), 1)
+        self.assertEqual(notifications[0].get_name(), "breakpoint_resolved")
+        self.assertEqual(notifications[0].get_breakpoint().get('id'), "3")
+        self.assertEqual(self.p.pop_notifications(), [])
+
+    def test_empty_pipeline_sends_nothing(self):
+        self.p.conn.send_msg = MagicMock()
+        self.assertEqual(self.p.pipeline(lambda: None), [])
+        self.p.conn.send_msg.assert_not_called()
+
 class apiInvalidInitTest(unittest.TestCase):
 
     init_msg = """<?xml version="1.0"
@@ -125,3 +125,85 @@ context="0"><property  type="int" children="0" size="0"><value><![CDATA[1]]></va
         self.assertEqual(prop.type,'str')
         self.assertFalse(prop.has_children)
 
+
+class ContextPropertyPageTest(unittest.TestCase):
+    def __get_context_property(self,xml_string):
+        xml = ET.fromstring(xml_string)
+        firstnode = xml[0]
+        return vdebug.dbgp.ContextProperty(firstnode)
+
+    def __get_paged_property(self, page):
+        return self.__get_context_property(\
+            """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1"
+xmlns:xdebug="http://xdebug.org/dbgp/xdebug"
+command="property_get" transaction_id="3"><property name="$big"
+fullname="$big" type="array" children="1" numchildren="5" page="%i"
+pagesize="2"><property name="%i" fullname="$big[%i]"
+type="int"><![CDATA[1]]></property><property name="%i"
+fullname="$big[%i]" type="int"><![CDATA[2]]></property></property></response>"""
+            % (page, page * 2, page * 2, page * 2 + 1, page * 2 + 1))
+
+    def test_first_page_has_more_pages(self):
+        prop = self.__get_paged_property(0)
+        self.assertEqual(prop.page, 0)
+        self.assertEqual(prop.pagesize, 2)
+        self.assertTrue(prop.has_more_pages())
+        self.assertFalse(prop.children[1].is_last_child)
+
+    def test_last_page_has_no_more_pages(self):
+        prop = self.__get_paged_property(2)
+        self.assertFalse(prop.has_more_pages())
+        self.assertTrue(prop.children[0].is_last_child)
+
+    def test_page_property(self):
+        prop = self.__get_paged_property(1)
+        page = vdebug.dbgp.ContextPageProperty(prop)
+        self.assertEqual(page.display_name, '$big')
+        self.assertEqual(page.depth, 1)
+        self.assertEqual(page.page, 2)
+        self.assertEqual(page.type_and_size(), 'page 2')
+        self.assertEqual(page.value, 'next 1 of 5')
+        self.assertEqual(page.child_count(), 0)
+
+    def test_unpaged_property_has_no_more_pages(self):
+        prop = self.__get_context_property(\
+            """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1"
+command="context_get" transaction_id="3"
+context="0"><property name="$argc" fullname="$argc"
+type="int"><![CDATA[4]]></property></response>""")
+        self.assertIsNone(prop.pagesize)
+        self.assertFalse(prop.has_more_pages())
+
+
+class ContextPropertyTruncatedTest(unittest.TestCase):
+    def __get_context_property(self,xml_string):
+        xml = ET.fromstring(xml_string)
+        firstnode = xml[0]
+        return vdebug.dbgp.ContextProperty(firstnode)
+
+    def test_truncated_string(self):
+        prop = self.__get_context_property(\
+            """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1"
+command="context_get" transaction_id="3"
+context="0"><property name="$html" fullname="$html"
+type="string" size="5000"
+encoding="base64"><![CDATA[PGh0bWw+]]></property></response>""")
+
+        self.assertEqual(prop.value,'`<html>`')
+        self.assertTrue(prop.truncated)
+        self.assertEqual(prop.type_and_size(),'string [5000, truncated]')
+
+    def test_complete_string(self):
+        prop = self.__get_context_property(\
+            """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1"
+command="context_get" transaction_id="3"
+context="0"><property name="$html" fullname="$html"
+type="string" size="6"
+encoding="base64"><![CDATA[PGh0bWw+]]></property></response>""")
+
+        self.assertFalse(prop.truncated)
+        self.assertEqual(prop.type_and_size(),'string [6]')
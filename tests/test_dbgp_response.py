@@ -205,3 +205,62 @@ class ContextGetAlternateTest(unittest.TestCase):
         assert len(context) == 3
         self.assertIsInstance(context[0],vdebug.dbgp.ContextProperty)
 
+    def test_expand_merges_children(self):
+        res = vdebug.dbgp.ContextGetResponse(self.response,"","",Mock())
+        fetched = vdebug.dbgp.ContextGetResponse("""<?xml version="1.0"?>
+<response xmlns="urn:debugger_protocol_v1" command="property_get"
+transaction_id="4"><property name="obj" fullname="obj" type="Example"
+children="1" numchildren="2" page="0" pagesize="10"><property name="a"
+fullname="obj.a" type="int" children="0"><value><![CDATA[1]]></value>
+</property><property name="b" fullname="obj.b" type="list" children="1"
+numchildren="1"></property></property></response>""","","",Mock())
+        self.assertTrue(res.expand("obj", fetched))
+        context = res.get_context()
+        self.assertEqual([p.display_name for p in context],
+                         ["mylist", "myvar", "obj", "obj.a", "obj.b"])
+        self.assertEqual([p.depth for p in context[2:]], [0, 1, 1])
+        self.assertIs(context[3].parent, context[2])
+        self.assertTrue(context[4].is_last_child)
+
+    def test_expand_unknown_property(self):
+        res = vdebug.dbgp.ContextGetResponse(self.response,"","",Mock())
+        fetched = vdebug.dbgp.ContextGetResponse("""<?xml version="1.0"?>
+<response xmlns="urn:debugger_protocol_v1" command="property_get"
+transaction_id="4"><property name="x" fullname="x" type="int"
+children="0"></property></response>""","","",Mock())
+        self.assertFalse(res.expand("myvar", fetched))
+        self.assertFalse(res.expand("x", fetched))
+        self.assertEqual(len(res.get_context()), 3)
+
+
+class PropertyValueResponseTest(unittest.TestCase):
+    """Test the behaviour of the PropertyValueResponse class."""
+    def test_base64_value_is_decoded(self):
+        response = """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1" command="property_value"
+transaction_id="5" size="6" encoding="base64"><![CDATA[PGh0bWw+]]></response>"""
+        res = vdebug.dbgp.PropertyValueResponse(response,"","",Mock())
+        self.assertEqual(res.get_value(),"<html>")
+
+    def test_empty_value(self):
+        response = """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1" command="property_value"
+transaction_id="5" size="0"></response>"""
+        res = vdebug.dbgp.PropertyValueResponse(response,"","",Mock())
+        self.assertEqual(str(res),"")
+
+
+class BreakpointListResponseTest(unittest.TestCase):
+    """Test the behaviour of the BreakpointListResponse class."""
+    def test_breakpoints_are_listed(self):
+        response = """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1" command="breakpoint_list"
+transaction_id="5"><breakpoint type="line" filename="file:///a.php"
+lineno="3" state="enabled" hit_count="12" hit_value="10"
+hit_condition="&gt;=" id="7"></breakpoint></response>"""
+        res = vdebug.dbgp.BreakpointListResponse(response,"","",Mock())
+        bps = res.get_breakpoints()
+        self.assertEqual(len(bps), 1)
+        self.assertEqual(bps[0].get('id'), "7")
+        self.assertEqual(bps[0].get('hit_count'), "12")
+        self.assertEqual(bps[0].get('hit_condition'), ">=")
@@ -0,0 +1,53 @@
+import unittest
+import vdebug.breakpoint
+import vdebug.event
+import vdebug.opts
+import vdebug.util
+try:
+    from unittest.mock import Mock, patch
+except ImportError:
+    from mock import Mock, patch
+
+
+class BreakpointStatusEventTest(unittest.TestCase):
+
+    def setUp(self):
+        vdebug.opts.Options.set({})
+        self.store = vdebug.breakpoint.Store()
+        self.file = vdebug.util.FilePath("/path/to/file")
+        self.logpoint = vdebug.breakpoint.LogBreakpoint(
+            Mock(), self.file, 7, ["$i"])
+        self.store.add_breakpoint(self.logpoint)
+        self.handler = Mock()
+        self.handler.session.return_value = None
+        self.handler.breakpoints.return_value = self.store
+
+    def run_event(self, cls, args):
+        cls(self.handler).run(args)
+
+    def test_logpoints_can_be_toggled(self):
+        self.run_event(vdebug.event.ToggleBreakpointEvent,
+                       "%i toggle" % self.logpoint.id)
+        self.assertFalse(self.logpoint.enabled)
+        self.run_event(vdebug.event.ToggleBreakpointEvent,
+                       "%i toggle" % self.logpoint.id)
+        self.assertTrue(self.logpoint.enabled)
+
+    def test_logpoints_can_be_disabled_and_enabled(self):
+        self.run_event(vdebug.event.DisableBreakpointEvent,
+                       str(self.logpoint.id))
+        self.assertFalse(self.logpoint.enabled)
+        self.run_event(vdebug.event.EnableBreakpointEvent,
+                       str(self.logpoint.id))
+        self.assertTrue(self.logpoint.enabled)
+
+    def test_jump_to_a_logpoint(self):
+        ui = self.handler.ui.return_value
+        ui.windows.breakpoints.return_value.line_at.return_value = \
+            " %-7i | True   | log         | /path/to/file:7 log ($i)" \
+            % self.logpoint.id
+        with patch('vdebug.event.vim') as vim:
+            vim.current.window.cursor = (4, 0)
+            vdebug.event.BreakpointJumpEvent(self.handler).run()
+        ui.sourcewin.set_file.assert_called_once_with(self.file)
+        ui.sourcewin.set_line.assert_called_once_with(7)
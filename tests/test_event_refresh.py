@@ -0,0 +1,133 @@
+import unittest
+import vdebug.event
+import vdebug.opts
+from tests.helpers import PipelineApiMock, stack, status
+try:
+    from unittest.mock import MagicMock, Mock, patch
+except ImportError:
+    from mock import MagicMock, Mock, patch
+
+
+class EventTestCase(unittest.TestCase):
+
+    def setUp(self):
+        vdebug.opts.Options.set({'path_maps': {}})
+        self.api = PipelineApiMock()
+        self.api.stack_get.return_value = stack(1, 5)
+        self.api.context_get.return_value.as_string.return_value = ""
+        self.api.context_get.return_value.properties = []
+        self.api.pop_notifications.return_value = []
+
+        self.session = Mock()
+        self.session.deferred_refresh = None
+        self.session.api.return_value = self.api
+        self.session.context_names = {0: "Locals", 1: "Globals"}
+        self.session.expanded_properties.return_value = ["$list"]
+        self.session.queue_tuned_features.side_effect = lambda: [
+            ('max_depth', 2, self.api.feature_set('max_depth', 2))]
+
+        self.ui = MagicMock()
+        self.ui.selected_context = 1
+        self.ui.windows.watch.return_value.has_persistent_eval.return_value = \
+            False
+        self.ui.windows.trace.return_value.is_tracing.return_value = False
+
+        self.breakpoints = Mock()
+        self.breakpoints.can_sync.return_value = True
+
+        self.handler = Mock()
+        self.handler.session.return_value = self.session
+        self.handler.ui.return_value = self.ui
+        self.handler.breakpoints.return_value = self.breakpoints
+
+        patcher = patch('vdebug.event.vim')
+        self.vim = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.vim.eval.return_value = "1"
+        patcher = patch('vdebug.util.InputStream.pending')
+        self.pending = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pending.return_value = False
+
+
+class RefreshEventTest(EventTestCase):
+
+    def refresh(self):
+        vdebug.event.RefreshEvent(self.handler).run(status("break", 5),
+                                                    False)
+
+    def test_refresh_is_one_round_trip(self):
+        self.refresh()
+        self.assertEqual(self.api.pipelines, 1)
+        self.api.feature_set.assert_called_once_with('max_depth', 2)
+        self.api.context_get.assert_called_once_with(0)
+        self.api.property_get.assert_called_once_with("$list", 0, 0)
+        self.breakpoints.reconcile.assert_called_once_with(
+            self.api.breakpoint_list.return_value.get_breakpoints
+            .return_value)
+        self.breakpoints.sync.assert_not_called()
+        queued, responses = self.session.check_tuned_features.call_args[0]
+        self.assertEqual(queued, [('max_depth', 2, 0)])
+        self.assertIs(responses[0], self.api.feature_set.return_value)
+        self.assertEqual(self.ui.selected_context, 0)
+
+    def test_breakpoints_are_only_listed_once_registered(self):
+        self.breakpoints.can_sync.return_value = False
+        self.refresh()
+        self.assertEqual(self.api.pipelines, 1)
+        self.api.breakpoint_list.assert_not_called()
+        self.breakpoints.reconcile.assert_not_called()
+
+    def test_refresh_is_put_off_while_keys_are_pending(self):
+        self.pending.return_value = True
+        res = status("break", 5)
+        vdebug.event.RefreshEvent(self.handler).run(res)
+        self.assertIs(self.session.deferred_refresh, res)
+        self.assertEqual(self.api.pipelines, 0)
+        self.vim.command.assert_called_once_with(
+            "call timer_start(0, 'Vdebug_flush_refresh')")
+
+    def test_refresh_is_put_off_if_keys_arrive_during_the_query(self):
+        self.pending.side_effect = [False, True]
+        res = status("break", 5)
+        vdebug.event.RefreshEvent(self.handler).run(res)
+        self.assertIs(self.session.deferred_refresh, res)
+        self.assertEqual(self.api.pipelines, 1)
+        self.ui.set_source_position.assert_not_called()
+
+
+class DispatcherTest(EventTestCase):
+
+    def setUp(self):
+        EventTestCase.setUp(self)
+        self.session.deferred_refresh = status("break", 5)
+        # the number of pipelines sent before the event ran
+        self.pipelines_before = []
+        self.event = Mock()
+        self.event.return_value.run.side_effect = \
+            lambda: self.pipelines_before.append(self.api.pipelines)
+
+    def dispatch(self, name):
+        with patch.dict(vdebug.event.Dispatcher.events, {name: self.event}):
+            vdebug.event.Dispatcher(self.handler).dispatch_event(name)
+
+    def test_step_drops_the_refresh_put_off(self):
+        self.dispatch("step_over")
+        self.assertEqual(self.pipelines_before, [0])
+        self.assertIsNone(self.session.deferred_refresh)
+        self.assertEqual(self.api.pipelines, 0)
+
+    def test_other_events_run_the_refresh_put_off_first(self):
+        self.dispatch("get_context")
+        self.assertEqual(self.pipelines_before, [1])
+        self.assertIsNone(self.session.deferred_refresh)
+        self.ui.set_source_position.assert_called_once_with(
+            self.session.cur_file, "5")
+
+    def test_errors_moving_breakpoints_are_handled(self):
+        self.session.deferred_refresh = None
+        self.breakpoints.shift_lines.side_effect = EOFError
+        vdebug.event.Dispatcher(self.handler).dispatch_event(
+            "lines_changed", "/path/to/file", [[1, 1, 1]])
+        self.breakpoints.shift_lines.assert_called_once_with(
+            "/path/to/file", [[1, 1, 1]])
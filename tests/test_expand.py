@@ -0,0 +1,86 @@
+import unittest
+import vdebug.dbgp
+import vdebug.expand
+from tests.helpers import PipelineApiMock
+try:
+    from unittest.mock import Mock
+except ImportError:
+    from mock import Mock
+
+
+TREE = {
+    "obj": ["obj.a", "obj.b"],
+    "obj.a": ["obj.a.x", "obj.a.y"],
+    "obj.b": ["obj.b.z"],
+    "obj.a.x": ["obj.a.x.deep"],
+}
+
+
+def property_xml(name, children=None):
+    inner = ""
+    if children is not None:
+        inner = "".join(property_xml(c) for c in children)
+    return """<property name="%s" fullname="%s" type="array" children="%i"
+        numchildren="%i">%s</property>""" % (
+            name, name, int(name in TREE), len(TREE.get(name, [])), inner)
+
+
+def property_get(name, page=0, context=0, stack=0):
+    return vdebug.dbgp.ContextGetResponse("""<?xml version="1.0"?>
+        <response xmlns="urn:debugger_protocol_v1" command="property_get"
+        transaction_id="1">%s</response>"""
+        % property_xml(name, TREE[name]), "property_get", "", Mock())
+
+
+class ExpanderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.api = PipelineApiMock()
+        self.api.property_get.side_effect = property_get
+
+    def names(self, res):
+        return [p.display_name for p in res.get_context()]
+
+    def test_expands_to_depth(self):
+        expander = vdebug.expand.Expander(self.api, 1, 2)
+        res, fetched = expander.expand("obj", 2)
+        self.assertEqual(fetched, ["obj", "obj.a", "obj.b"])
+        self.assertEqual(self.names(res), ["obj", "obj.a", "obj.a.x",
+                                           "obj.a.y", "obj.b", "obj.b.z"])
+        self.assertFalse(expander.limit_reached)
+        self.api.property_get.assert_called_with("obj.b", 0, 1, 2)
+
+    def test_expands_whole_tree(self):
+        res, fetched = vdebug.expand.Expander(self.api).expand("obj", 10)
+        self.assertEqual(fetched, ["obj", "obj.a", "obj.b", "obj.a.x"])
+        self.assertEqual(res.get_context()[3].display_name, "obj.a.x.deep")
+        self.assertEqual(res.get_context()[3].depth, 3)
+
+    def test_stops_at_limit(self):
+        expander = vdebug.expand.Expander(self.api, limit=2)
+        res, fetched = expander.expand("obj", 10)
+        self.assertEqual(fetched, ["obj", "obj.a"])
+        self.assertTrue(expander.limit_reached)
+
+    def test_failed_properties_are_not_retried(self):
+        def failing(name, *args):
+            if name == "obj.a":
+                return vdebug.dbgp.DBGPError("Cannot get property", 300)
+            return property_get(name)
+        self.api.property_get.side_effect = failing
+        res, fetched = vdebug.expand.Expander(self.api).expand("obj", 10)
+        self.assertEqual(fetched, ["obj", "obj.b"])
+        self.assertEqual(self.api.property_get.call_count, 3)
+
+
+class IsUnderTest(unittest.TestCase):
+
+    def test_children_are_under_parent(self):
+        for name, parent in (("$a", "$a"), ("$a->b", "$a"), ("$a['b']", "$a"),
+                             ("a.b.c", "a.b"), ("A::b", "A")):
+            self.assertTrue(vdebug.expand.is_under(name, parent))
+
+    def test_other_names_are_not_under_parent(self):
+        self.assertFalse(vdebug.expand.is_under("$ab", "$a"))
+        self.assertFalse(vdebug.expand.is_under("$a_b", "$a"))
+        self.assertFalse(vdebug.expand.is_under("$b", "$a"))
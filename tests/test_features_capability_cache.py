@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+import vdebug.features
+
+
+class CapabilityCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dir, 'cache', 'capabilities.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_missing_identity(self):
+        cache = vdebug.features.CapabilityCache(self.filename)
+        self.assertIsNone(cache.get('php|Xdebug|2.2.0|1.0|None'))
+
+    def test_capabilities_are_persisted(self):
+        capabilities = {'breakpoint_types': 'line call', 'supports_async': None}
+        vdebug.features.CapabilityCache(self.filename).set(
+            'php|Xdebug|2.2.0|1.0|None', capabilities)
+
+        cache = vdebug.features.CapabilityCache(self.filename)
+        self.assertEqual(cache.get('php|Xdebug|2.2.0|1.0|None'), capabilities)
+        self.assertIsNone(cache.get('php|Xdebug|3.0.0|1.0|None'))
+
+    def test_invalid_file_is_ignored(self):
+        os.makedirs(os.path.dirname(self.filename))
+        with open(self.filename, 'w') as f:
+            f.write('not json')
+        cache = vdebug.features.CapabilityCache(self.filename)
+        self.assertIsNone(cache.get('php|Xdebug|2.2.0|1.0|None'))
+
+    def test_default_filename_uses_xdg_cache_home(self):
+        old = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = self.dir
+        try:
+            cache = vdebug.features.CapabilityCache()
+        finally:
+            if old is None:
+                del os.environ['XDG_CACHE_HOME']
+            else:
+                os.environ['XDG_CACHE_HOME'] = old
+        self.assertEqual(cache.filename, os.path.join(
+            self.dir, 'vdebug', 'capabilities.json'))
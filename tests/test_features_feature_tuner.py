@@ -0,0 +1,60 @@
+import unittest
+import vdebug.features
+
+
+class FeatureTunerTest(unittest.TestCase):
+
+    limits = {
+        'max_children': [16, 256],
+        'max_depth': [1, 2],
+        'max_data': [256, 8192],
+    }
+
+    def setUp(self):
+        self.tuner = vdebug.features.FeatureTuner(0.1, self.limits)
+
+    def test_max_children_follows_visible_properties(self):
+        self.assertEqual(self.tuner.propose(40), {'max_children': 40})
+
+    def test_max_children_is_clamped(self):
+        self.assertEqual(self.tuner.propose(4), {'max_children': 16})
+
+    def test_max_children_is_kept_while_paged(self):
+        self.tuner.record(100000, 10, 0.5)
+        self.assertEqual(self.tuner.propose(40, paged=True),
+                         {'max_data': 512})
+        self.assertEqual(self.tuner.propose(40), {'max_children': 40})
+
+    def test_no_changes_without_sample(self):
+        self.tuner.propose(40)
+        self.assertEqual(self.tuner.propose(40), {})
+
+    def test_slow_heavy_values_shrink_max_data(self):
+        self.tuner.record(100000, 10, 0.5)
+        self.assertEqual(self.tuner.propose(), {'max_data': 512})
+
+    def test_slow_light_values_shrink_max_depth(self):
+        self.tuner.values['max_depth'] = 2
+        self.tuner.record(1000, 100, 0.5)
+        self.assertEqual(self.tuner.propose(), {'max_depth': 1})
+
+    def test_shrink_falls_back_to_other_feature(self):
+        self.tuner.record(1000, 100, 0.5)
+        self.assertEqual(self.tuner.propose(), {'max_data': 512})
+
+    def test_fast_heavy_values_grow_max_data(self):
+        self.tuner.record(100000, 10, 0.001)
+        self.assertEqual(self.tuner.propose(), {'max_data': 2048})
+
+    def test_within_budget_changes_nothing(self):
+        self.tuner.record(1000, 10, 0.05)
+        self.assertEqual(self.tuner.propose(), {})
+
+    def test_fixed_features_are_not_tuned(self):
+        tuner = vdebug.features.FeatureTuner(0.1, self.limits, ['max_data'])
+        tuner.record(100000, 10, 0.5)
+        self.assertNotIn('max_data', tuner.propose())
+
+    def test_discarded_features_are_not_tuned(self):
+        self.tuner.discard('max_children')
+        self.assertEqual(self.tuner.propose(40), {})
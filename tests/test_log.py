@@ -118,3 +118,18 @@ class FileLoggerTest(unittest.TestCase):
         mocked_open.assert_called_once_with(self.filename, 'w', encoding='utf-8')
         handle = mocked_open()
         handle.close.assert_called_once_with()
+
+
+class LogTest(unittest.TestCase):
+
+    def tearDown(self):
+        vdebug.log.Log.loggers = {}
+
+    def test_is_logging_without_loggers(self):
+        vdebug.log.Log.loggers = {}
+        self.assertFalse(vdebug.log.Log.is_logging(vdebug.log.Logger.ERROR))
+
+    def test_is_logging_with_level(self):
+        vdebug.log.Log.loggers = {'Logger': vdebug.log.Logger(1)}
+        self.assertTrue(vdebug.log.Log.is_logging(vdebug.log.Logger.INFO))
+        self.assertFalse(vdebug.log.Log.is_logging(vdebug.log.Logger.DEBUG))
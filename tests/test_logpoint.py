@@ -0,0 +1,146 @@
+import unittest
+import vdebug.breakpoint
+import vdebug.dbgp
+import vdebug.logpoint
+import vdebug.util
+from tests.helpers import PipelineApiMock, stack, status
+try:
+    from unittest.mock import Mock
+except ImportError:
+    from mock import Mock
+
+
+def eval_response(value):
+    prop = Mock()
+    prop.has_children = False
+    prop.value = value
+    res = Mock()
+    res.get_context.return_value = [prop]
+    return res
+
+
+class RunnerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.store = vdebug.breakpoint.Store()
+        self.file = vdebug.util.FilePath("/path/to/file")
+        self.logpoint = vdebug.breakpoint.LogBreakpoint(
+            Mock(), self.file, 5, ["$i", "$x"])
+        self.store.add_breakpoint(self.logpoint)
+        self.store.add_breakpoint(
+            vdebug.breakpoint.LineBreakpoint(Mock(), self.file, 9))
+        self.api = PipelineApiMock()
+        self.history = vdebug.logpoint.History(10)
+        self.runner = vdebug.logpoint.Runner(self.api, self.store,
+                                             self.history)
+
+    def test_logpoints_are_recorded_and_passed(self):
+        values = [eval_response("1"), eval_response("a"),
+                  eval_response("2"), eval_response("b")]
+        self.api.eval.side_effect = lambda expr: values.pop(0)
+        statuses = [status("break", 5), status("break", 9)]
+        self.api.run.side_effect = lambda: statuses.pop(0)
+
+        res = self.runner.run(status("break", 5))
+        self.assertEqual(res.get_position()[1], 9)
+        self.assertEqual(self.api.run.call_count, 2)
+        self.assertEqual(len(self.history), 2)
+        self.assertEqual([r[3] for r in self.history.records],
+                         [[("$i", "1"), ("$x", "a")],
+                          [("$i", "2"), ("$x", "b")]])
+        self.api.stack_get.assert_not_called()
+
+    def test_other_breaks_are_returned(self):
+        res = status("break", 9)
+        self.assertIs(self.runner.run(res), res)
+        self.api.eval.assert_not_called()
+
+    def test_disabled_logpoints_stop(self):
+        self.logpoint.enabled = False
+        res = status("break", 5)
+        self.assertIs(self.runner.run(res), res)
+
+    def test_stack_is_used_without_position(self):
+        frame = Mock()
+        frame.get.side_effect = {'filename': 'file:///path/to/file',
+                                 'lineno': '9'}.get
+        self.api.stack_get.return_value.get_stack.return_value = [frame]
+        res = status("break")
+        self.assertIs(self.runner.run(res), res)
+
+    def test_eval_errors_are_recorded(self):
+        self.api.eval.return_value = vdebug.dbgp.EvalError()
+        self.api.run.return_value = status("stopping")
+        res = self.runner.run(status("break", 5))
+        self.assertEqual(str(res), "stopping")
+        self.assertEqual(self.history.records[0][3],
+                         [("$i", "(invalid)"), ("$x", "(invalid)")])
+
+
+    def steps(self, step, statuses, stacks):
+        statuses = [status("break", l) for l in statuses]
+        getattr(self.api, step).side_effect = lambda: statuses.pop(0)
+        self.api.step_out.side_effect = lambda: statuses.pop(0)
+        stacks = [stack(d, l) for d, l in stacks]
+        self.api.stack_get.side_effect = lambda: stacks.pop(0)
+        self.api.eval.side_effect = lambda expr: eval_response(expr)
+
+    def test_step_over_passes_logpoint_in_called_function(self):
+        # stepping over line 4 at depth 1 breaks at the logpoint on line 5,
+        # inside the function called from line 4
+        self.steps("step_over", [5, 6], [(1, 4), (2, 5), (1, 6)])
+        res, rest = self.runner.step("step_over")
+        self.assertEqual(res.get_position()[1], 6)
+        self.assertEqual(rest, [])
+        self.api.step_out.assert_called_once_with()
+        self.assertEqual(self.api.pipelines, 2)
+        self.assertEqual(self.history.records[0][3],
+                         [("$i", "$i"), ("$x", "$x")])
+
+    def test_step_out_passes_logpoint_in_deeper_function(self):
+        # stepping out of depth 2 breaks at depth 3, then at depth 2 again,
+        # before getting out to depth 1
+        self.steps("step_out", [5, 3, 7], [(2, 2), (3, 5), (2, 3), (1, 7)])
+        res, rest = self.runner.step("step_out")
+        self.assertEqual(res.get_position()[1], 7)
+        self.assertEqual(self.api.step_out.call_count, 3)
+        self.assertEqual(len(self.history), 1)
+
+    def test_step_landing_on_logpoint_records_and_stops(self):
+        self.steps("step_into", [5], [(1, 4), (2, 5)])
+        res, rest = self.runner.step("step_into")
+        self.assertEqual(res.get_position()[1], 5)
+        self.api.step_out.assert_not_called()
+        self.assertEqual(len(self.history), 1)
+
+    def test_step_stops_at_breakpoint_in_called_function(self):
+        self.steps("step_over", [9], [(1, 4), (2, 9)])
+        res, rest = self.runner.step("step_over")
+        self.assertEqual(res.get_position()[1], 9)
+        self.api.step_out.assert_not_called()
+        self.assertEqual(len(self.history), 0)
+
+    def test_step_queues_commands_after_each_step(self):
+        self.steps("step_over", [5, 6], [(1, 4), (2, 5), (1, 6)])
+        res, rest = self.runner.step(
+            "step_over", lambda: [self.api.eval("$total")])
+        self.assertEqual(len(rest), 1)
+        self.assertEqual(self.api.eval.call_count, 4)
+        self.assertEqual(len(self.history), 1)
+
+
+class HistoryTest(unittest.TestCase):
+
+    def test_oldest_records_are_dropped(self):
+        history = vdebug.logpoint.History(2)
+        for i in range(3):
+            history.add("/path/to/file", i, [("$i", str(i))])
+        self.assertEqual([r[2] for r in history.records], [1, 2])
+        self.assertTrue(str(history).endswith("/path/to/file:2 $i = 2"))
+
+    def test_resize_keeps_newest_records(self):
+        history = vdebug.logpoint.History(3)
+        for i in range(3):
+            history.add("/path/to/file", i, [])
+        history.resize(1)
+        self.assertEqual([r[2] for r in history.records], [2])
@@ -0,0 +1,140 @@
+import unittest
+import vdebug.breakpoint
+import vdebug.dbgp
+import vdebug.logpoint
+import vdebug.opts
+import vdebug.stepping
+import vdebug.util
+from tests.helpers import PipelineApiMock, stack, status
+try:
+    from unittest.mock import Mock
+except ImportError:
+    from mock import Mock
+
+
+def eval_response(value):
+    return vdebug.dbgp.EvalResponse("""<?xml version="1.0"
+        encoding="iso-8859-1"?>\n<response xmlns="urn:debugger_protocol_v1"
+        command="eval" transaction_id="2"><property type="int"><![CDATA[%s]]>
+        </property></response>""" % value, "eval", "-- JGk=", Mock())
+
+
+class StepperTest(unittest.TestCase):
+
+    def setUp(self):
+        vdebug.opts.Options.set({})
+        self.store = vdebug.breakpoint.Store()
+        self.file = vdebug.util.FilePath("/path/to/file")
+        self.breakpoint = vdebug.breakpoint.LineBreakpoint(
+            Mock(), self.file, 7)
+        self.store.add_breakpoint(self.breakpoint)
+        self.api = PipelineApiMock()
+        self.stepper = vdebug.stepping.Stepper(self.api, self.store)
+
+    def step_through(self, *lines):
+        statuses = [status("break", l) for l in lines]
+        self.api.step_over.side_effect = lambda: statuses.pop(0)
+
+    def test_steps_count_times(self):
+        self.step_through(2, 3, 4, 5)
+        res = self.stepper.repeat("step_over", 4)
+        self.assertEqual(self.api.step_over.call_count, 4)
+        self.assertEqual(res.get_position()[1], 5)
+        self.api.stack_get.assert_not_called()
+
+    def test_stops_at_breakpoint(self):
+        self.step_through(6, 7, 8)
+        res = self.stepper.repeat("step_over", 3)
+        self.assertEqual(self.api.step_over.call_count, 2)
+        self.assertEqual(res.get_position()[1], 7)
+
+    def test_passes_disabled_breakpoint(self):
+        self.breakpoint.enabled = False
+        self.step_through(6, 7, 8)
+        res = self.stepper.repeat("step_over", 3)
+        self.assertEqual(res.get_position()[1], 8)
+
+    def test_stops_when_script_ends(self):
+        self.api.step_into.return_value = status("stopping")
+        res = self.stepper.repeat("step_into", 10)
+        self.assertEqual(self.api.step_into.call_count, 1)
+        self.assertEqual(str(res), "stopping")
+
+    def test_stack_is_used_without_position(self):
+        frame = Mock()
+        frame.get.side_effect = {'filename': 'file:///path/to/file',
+                                 'lineno': '7'}.get
+        self.api.stack_get.return_value.get_stack.return_value = [frame]
+        self.api.step_out.return_value = status("break")
+        self.stepper.repeat("step_out", 5)
+        self.assertEqual(self.api.step_out.call_count, 1)
+
+    def test_until_stops_at_change(self):
+        self.step_through(2, 3, 4, 5)
+        values = [eval_response(v) for v in ("1", "1", "1", "2", "3")]
+        self.api.eval.side_effect = lambda code: values.pop(0)
+        res, steps, changed = self.stepper.until("step_over", "$i", 100)
+        self.assertEqual((steps, changed), (3, True))
+        self.assertEqual(res.get_position()[1], 4)
+
+    def test_until_stops_at_limit(self):
+        self.api.step_into.return_value = status("break", 2)
+        self.api.eval.return_value = eval_response("1")
+        progress = Mock()
+        self.stepper.progress_interval = 2
+        res, steps, changed = self.stepper.until("step_into", "$i", 5,
+                                                 progress)
+        self.assertEqual((steps, changed), (5, False))
+        self.assertEqual(progress.call_count, 2)
+
+    def test_until_stops_at_breakpoint(self):
+        self.step_through(6, 7, 8)
+        self.api.eval.return_value = eval_response("1")
+        res, steps, changed = self.stepper.until("step_over", "$i", 100)
+        self.assertEqual((steps, changed), (2, False))
+
+    def test_until_counts_eval_error_as_change(self):
+        self.step_through(2, 3)
+        values = [eval_response("1"), vdebug.dbgp.EvalError()]
+        self.api.eval.side_effect = lambda code: values.pop(0)
+        res, steps, changed = self.stepper.until("step_over", "$i", 100)
+        self.assertEqual((steps, changed), (1, True))
+
+    def use_logpoint(self):
+        self.store.add_breakpoint(vdebug.breakpoint.LogBreakpoint(
+            Mock(), self.file, 20, ["$i"]))
+        self.history = vdebug.logpoint.History()
+        self.stepper = vdebug.stepping.Stepper(
+            self.api, self.store, vdebug.logpoint.Runner(
+                self.api, self.store, self.history))
+
+    def test_steps_over_logpoint_in_called_function(self):
+        self.use_logpoint()
+        # the first step over breaks at the logpoint in a called function,
+        # which is stepped out of to line 3
+        statuses = [status("break", l) for l in (20, 3, 4)]
+        self.api.step_over.side_effect = lambda: statuses.pop(0)
+        self.api.step_out.side_effect = lambda: statuses.pop(0)
+        stacks = [stack(d, l) for d, l in
+                  ((1, 2), (2, 20), (1, 3), (1, 3), (1, 4))]
+        self.api.stack_get.side_effect = lambda: stacks.pop(0)
+        self.api.eval.return_value = eval_response("1")
+        res = self.stepper.repeat("step_over", 2)
+        self.assertEqual(res.get_position()[1], 4)
+        self.assertEqual(self.api.step_over.call_count, 2)
+        self.assertEqual(len(self.history), 1)
+
+    def test_until_steps_over_logpoint_in_called_function(self):
+        self.use_logpoint()
+        statuses = [status("break", l) for l in (20, 3)]
+        self.api.step_over.side_effect = lambda: statuses.pop(0)
+        self.api.step_out.side_effect = lambda: statuses.pop(0)
+        stacks = [stack(d, l) for d, l in ((1, 2), (2, 20), (1, 3))]
+        self.api.stack_get.side_effect = lambda: stacks.pop(0)
+        # the value before the step, at the logpoint, after the logpoint's
+        # own eval, and where the step ends
+        values = [eval_response(v) for v in ("1", "1", "5", "2")]
+        self.api.eval.side_effect = lambda code: values.pop(0)
+        res, steps, changed = self.stepper.until("step_over", "$i", 100)
+        self.assertEqual((steps, changed), (1, True))
+        self.assertEqual(res.get_position()[1], 3)
@@ -0,0 +1,60 @@
+import unittest
+import vdebug.ui.diff
+
+
+def apply(old, edits):
+    lines = list(old)
+    for start, end, new in edits:
+        lines[start:end] = new
+    return lines
+
+
+class DiffTest(unittest.TestCase):
+
+    old = ["[ *Locals ] [ Superglobals ]", "",
+           "- Locals at /path/to/file:5", "",
+           " ⬦ $i = (int) 1",
+           " ⬦ $name = (string [3]) `foo`",
+           " ⬦ $total = (int) 10", ""]
+
+    def test_equal_lines_have_no_edits(self):
+        self.assertEqual(vdebug.ui.diff.diff(self.old, list(self.old)),
+                         ([], []))
+
+    def test_changed_values(self):
+        new = list(self.old)
+        new[2] = "- Locals at /path/to/file:6"
+        new[4] = " ⬦ $i = (int) 2"
+        new[6] = " ⬦ $total = (int) 12"
+        edits, changed = vdebug.ui.diff.diff(self.old, new)
+        self.assertEqual(apply(self.old, edits), new)
+        self.assertEqual(changed, [4, 6])
+        self.assertEqual([e[0] for e in edits], [6, 4, 2])
+
+    def test_added_and_removed_lines(self):
+        new = self.old[:4] + [" ⬦ $count = (int) 0"] + self.old[5:6] + [""]
+        edits, changed = vdebug.ui.diff.diff(self.old, new)
+        self.assertEqual(apply(self.old, edits), new)
+        self.assertEqual(changed, [])
+
+    def test_empty_buffer(self):
+        edits, changed = vdebug.ui.diff.diff([''], self.old)
+        self.assertEqual(apply([''], edits), self.old)
+
+    def test_large_differences_are_replaced_in_one_edit(self):
+        new = list(self.old)
+        new[4] = " ⬦ $i = (int) 2"
+        new[5] = " ⬦ $count = (int) 0"
+        edits, changed = vdebug.ui.diff.diff(self.old, new, max_lines=1)
+        self.assertEqual(edits, [(4, 6, new[4:6])])
+        self.assertEqual(changed, [4])
+
+    def test_large_buffers_with_few_changes_are_matched(self):
+        old = [" ⬦ $v%i = (int) %i" % (i, i) for i in range(5000)]
+        new = list(old)
+        new[2500] = " ⬦ $v2500 = (int) 0"
+        del new[4000]
+        edits, changed = vdebug.ui.diff.diff(old, new)
+        self.assertEqual(apply(old, edits), new)
+        self.assertEqual(changed, [2500])
+        self.assertEqual(len(edits), 2)
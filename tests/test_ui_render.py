@@ -0,0 +1,104 @@
+import unittest
+import vdebug.dbgp
+import vdebug.opts
+import vdebug.ui.render
+try:
+    from unittest.mock import Mock
+except ImportError:
+    from mock import Mock
+
+
+class ContextGetResponseRendererTest(unittest.TestCase):
+
+    response = """<?xml version="1.0" encoding="iso-8859-1"?>
+<response xmlns="urn:debugger_protocol_v1" command="context_get"
+context="0" transaction_id="3"><property name="$i" fullname="$i"
+type="int"><![CDATA[1]]></property><property name="$list"
+fullname="$list" type="array" children="1" numchildren="2" page="0"
+pagesize="32"><property name="0" fullname="$list[0]"
+type="int"><![CDATA[5]]></property><property name="1"
+fullname="$list[1]" type="string" size="7" encoding="base64"><![CDATA[Zm9vCmJhcg==]]></property></property><property
+name="$obj" fullname="$obj" type="object" classname="Foo"
+children="1" numchildren="3"></property></response>"""
+
+    def setUp(self):
+        self.options = {'marker_default': '*', 'marker_closed_tree': '+',
+                        'marker_open_tree': '-',
+                        'watch_window_style': 'compact'}
+        vdebug.opts.Options.set(self.options)
+        self.res = vdebug.dbgp.ContextGetResponse(self.response, "", "",
+                                                  Mock())
+
+    def renderer(self):
+        return vdebug.ui.render.ContextGetResponseRenderer(
+            self.res, "Locals", {0: "Locals", 1: "Globals"}, 0)
+
+    def test_render_lines(self):
+        self.assertEqual(self.renderer().render(), [
+            "[ *Locals ] [ Globals ]", "",
+            "- Locals", "",
+            " * $i = (int) 1",
+            " - $list = (array [2])",
+            "   * $list[0] = (int) 5",
+            "   * $list[1] = (string [7]) `foo",
+            "bar`",
+            " + $obj = (Foo [3])",
+            ""])
+
+    def test_lines_are_indexed(self):
+        rend = self.renderer()
+        output = rend.render()
+        self.assertEqual(len(rend.lines), len(output))
+        heads = [line.prop.display_name for line in rend.lines
+                 if line is not None and line.is_head]
+        self.assertEqual(heads, ["$i", "$list", "$list[0]", "$list[1]",
+                                 "$obj"])
+        # the second line of the string belongs to it
+        self.assertEqual(rend.lines[8].prop.display_name, "$list[1]")
+        self.assertFalse(rend.lines[8].is_head)
+
+    def test_render_part(self):
+        rend = self.renderer()
+        self.assertEqual(rend.render(first=1, count=2), [
+            " - $list = (array [2])",
+            "   * $list[0] = (int) 5",
+            ""])
+        self.assertEqual(rend.remaining, 2)
+        self.assertEqual(len(rend.lines), 3)
+
+    def test_render_expanded(self):
+        self.options['watch_window_style'] = 'expanded'
+        vdebug.opts.Options.set(self.options)
+        rend = self.renderer()
+        output = rend.render()
+        self.assertEqual(output[4:], [
+            " * $i = (int) 1",
+            " |",
+            " - $list = (array [2])",
+            "  \\",
+            "   * $list[0] = (int) 5",
+            "   |",
+            "   * $list[1] = (string [7]) `foo",
+            "bar`",
+            "  /",
+            " + $obj = (Foo [3])",
+            ""])
+        self.assertEqual(len(rend.lines), len(output))
+
+
+class StackGetResponseRendererTest(unittest.TestCase):
+
+    def setUp(self):
+        vdebug.opts.Options.set({'path_maps': {}})
+
+    def test_render_lines(self):
+        res = Mock()
+        res.get_stack.return_value = [
+            {'level': '0', 'where': 'foo', 'filename': 'file:///a.php',
+             'lineno': '3'},
+            {'level': '1', 'filename': 'file:///b.php', 'lineno': '10'}]
+        rend = vdebug.ui.render.StackGetResponseRenderer(res)
+        self.assertEqual(rend.render(), [
+            "[0] foo @ /a.php:3",
+            "[1] main @ /b.php:10",
+            ""])
@@ -0,0 +1,38 @@
+import random
+import unittest
+import vdebug.ui.rows
+
+
+class RowIndexTest(unittest.TestCase):
+
+    def test_rows_follow_the_first_row(self):
+        index = vdebug.ui.rows.RowIndex(3)
+        self.assertEqual(index.add("a"), 3)
+        self.assertEqual(index.add("b"), 4)
+        self.assertEqual(index.row("b"), 4)
+        self.assertIsNone(index.row("c"))
+
+    def test_removing_moves_later_rows_up(self):
+        index = vdebug.ui.rows.RowIndex()
+        for key in "abcd":
+            index.add(key)
+        self.assertEqual(index.remove("b"), 1)
+        self.assertEqual([index.row(k) for k in "acd"], [0, 1, 2])
+        self.assertIsNone(index.remove("b"))
+        self.assertEqual(index.add("e"), 3)
+        self.assertEqual(len(index), 4)
+
+    def test_matches_a_list(self):
+        index = vdebug.ui.rows.RowIndex()
+        keys = []
+        rand = random.Random(4)
+        for i in range(500):
+            if keys and rand.random() < 0.4:
+                key = rand.choice(keys)
+                self.assertEqual(index.remove(key), keys.index(key))
+                keys.remove(key)
+            else:
+                keys.append(i)
+                self.assertEqual(index.add(i), len(keys) - 1)
+        self.assertEqual([index.row(k) for k in keys],
+                         list(range(len(keys))))
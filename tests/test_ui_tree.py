@@ -0,0 +1,49 @@
+import unittest
+import vdebug.ui.tree
+try:
+    from unittest.mock import Mock
+except ImportError:
+    from mock import Mock
+
+
+def prop(depth):
+    p = Mock()
+    p.depth = depth
+    return p
+
+
+class PropertyIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        # a tabs line and a title, then an array with two children, the
+        # second of which has a value over two lines, then a scalar
+        self.array, self.first, self.second, self.scalar = \
+            prop(0), prop(1), prop(1), prop(0)
+        Line = vdebug.ui.tree.Line
+        self.index = vdebug.ui.tree.PropertyIndex([
+            None, None, None, None,
+            Line(self.array, 0, True), Line(self.array, 0, False),
+            Line(self.first, 0, True), Line(self.first, 0, False),
+            Line(self.second, 0, True), Line(self.second, 0, False),
+            Line(self.second, 0, False),
+            Line(self.scalar, 0, True), None])
+
+    def test_head_at(self):
+        self.assertIs(self.index.head_at(6).prop, self.first)
+        self.assertIsNone(self.index.head_at(7))
+        self.assertIsNone(self.index.head_at(1))
+        self.assertIsNone(self.index.head_at(20))
+
+    def test_column(self):
+        self.assertEqual(self.index.at(4).column, 1)
+        self.assertEqual(self.index.at(8).column, 3)
+
+    def test_subtree_end(self):
+        self.assertEqual(self.index.subtree_end(4), 11)
+        self.assertEqual(self.index.subtree_end(8), 11)
+        self.assertEqual(self.index.subtree_end(11), 12)
+
+    def test_replace(self):
+        self.index.replace(4, 11, [vdebug.ui.tree.Line(self.array, 0, True)])
+        self.assertEqual(len(self.index), 7)
+        self.assertIs(self.index.head_at(5).prop, self.scalar)
@@ -0,0 +1,49 @@
+import unittest
+import vdebug.breakpoint
+import vdebug.opts
+import vdebug.ui.vimui
+import vdebug.util
+try:
+    from unittest.mock import Mock, patch
+except ImportError:
+    from mock import Mock, patch
+
+
+class BreakpointWindowTest(unittest.TestCase):
+
+    def setUp(self):
+        vdebug.opts.Options.set({'path_maps': {}})
+        # windows destroy themselves when they're deleted
+        patcher = patch('vdebug.ui.vimui.vim')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.window = vdebug.ui.vimui.BreakpointWindow()
+        self.addCleanup(delattr, self, 'window')
+        self.file = vdebug.util.FilePath("/path/to/file")
+        self.bps = [vdebug.breakpoint.LineBreakpoint(Mock(), self.file, i)
+                    for i in range(1, 5)]
+        for bp in self.bps:
+            self.window.add_breakpoint(bp)
+
+    def ids(self):
+        lines = self.window._buffer.contents()[3:]
+        return [int(line.split("|")[0]) for line in lines]
+
+    def test_breakpoints_are_added_below_the_header(self):
+        self.assertEqual(self.ids(), [bp.id for bp in self.bps])
+
+    def test_remove_breakpoint(self):
+        self.window.remove_breakpoint(self.bps[1].id)
+        self.window.remove_breakpoint(self.bps[3].id)
+        self.window.remove_breakpoint(12345)
+        self.assertEqual(self.ids(), [self.bps[0].id, self.bps[2].id])
+
+    def test_update_breakpoint_after_removal(self):
+        self.window.remove_breakpoint(self.bps[0].id)
+        self.bps[2].enabled = False
+        self.window.update_breakpoint(self.bps[2])
+        lines = self.window._buffer.contents()
+        self.assertEqual(lines[4],
+                         self.window.breakpoint_str(self.bps[2]))
+        self.assertIn("False", lines[4])
+        self.assertEqual(self.ids(), [bp.id for bp in self.bps[1:]])
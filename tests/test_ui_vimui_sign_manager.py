@@ -0,0 +1,109 @@
+import json
+import unittest
+import vdebug.ui.vimui
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
+
+
+class SignManagerTest(unittest.TestCase):
+
+    # the buffer numbers of the loaded buffers
+    buffers = {'/a.php': 4, 'DebuggerStack': 7}
+
+    def create(self, has_sign_list=True, version=802):
+        patcher = patch('vdebug.ui.vimui.vim')
+        self.vim = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.vim.eval.return_value = "1" if has_sign_list else "0"
+        self.vim.vvars = {'version': version}
+        del self.vim.funcs
+        signs = vdebug.ui.vimui.SignManager()
+        self.vim.eval.reset_mock()
+        self.vim.eval.side_effect = self.eval
+        self.lookups = []
+        return signs
+
+    def eval(self, expr):
+        if expr.startswith('map('):
+            names = json.loads(expr[4:expr.index('], ') + 1])
+            self.lookups.append(names)
+            return [str(self.buffers.get(name, -1)) for name in names]
+        return "0"
+
+    def placelist_calls(self):
+        calls = []
+        for call in self.vim.eval.call_args_list:
+            expr = call[0][0]
+            func, args = expr.split('(', 1)
+            if func != 'map':
+                calls.append((func, json.loads(args[:-1])))
+        return calls
+
+    def test_signs_are_applied_straight_away_outside_a_batch(self):
+        signs = self.create()
+        signs.place(1, 'breakpt', '/a.php', 3)
+        self.assertEqual(self.placelist_calls(), [
+            ('sign_placelist', [{'id': 1, 'name': 'breakpt',
+                                 'buffer': 4, 'lnum': 3,
+                                 'group': 'vdebug'}])])
+
+    def test_batch_flushes_runs_of_changes_at_the_end(self):
+        signs = self.create()
+        with signs.batch():
+            signs.unplace(1)
+            signs.place(2, 'breakpt', '/a.php', 3)
+            with signs.batch():
+                signs.place(3, 'current', '/a.php', 5, priority=99)
+            self.vim.eval.assert_not_called()
+        self.assertEqual(self.placelist_calls(), [
+            ('sign_unplacelist', [{'id': 1, 'group': 'vdebug'}]),
+            ('sign_placelist', [
+                {'id': 2, 'name': 'breakpt', 'buffer': 4, 'lnum': 3,
+                 'group': 'vdebug'},
+                {'id': 3, 'name': 'current', 'buffer': 4, 'lnum': 5,
+                 'priority': 99, 'group': 'vdebug'}])])
+        # each buffer is looked up once
+        self.assertEqual(self.lookups, [['/a.php']])
+
+    def test_buffers_are_looked_up_as_exact_names(self):
+        signs = self.create()
+        signs.place(1, 'breakpt', '/a[1].php', 3)
+        expr = self.vim.eval.call_args_list[0][0][0]
+        self.assertEqual(
+            expr, 'map(["/a[1].php"], '
+            '\'bufnr("^" . fnameescape(v:val) . "$")\')')
+
+    def test_signs_are_not_placed_without_a_buffer(self):
+        signs = self.create()
+        with signs.batch():
+            signs.place(1, 'breakpt', '/b.php', 3)
+            signs.place(2, 'breakpt', '/a.php', 3)
+        self.assertEqual(self.placelist_calls(), [
+            ('sign_placelist', [{'id': 2, 'name': 'breakpt',
+                                 'buffer': 4, 'lnum': 3,
+                                 'group': 'vdebug'}])])
+
+    def test_sign_commands_without_sign_placelist(self):
+        signs = self.create(has_sign_list=False, version=800)
+        with signs.batch():
+            signs.place(2, 'breakpt', '/a.php', 3)
+            signs.place(3, 'current', '/a.php', 5, priority=99)
+            signs.unplace(2)
+        self.assertEqual(self.placelist_calls(), [])
+        self.assertEqual([c[0][0] for c in self.vim.command.call_args_list], [
+            'sign place 2 name=breakpt line=3 buffer=4',
+            'sign place 3 name=current line=5 buffer=4',
+            'sign unplace 2'])
+
+    def test_stack_pointer_is_placed_with_the_manager(self):
+        signs = self.create()
+        stack = vdebug.ui.vimui.StackWindow(signs)
+        stack.is_open = True
+        stack.place_pointer(2)
+        self.assertEqual(self.placelist_calls(), [
+            ('sign_unplacelist', [{'id': 6147, 'group': 'vdebug'}]),
+            ('sign_placelist', [{'id': 6147, 'name': 'current_stack_position',
+                                 'buffer': 7, 'lnum': 2,
+                                 'priority': 99, 'group': 'vdebug'}])])
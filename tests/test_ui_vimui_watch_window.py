@@ -0,0 +1,135 @@
+import unittest
+import vdebug.dbgp
+import vdebug.event
+import vdebug.opts
+import vdebug.ui.render
+import vdebug.ui.vimui
+try:
+    from unittest.mock import Mock, patch
+except ImportError:
+    from mock import Mock, patch
+
+
+def context_xml(children, count):
+    """A context_get response with an array of children, followed by count
+    integers."""
+    items = "".join('<property name="%(i)i" fullname="$arr[%(i)i]" '
+                    'type="int"><![CDATA[%(i)i]]></property>' % {'i': i}
+                    for i in range(children))
+    props = ('<property name="$arr" fullname="$arr" type="array" '
+             'children="1" numchildren="%i" page="0" pagesize="%i">%s'
+             '</property>' % (children, children, items))
+    props += "".join('<property name="$v%(i)i" fullname="$v%(i)i" '
+                     'type="int"><![CDATA[%(i)i]]></property>' % {'i': i}
+                     for i in range(count))
+    return ('<?xml version="1.0" encoding="iso-8859-1"?>'
+            '<response xmlns="urn:debugger_protocol_v1" '
+            'command="context_get" context="0" transaction_id="1">'
+            '%s</response>' % props)
+
+
+class WatchWindowTest(unittest.TestCase):
+
+    def setUp(self):
+        self.options = {'marker_default': '*', 'marker_closed_tree': '+',
+                        'marker_open_tree': '-',
+                        'watch_window_style': 'compact',
+                        'watch_window_virtual': 1}
+        vdebug.opts.Options.set(self.options)
+        # windows destroy themselves when they're deleted
+        patcher = patch('vdebug.ui.vimui.vim')
+        self.vim = patcher.start()
+        self.addCleanup(patcher.stop)
+        # the window is 10 lines high, so 40 properties are rendered at once
+        self.last_shown = 10
+        self.vim.eval.side_effect = self.eval
+        self.vim.current.window.number = 2
+        self.window = vdebug.ui.vimui.WatchWindow()
+        self.addCleanup(delattr, self, 'window')
+
+    def eval(self, expr):
+        if expr == "line('w$')":
+            return str(self.last_shown)
+        if expr.startswith("bufwinnr("):
+            return "2"
+        return "10"
+
+    def show(self, children=50, count=30):
+        res = vdebug.dbgp.ContextGetResponse(context_xml(children, count),
+                                             "", "", Mock())
+        self.window.accept_renderer(
+            vdebug.ui.render.ContextGetResponseRenderer(res, "Locals"))
+
+    def lines(self):
+        return self.window._buffer.contents()
+
+    def test_only_a_chunk_is_rendered(self):
+        self.show()
+        self.assertEqual(len(self.lines()), 2 + 40 + 1)
+        self.assertEqual(self.lines()[-1], " ... 41 more properties")
+        self.assertEqual(len(self.window.index), len(self.lines()))
+
+    def test_everything_is_rendered_unless_virtual(self):
+        self.options['watch_window_virtual'] = 0
+        vdebug.opts.Options.set(self.options)
+        self.show()
+        self.assertEqual(len(self.lines()), 2 + 81 + 1)
+        self.assertIsNone(self.window._pending)
+
+    def test_render_more(self):
+        self.show()
+        self.window.render_more()
+        self.assertEqual(len(self.lines()), 2 + 80 + 1)
+        self.assertEqual(self.lines()[-1], " ... 1 more properties")
+        self.window.render_more()
+        self.assertEqual(len(self.lines()), 2 + 81 + 1)
+        self.assertEqual(self.lines()[-2], " * $v29 = (int) 29")
+        self.assertEqual(self.lines()[-1], "")
+        self.assertIsNone(self.window._pending)
+        self.assertEqual(len(self.window.index), len(self.lines()))
+
+    def test_on_scroll_renders_more_near_the_end(self):
+        self.show()
+        self.window.on_scroll()
+        self.assertEqual(len(self.lines()), 2 + 40 + 1)
+        self.last_shown = 35
+        self.window.on_scroll()
+        self.assertEqual(len(self.lines()), 2 + 80 + 1)
+
+    def test_on_scroll_in_another_window(self):
+        self.show()
+        self.last_shown = 35
+        self.vim.current.window.number = 1
+        self.window.on_scroll()
+        self.assertEqual(len(self.lines()), 2 + 40 + 1)
+
+    def hide(self, lineno):
+        handler = Mock()
+        watch = handler.ui.return_value.windows.watch
+        watch.return_value = self.window
+        # mocks are only freed by the garbage collector, which would delete
+        # the window after vim is unpatched
+        self.addCleanup(setattr, watch, 'return_value', None)
+        with patch('vdebug.event.vim') as event_vim:
+            event_vim.current.window.cursor = (lineno, 0)
+            vdebug.event.WatchWindowHideEvent(handler).run()
+
+    def test_closing_a_partly_rendered_property_skips_its_children(self):
+        self.show()
+        self.hide(3)
+        self.assertEqual(self.lines(), ["- Locals", "",
+                                        " + $arr = (array [50])",
+                                        " ... 30 more properties"])
+        self.window.render_more()
+        self.assertEqual(len(self.lines()), 2 + 31 + 1)
+        self.assertFalse(any("$arr[" in line for line in self.lines()))
+        self.assertIsNone(self.window._pending)
+
+    def test_closing_a_rendered_property_keeps_the_rest_pending(self):
+        self.show(children=5, count=60)
+        self.hide(3)
+        self.assertEqual(len(self.lines()), 2 + 35 + 1)
+        self.assertEqual(self.lines()[-1], " ... 26 more properties")
+        self.window.render_more()
+        self.assertEqual(self.lines()[-2], " * $v59 = (int) 59")
+        self.assertFalse(any("$arr[" in line for line in self.lines()))